@@ -0,0 +1,207 @@
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from truss import Truss
+from loader import loadTruss
+
+def collectDefinitions(sources, manifest=None):
+    """expand directories, glob patterns, and manifests into a list of truss definition files
+
+    Args:
+        sources (list): directories, glob patterns, or file paths
+        manifest (path, optional): text file listing one truss definition per line
+
+    Returns:
+        list: file paths in the given order
+    """
+    paths = []
+    for source in sources:
+        if os.path.isdir(source):
+            paths.extend(sorted(glob.glob(os.path.join(source, '*.txt')) + glob.glob(os.path.join(source, '*.trb'))))
+        elif glob.has_magic(source):
+            paths.extend(sorted(glob.glob(source)))
+        else:
+            paths.append(source)
+    if manifest is not None:
+        base = os.path.dirname(manifest)
+        with open(manifest) as f:
+            for line in f:
+                line = line.split('#')[0].strip()
+                if line:
+                    paths.append(os.path.join(base, line))
+    return paths
+
+def _jsonList(array):
+    """nested list of an array with null instead of the non-finite values JSON does not allow
+    """
+    array = np.asarray(array)
+    if array.dtype.kind == 'f' and not np.all(np.isfinite(array)):
+        return np.where(np.isfinite(array), array.astype(object), None).tolist()
+    return array.tolist()
+
+def solveModel(model, check=True, method='equilibrium'):
+    """solve a parsed truss definition into a JSON-ready result
+
+    Args:
+        model (TrussModel): truss definition
+        check (bool): reject mechanisms with the rigidity check before the matrix is built
+        method (str): solver method of Truss.solveForceEquations
+
+    Returns:
+        dict: forces, reactions, and failures (members x cases), non-finite forces are None
+    """
+    truss_solver = Truss.fromModel(model)
+    truss_solver.solveForceEquations(check=check, method=method)
+    m = model.number_of_members
+    reaction_node, reaction_direction = model.reactionLayout()
+    return {'ok': True,
+            'load_cases': truss_solver.load_cases,
+            'members': model.member_names.tolist(),
+            'forces': _jsonList(truss_solver.unknown_forces[:m]),
+            'failures': truss_solver.failure_result.failure.tolist(),
+            'reaction_nodes': model.node_names[reaction_node].tolist(),
+            'reaction_directions': reaction_direction.tolist(),
+            'reactions': _jsonList(truss_solver.unknown_forces[m:])}
+
+def solveFile(truss_definition, check=True):
+    """solve one truss definition, errors are reported instead of raised
+
+    Args:
+        truss_definition (path): .txt or binary file path
+        check (bool): reject mechanisms with the rigidity check before the matrix is built
+
+    Returns:
+        dict: forces, reactions, and failures (members x cases) or the error message
+    """
+    start = time.perf_counter()
+    try:
+        result = solveModel(loadTruss(truss_definition), check)
+    except Exception as e:
+        return {'file': truss_definition, 'ok': False, 'error': '%s: %s' % (type(e).__name__, e), 'time': time.perf_counter() - start}
+    result = dict({'file': truss_definition}, **result)
+    result['time'] = time.perf_counter() - start
+    return result
+
+def solveChunk(paths, check=True):
+    """solve a chunk of files inside one worker process
+
+    Returns:
+        list: one result per file
+    """
+    return [solveFile(p, check) for p in paths]
+
+def _chunkError(paths, error):
+    """error results of every file of a chunk whose worker did not return
+    """
+    return [{'file': p, 'ok': False, 'error': '%s: %s' % (type(error).__name__, error), 'time': None} for p in paths]
+
+def _writeResults(results, output, summary):
+    for result in results:
+        if result['ok']:
+            summary['solved'] = summary['solved'] + 1
+        else:
+            summary['failed'] = summary['failed'] + 1
+        output.write(json.dumps(result, allow_nan=False) + '\n')
+
+def _solveChunks(chunks, output, summary, workers, max_inflight, check):
+    """solve chunks on one pool until they are done or a crashed worker breaks the pool
+
+    Returns:
+        lost: chunks whose worker did not return because the pool broke
+        unsent: chunks which were not submitted before the pool broke
+        error: the BrokenProcessPool error, None if the pool did not break
+    """
+    lost = []
+    error = None
+    next_chunk = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        while (next_chunk < len(chunks) and error is None) or pending:
+            # keep the amount of queued work bounded
+            while next_chunk < len(chunks) and len(pending) < max_inflight and error is None:
+                try:
+                    pending[pool.submit(solveChunk, chunks[next_chunk], check)] = chunks[next_chunk]
+                except BrokenProcessPool as e:
+                    error = e
+                    break
+                next_chunk = next_chunk + 1
+            if not pending:
+                break
+            done = wait(pending, return_when=FIRST_COMPLETED)[0]
+            for future in done:
+                chunk = pending.pop(future)
+                try:
+                    results = future.result()
+                except BrokenProcessPool as e:
+                    error = e
+                    lost.append(chunk)
+                    continue
+                except Exception as e:
+                    results = _chunkError(chunk, e)
+                _writeResults(results, output, summary)
+    return lost, chunks[next_chunk:], error
+
+def runBatch(paths, output, workers=None, chunksize=4, max_inflight=None, check=True):
+    """solve many truss definitions over a pool of reused worker processes
+
+    A crashed worker breaks the pool: the chunks it did not finish are solved again one file at a
+    time, so only the file which crashes is reported, and the chunks not sent yet go to a new pool.
+
+    Args:
+        paths (list): truss definition files
+        output (file): writable text stream, one JSON line per file in completion order
+        workers (int, optional): number of worker processes, by default the number of cores
+        chunksize (int): files sent to a worker at once
+        max_inflight (int, optional): chunks submitted but not finished, by default twice the workers
+        check (bool): reject mechanisms with the rigidity check before the matrix is built
+
+    Returns:
+        dict: summary with the number of solved and failed files and the throughput
+    """
+    workers = workers or os.cpu_count() or 1
+    max_inflight = max_inflight or 2*workers
+    chunks = [paths[i:i+chunksize] for i in range(0, len(paths), chunksize)]
+    summary = {'files': len(paths), 'solved': 0, 'failed': 0}
+    start = time.perf_counter()
+    while chunks:
+        lost, unsent, error = _solveChunks(chunks, output, summary, workers, max_inflight, check)
+        if len(unsent) == len(chunks):
+            # not even the first chunk could be submitted, it is retried file by file below
+            lost, unsent = unsent[:1], unsent[1:]
+        # one file per pool of one worker, a crash can only be caused by that file
+        for path in [p for chunk in lost for p in chunk]:
+            single_lost, single_unsent, single_error = _solveChunks([[path]], output, summary, 1, 1, check)
+            if single_lost or single_unsent:
+                _writeResults(_chunkError([path], single_error), output, summary)
+        chunks = unsent
+    summary['elapsed'] = time.perf_counter() - start
+    summary['files_per_second'] = len(paths)/summary['elapsed'] if summary['elapsed'] > 0 else 0.0
+    return summary
+
+if __name__ == '__main__':
+    # python batch.py designs/ 'more/*.txt' -m manifest.lst -o results.jsonl -j 8
+    arg_parser = argparse.ArgumentParser(description='solve many truss definitions in parallel')
+    arg_parser.add_argument('sources', nargs='*', help='directories, glob patterns, or truss definition files')
+    arg_parser.add_argument('-m', '--manifest', help='text file listing one truss definition per line')
+    arg_parser.add_argument('-o', '--output', help='JSON lines output file, stdout by default')
+    arg_parser.add_argument('-j', '--workers', type=int, help='number of worker processes')
+    arg_parser.add_argument('--chunksize', type=int, default=4, help='files sent to a worker at once')
+    arg_parser.add_argument('--max-inflight', type=int, help='chunks queued at most')
+    arg_parser.add_argument('--no-check', action='store_true', help='skip the rigidity check before the solve')
+    args = arg_parser.parse_args()
+
+    paths = collectDefinitions(args.sources, args.manifest)
+    output = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        summary = runBatch(paths, output, args.workers, args.chunksize, args.max_inflight, not args.no_check)
+    finally:
+        if args.output:
+            output.close()
+    print('%d files: %d solved, %d failed in %.3f s (%.1f files/s)' % (summary['files'], summary['solved'], summary['failed'],
+          summary['elapsed'], summary['files_per_second']), file=sys.stderr)
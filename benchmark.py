@@ -0,0 +1,196 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+import main
+from truss import Truss
+from solver import Factorization
+from member import evaluateFailures
+from loader import loadText, writeText
+from generators import FAMILIES, generateTruss, baysForMembers
+
+# the phases of main.run in order, followed by the two entry points measured end to end
+PHASES = ['parse', 'build', 'assemble', 'solve', 'failures', 'solveForceEquations', 'run']
+# differences below this many seconds are treated as timer noise
+MIN_TIME = 0.001
+
+def _parse(state):
+    state['model'] = loadText(state['path'])
+
+def _build(state):
+    model = state['model']
+    state['cosines'], state['length'] = model.directionCosines()
+    state['sections'] = model.sectionProperties()
+    state['reactions'] = model.reactionLayout()
+
+def _assemble(state):
+    state['A'] = state['model'].buildEquilibriumMatrix()
+    state['f'] = state['model'].buildLoadMatrix()
+
+def _solve(state):
+    state['forces'] = Factorization(state['A']).solve(-state['f'])
+
+def _failures(state):
+    model = state['model']
+    area, inertia_xx, inertia_yy = state['sections']
+    state['result'] = evaluateFailures(-state['forces'][:model.number_of_members], area, np.minimum(inertia_xx, inertia_yy),
+                                       state['length'], model.e_module, model.yield_strength)
+
+def _solveForceEquations(state):
+    # drop the intermediate results of the single phases before the end to end runs
+    model = state['model']
+    path = state['path']
+    state.clear()
+    state.update(path=path, model=model)
+    Truss.fromModel(model).solveForceEquations()
+
+def _run(state):
+    main.run(state['path'], False)
+
+_PHASE_FUNCTIONS = [_parse, _build, _assemble, _solve, _failures, _solveForceEquations, _run]
+
+def measurePhases(path, repeat=3, memory=True):
+    """time every phase on one truss definition and measure its peak memory
+
+    The timings are the best of repeat runs without tracing; the peak memory is measured in one
+    additional run under tracemalloc, which slows down the allocations.
+
+    Args:
+        path (path): .txt truss definition
+        repeat (int): timed runs, the fastest one is reported
+        memory (bool): measure the peak memory of every phase
+
+    Returns:
+        dict: {phase: {'time': seconds, 'peak': bytes or None}}
+    """
+    times = {name: float('inf') for name in PHASES}
+    for _ in range(repeat):
+        state = {'path': path}
+        for name, phase in zip(PHASES, _PHASE_FUNCTIONS):
+            start = time.perf_counter()
+            phase(state)
+            times[name] = min(times[name], time.perf_counter() - start)
+    peaks = {name: None for name in PHASES}
+    if memory:
+        state = {'path': path}
+        tracemalloc.start()
+        try:
+            for name, phase in zip(PHASES, _PHASE_FUNCTIONS):
+                tracemalloc.reset_peak()
+                current = tracemalloc.get_traced_memory()[0]
+                phase(state)
+                peaks[name] = tracemalloc.get_traced_memory()[1] - current
+        finally:
+            tracemalloc.stop()
+    return {name: {'time': times[name], 'peak': peaks[name]} for name in PHASES}
+
+def runBenchmark(families, sizes, repeat=3, memory=True, seed=0, load_cases=1):
+    """benchmark generated trusses of every family and size
+
+    Args:
+        families (list): truss families of generators.py
+        sizes (list): approximate numbers of members
+        repeat (int): timed runs per phase
+        memory (bool): measure the peak memory of every phase
+        seed (int): seed of the generated sections and loads
+        load_cases (int): number of load cases of the generated trusses
+
+    Returns:
+        list: one record per family and size with the phase timings
+    """
+    records = []
+    with tempfile.TemporaryDirectory() as directory:
+        for family in families:
+            for size in sizes:
+                bays = baysForMembers(family, size)
+                model = generateTruss(family, bays, load_cases=load_cases, seed=seed)
+                path = os.path.join(directory, '%s%d.txt' % (family, size))
+                writeText(model, path)
+                records.append({'family': family, 'size': size, 'bays': bays, 'members': model.number_of_members,
+                                'nodes': model.number_of_nodes, 'load_cases': load_cases,
+                                'phases': measurePhases(path, repeat, memory)})
+                del model
+                os.remove(path)
+    return records
+
+def compareBaseline(records, baseline, tolerance=1.25):
+    """find the phases which got slower or use more memory than in the baseline
+
+    Args:
+        records (list): output of runBenchmark
+        baseline (list): stored output of runBenchmark
+        tolerance (float): allowed ratio of the new to the baseline value
+
+    Returns:
+        list: (family, size, phase, quantity, baseline value, new value) of every regression
+    """
+    stored = {(r['family'], r['size']): r['phases'] for r in baseline}
+    regressions = []
+    for record in records:
+        key = (record['family'], record['size'])
+        if key not in stored:
+            continue
+        for name, new in record['phases'].items():
+            old = stored[key].get(name)
+            if old is None:
+                continue
+            if new['time'] > tolerance*old['time'] and new['time'] - old['time'] > MIN_TIME:
+                regressions.append(key + (name, 'time', old['time'], new['time']))
+            if new['peak'] is not None and old['peak'] is not None and new['peak'] > tolerance*max(old['peak'], 1):
+                regressions.append(key + (name, 'peak', old['peak'], new['peak']))
+    return regressions
+
+def formatTable(records):
+    """format the records as a text table, times in ms and the peak memory over all phases in MB
+
+    Returns:
+        str: the table
+    """
+    header = ['family', 'members'] + PHASES + ['peak MB']
+    rows = [header]
+    for record in records:
+        phases = record['phases']
+        peaks = [p['peak'] for p in phases.values() if p['peak'] is not None]
+        rows.append([record['family'], str(record['members'])] + ['%.2f' % (1000*phases[name]['time']) for name in PHASES] +
+                    ['%.1f' % (max(peaks)/2**20) if peaks else '-'])
+    widths = [max(len(row[k]) for row in rows) for k in range(len(header))]
+    return '\n'.join('  '.join(cell.rjust(width) for cell, width in zip(row, widths)) for row in rows)
+
+if __name__ == '__main__':
+    # python benchmark.py --families pratt warren --sizes 10 1000 100000 --save-baseline baseline.json
+    # python benchmark.py --families pratt warren --sizes 10 1000 100000 --baseline baseline.json
+    arg_parser = argparse.ArgumentParser(description='time the phases of the truss solver on generated trusses')
+    arg_parser.add_argument('--families', nargs='+', default=FAMILIES, choices=FAMILIES, help='truss families')
+    arg_parser.add_argument('--sizes', nargs='+', type=int, default=[10, 100, 1000, 10000, 100000], help='approximate numbers of members')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='timed runs per phase, the fastest one is reported')
+    arg_parser.add_argument('--load-cases', type=int, default=1, help='load cases of the generated trusses')
+    arg_parser.add_argument('--seed', type=int, default=0, help='seed of the generated sections and loads')
+    arg_parser.add_argument('--no-memory', action='store_true', help='skip the peak memory measurement')
+    arg_parser.add_argument('--json', help='write the records as JSON to this file, - for stdout')
+    arg_parser.add_argument('--baseline', help='JSON records to compare against, exits with 1 on regressions')
+    arg_parser.add_argument('--tolerance', type=float, default=1.25, help='allowed ratio to the baseline')
+    arg_parser.add_argument('--save-baseline', help='store the records as the new baseline')
+    args = arg_parser.parse_args()
+
+    records = runBenchmark(args.families, args.sizes, args.repeat, not args.no_memory, args.seed, args.load_cases)
+    if args.json == '-':
+        print(json.dumps(records, indent=1))
+    else:
+        print(formatTable(records))
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(records, f, indent=1)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(records, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compareBaseline(records, json.load(f), args.tolerance)
+        for family, size, phase, quantity, old, new in regressions:
+            print('regression: %s %d %s %s %.4g -> %.4g' % (family, size, phase, quantity, old, new), file=sys.stderr)
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,286 @@
+import os
+import time
+import json
+import zipfile
+import hashlib
+import tempfile
+import argparse
+from contextlib import contextmanager
+from collections import namedtuple, OrderedDict
+import numpy as np
+from node import DEFAULT_CASE
+from model import LOOSE
+from member import FailureResult
+from truss import Truss, validateModel
+try:
+    import fcntl
+except ImportError:
+    # no advisory locks (e.g. Windows): entries are still replaced atomically, only the eviction may race
+    fcntl = None
+
+# part of every key, bump it when the stored arrays change
+CACHE_VERSION = 1
+DEFAULT_MAX_BYTES = 256*2**20
+# temporary files of crashed writers are removed after this many seconds
+STALE_SECONDS = 3600
+
+# the solved quantities of Truss: unknown_forces, failures (members x cases), failure_result, load_cases, number_of_reactions
+CachedResult = namedtuple('CachedResult', ['unknown_forces', 'failures', 'failure_result', 'load_cases', 'number_of_reactions'])
+
+def _digest(h, *arrays):
+    """feed arrays with their dtype and shape into a hash
+    """
+    for a in arrays:
+        a = np.ascontiguousarray(a)
+        if a.dtype.kind == 'f':
+            # -0.0 and 0.0 hash the same
+            a = a + 0.0
+        h.update(('%s%s' % (a.dtype.str, a.shape)).encode())
+        h.update(a.tobytes())
+
+def geometryKey(model, method='equilibrium'):
+    """hash of everything the factorization depends on: node coordinates, supports, and connectivity,
+    for the stiffness method also the member stiffness
+
+    Args:
+        model (TrussModel): truss definition
+        method (str): solver method of Truss.solveForceEquations
+
+    Returns:
+        str: hex digest
+    """
+    h = hashlib.sha256(('truss geometry %d %s' % (CACHE_VERSION, method)).encode())
+    # the inclination only matters under loose nodes
+    _digest(h, model.xy, model.node_type, np.where(model.node_type == LOOSE, model.inclination, 0.0), model.connectivity)
+    if method == 'stiffness':
+        _digest(h, model.sectionProperties()[0], model.e_module)
+    return h.hexdigest()
+
+def resultKey(model, load_cases=None, method='equilibrium'):
+    """canonical hash of the parsed model: geometry, sections, materials, and loads
+
+    Names, whitespace, comments, and the order or splitting of the load lines do not change the key,
+    the loads are hashed as the assembled load matrix.
+
+    Args:
+        model (TrussModel): truss definition
+        load_cases (list, optional): names of the load cases to solve, by default every case of the model
+        method (str): solver method of Truss.solveForceEquations
+
+    Returns:
+        str: hex digest
+    """
+    if load_cases is None:
+        load_cases = model.load_cases if len(model.load_cases) > 0 else [DEFAULT_CASE]
+    h = hashlib.sha256(('truss result %s ' % geometryKey(model, method)).encode())
+    h.update(json.dumps(list(load_cases)).encode())
+    _digest(h, model.shape, model.dimensions, model.e_module, model.yield_strength, model.buildLoadMatrix(list(load_cases)))
+    return h.hexdigest()
+
+class ResultCache:
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES, max_factorizations=8):
+        """content-addressed on-disk cache of solved trusses
+
+        Every result is one compressed .npz file named by its key, written to a temporary file and
+        renamed into place, so readers never see a partial entry and need no lock. Hits refresh the
+        modification time; once the directory grows beyond max_bytes the least recently used entries
+        are evicted under an exclusive file lock. Factorizations cannot be stored on disk, the last
+        max_factorizations of this process are kept in memory by geometry key, so a truss which only
+        differs in its loads (or sections and materials) is solved without a new factorization.
+
+        Args:
+            directory (path): cache directory, created if needed
+            max_bytes (int): size limit of the stored entries
+            max_factorizations (int): factorizations kept in memory
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_factorizations = max_factorizations
+        self.statistics = {'hits': 0, 'misses': 0, 'factorization_hits': 0, 'stores': 0, 'evictions': 0}
+        self._factorizations = OrderedDict()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    @contextmanager
+    def _lock(self):
+        """exclusive lock of the cache directory shared by all processes
+        """
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, 'lock'), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _touch(self, path):
+        """mark an entry as used, the clock of Python is finer than the file system's own timestamps
+        """
+        now = time.time_ns()
+        try:
+            os.utime(path, ns=(now, now))
+        except OSError:
+            pass
+
+    def get(self, key):
+        """look up a result
+
+        Args:
+            key (str): result key (see resultKey)
+
+        Returns:
+            CachedResult: the stored result, None on a miss
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                failure_result = FailureResult(*[data[name] for name in FailureResult._fields])
+                load_cases = data['load_cases'].tolist()
+                result = CachedResult(data['unknown_forces'], failure_result.failure, failure_result, load_cases, int(data['number_of_reactions']))
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            # missing, evicted, or damaged entries are misses
+            self.statistics['misses'] = self.statistics['misses'] + 1
+            return None
+        self._touch(path)
+        self.statistics['hits'] = self.statistics['hits'] + 1
+        return result
+
+    def put(self, key, truss):
+        """store the result of a solved truss and evict the least recently used entries beyond max_bytes
+
+        Args:
+            key (str): result key (see resultKey)
+            truss (Truss): solved truss
+        """
+        arrays = dict(zip(FailureResult._fields, truss.failure_result))
+        arrays['unknown_forces'] = truss.unknown_forces
+        arrays['load_cases'] = np.array(truss.load_cases, dtype=str)
+        arrays['number_of_reactions'] = np.array(truss.number_of_reactions)
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as f:
+                np.savez_compressed(f, **arrays)
+            os.replace(temporary, self._path(key))
+        except BaseException:
+            os.unlink(temporary)
+            raise
+        self._touch(self._path(key))
+        self.statistics['stores'] = self.statistics['stores'] + 1
+        self.evict()
+
+    def _entries(self):
+        """(mtime, size, path) of all entries
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                status = os.stat(path)
+            except OSError:
+                continue
+            if name.endswith('.npz'):
+                entries.append((status.st_mtime, status.st_size, path))
+            elif name.endswith('.tmp') and time.time() - status.st_mtime > STALE_SECONDS:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+        return entries
+
+    def evict(self, max_bytes=None):
+        """remove the least recently used entries until the cache fits max_bytes
+
+        Returns:
+            int: number of removed entries
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        removed = 0
+        with self._lock():
+            entries = sorted(self._entries())
+            total = sum(size for mtime, size, path in entries)
+            for mtime, size, path in entries:
+                if total <= max_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                    removed = removed + 1
+                except OSError:
+                    pass
+                total = total - size
+        self.statistics['evictions'] = self.statistics['evictions'] + removed
+        return removed
+
+    def clear(self):
+        """remove all entries and the factorizations of this process
+        """
+        self._factorizations.clear()
+        return self.evict(0)
+
+    def stats(self):
+        """hit and miss counters of this cache object together with the size of the directory
+
+        Returns:
+            dict: counters, hit_rate, entries, and bytes
+        """
+        entries = self._entries()
+        lookups = self.statistics['hits'] + self.statistics['misses']
+        return dict(self.statistics, hit_rate=self.statistics['hits']/lookups if lookups else 0.0,
+                    entries=len(entries), bytes=sum(size for mtime, size, path in entries))
+
+    def solve(self, model, load_cases=None, method='equilibrium', check=False, profiler=None):
+        """solve a truss through the cache
+
+        Args:
+            model (TrussModel): truss definition
+            load_cases (list, optional): names of the load cases to solve
+            method (str): solver method of Truss.solveForceEquations
+            check (bool): run the rigidity check, on hits as well
+            profiler (Profiler, optional): collects the phases of a solve on a miss
+
+        Raises:
+            ValueError: system is not deterministic
+            ValueError: the truss is a mechanism or over-constrained (only with check)
+
+        Returns:
+            CachedResult: forces, failures, and the failure details
+        """
+        # an entry stored without the check must not let a mechanism through
+        validateModel(model, method, check, profiler)
+        key = resultKey(model, load_cases, method)
+        result = self.get(key)
+        if result is not None:
+            return result
+        geometry = geometryKey(model, method)
+        factorization = self._factorizations.get(geometry)
+        if factorization is not None:
+            self._factorizations.move_to_end(geometry)
+            self.statistics['factorization_hits'] = self.statistics['factorization_hits'] + 1
+        truss_solver = Truss.fromModel(model, load_cases)
+        # the rigidity check already ran above
+        truss_solver.solveForceEquations(profiler, method, False, factorization)
+        self._factorizations[geometry] = truss_solver.factorization
+        while len(self._factorizations) > self.max_factorizations:
+            self._factorizations.popitem(last=False)
+        self.put(key, truss_solver)
+        return CachedResult(truss_solver.unknown_forces, truss_solver.failures, truss_solver.failure_result,
+                            truss_solver.load_cases, truss_solver.number_of_reactions)
+
+if __name__ == '__main__':
+    # python cache.py .truss-cache [--clear] [--max-bytes 1000000]
+    arg_parser = argparse.ArgumentParser(description='inspect or clear a result cache directory')
+    arg_parser.add_argument('directory', help='cache directory')
+    arg_parser.add_argument('--clear', action='store_true', help='remove all entries')
+    arg_parser.add_argument('--max-bytes', type=int, help='evict the least recently used entries down to this size')
+    args = arg_parser.parse_args()
+
+    cache = ResultCache(args.directory)
+    if args.clear:
+        print('removed', cache.clear(), 'entries')
+    elif args.max_bytes is not None:
+        print('removed', cache.evict(args.max_bytes), 'entries')
+    stats = cache.stats()
+    print('entries =', stats['entries'], '; bytes =', stats['bytes'])
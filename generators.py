@@ -0,0 +1,219 @@
+import sys
+import numpy as np
+from model import TrussModel, FREE, LOOSE, FIXED
+
+# families of statically determinate trusses, all simply supported: fixed at the left end, loose at the right end
+FAMILIES = ['warren', 'pratt', 'howe', 'k', 'roof']
+
+def _names(prefix, indexes):
+    return np.char.add(prefix, np.asarray(indexes).astype(str))
+
+def warrenGeometry(bays, bay_length, height):
+    """Warren truss: bottom nodes B0..BN, top nodes T0..T(N-1) above the middle of every bay
+
+    Returns:
+        node_names, xy, connectivity, loaded nodes
+    """
+    k = np.arange(bays+1)
+    t = np.arange(bays)
+    names = np.concatenate([_names('B', k), _names('T', t)])
+    xy = np.concatenate([np.stack([k*bay_length, 0*k], axis=1), np.stack([(t+0.5)*bay_length, 0*t+height], axis=1)]).astype(float)
+    top = bays+1+t
+    connectivity = np.concatenate([np.stack([t, t+1], axis=1),               # bottom chord
+                                   np.stack([top[:-1], top[1:]], axis=1),   # top chord
+                                   np.stack([t, top], axis=1),              # rising diagonals
+                                   np.stack([top, t+1], axis=1)])           # falling diagonals
+    return names, xy, connectivity, top
+
+def _panelGeometry(bays, bay_length, height, pratt):
+    """Pratt and Howe trusses: bottom nodes B0..BN, top nodes T1..T(N-1), inclined end posts
+    """
+    if bays < 2:
+        raise ValueError('Pratt and Howe trusses need at least 2 bays')
+    k = np.arange(bays+1)
+    t = np.arange(1, bays)
+    names = np.concatenate([_names('B', k), _names('T', t)])
+    xy = np.concatenate([np.stack([k*bay_length, 0*k], axis=1), np.stack([t*bay_length, 0*t+height], axis=1)]).astype(float)
+    top = bays + t
+    # interior panels between the verticals p and p+1
+    p = np.arange(1, bays-1)
+    left = p+1 <= bays/2
+    if pratt:
+        # diagonals fall towards the middle of the span
+        diagonal = np.stack([np.where(left, top[p-1], top[p]), np.where(left, p+1, p)], axis=1)
+    else:
+        # diagonals rise towards the middle of the span
+        diagonal = np.stack([np.where(left, p, p+1), np.where(left, top[p], top[p-1])], axis=1)
+    connectivity = np.concatenate([np.stack([k[:-1], k[1:]], axis=1),                    # bottom chord
+                                   np.stack([top[:-1], top[1:]], axis=1),                 # top chord
+                                   np.stack([t, top], axis=1),                            # verticals
+                                   np.array([[0, top[0]], [bays, top[-1]]]),              # end posts
+                                   diagonal.reshape(-1, 2)])
+    return names, xy, connectivity, top
+
+def prattGeometry(bays, bay_length, height):
+    """Pratt truss, the diagonals are in tension under gravity loads
+
+    Returns:
+        node_names, xy, connectivity, loaded nodes
+    """
+    return _panelGeometry(bays, bay_length, height, True)
+
+def howeGeometry(bays, bay_length, height):
+    """Howe truss, the diagonals are in compression under gravity loads
+
+    Returns:
+        node_names, xy, connectivity, loaded nodes
+    """
+    return _panelGeometry(bays, bay_length, height, False)
+
+def kGeometry(bays, bay_length, height):
+    """K-truss: bottom nodes B0..BN, top nodes T0..TN, and a mid node M1..M(N-1) on every interior vertical
+
+    The K diagonals of the left half point to the left support and those of the right half to the
+    right support; the middle panel is braced by a single diagonal.
+
+    Returns:
+        node_names, xy, connectivity, loaded nodes
+    """
+    if bays < 2:
+        raise ValueError('K-trusses need at least 2 bays')
+    k = np.arange(bays+1)
+    v = np.arange(1, bays)
+    names = np.concatenate([_names('B', k), _names('T', k), _names('M', v)])
+    xy = np.concatenate([np.stack([k*bay_length, 0*k], axis=1), np.stack([k*bay_length, 0*k+height], axis=1),
+                         np.stack([v*bay_length, 0*v+height/2], axis=1)]).astype(float)
+    top = bays+1+k
+    mid = 2*bays+1+v
+    middle = bays//2
+    # the K diagonals of vertical v meet the previous vertical on the left, the next one on the right
+    other = np.where(v <= middle, v-1, v+1)
+    connectivity = np.concatenate([np.stack([k[:-1], k[1:]], axis=1),                    # bottom chord
+                                   np.stack([top[:-1], top[1:]], axis=1),                 # top chord
+                                   np.array([[0, top[0]], [bays, top[-1]]]),              # end verticals
+                                   np.stack([v, mid], axis=1),                            # lower half verticals
+                                   np.stack([mid, top[v]], axis=1),                       # upper half verticals
+                                   np.stack([mid, other], axis=1),                        # lower K diagonals
+                                   np.stack([mid, top[other]], axis=1),                   # upper K diagonals
+                                   np.array([[middle, top[middle+1]]])])                  # middle panel diagonal
+    return names, xy, connectivity, top
+
+def roofGeometry(bays, bay_length, height):
+    """Howe roof truss: bottom chord B0..BN, rafter nodes T1..T(N-1) rising to the apex over the middle
+
+    Returns:
+        node_names, xy, connectivity, loaded nodes
+    """
+    if bays < 2 or bays % 2 != 0:
+        raise ValueError('roof trusses need an even number of bays')
+    k = np.arange(bays+1)
+    t = np.arange(1, bays)
+    names = np.concatenate([_names('B', k), _names('T', t)])
+    rise = height*(1 - np.abs(t - bays/2)/(bays/2))
+    xy = np.concatenate([np.stack([k*bay_length, 0*k], axis=1), np.stack([t*bay_length, rise], axis=1)]).astype(float)
+    top = bays + t
+    rafter = np.concatenate([[0], top, [bays]])
+    # diagonals run from the rafters down towards the middle of the bottom chord
+    left = np.arange(1, bays//2)
+    right = np.arange(bays//2+1, bays)
+    connectivity = np.concatenate([np.stack([k[:-1], k[1:]], axis=1),                    # bottom chord
+                                   np.stack([rafter[:-1], rafter[1:]], axis=1),           # rafters
+                                   np.stack([t, top], axis=1),                            # verticals
+                                   np.stack([top[left-1], left+1], axis=1),               # left diagonals
+                                   np.stack([top[right-1], right-1], axis=1)])            # right diagonals
+    return names, xy, connectivity, top
+
+GEOMETRIES = {'warren': warrenGeometry, 'pratt': prattGeometry, 'howe': howeGeometry, 'k': kGeometry, 'roof': roofGeometry}
+
+def randomSections(m, rng):
+    """random I, T, C, and O sections of steel members
+
+    Returns:
+        shape, dimensions, e_module, yield_strength
+    """
+    shape = np.array(['I', 'T', 'C', 'O'])[rng.integers(0, 4, m)]
+    dimensions = np.stack([rng.uniform(0.05, 0.2, m), rng.uniform(0.1, 0.4, m), rng.uniform(0.005, 0.02, m)], axis=1)
+    circular = shape == 'O'
+    # tubes: outer diameter and wall thickness
+    dimensions[circular, 0] = rng.uniform(0.05, 0.3, np.count_nonzero(circular))
+    dimensions[circular, 1] = rng.uniform(0.003, 0.02, np.count_nonzero(circular))
+    dimensions[circular, 2] = 0
+    return shape, dimensions, np.full(m, 210000000000.0), rng.choice([235000000.0, 340000000.0, 460000000.0], m)
+
+def generateTruss(family, bays, bay_length=1.0, height=1.0, load=10000.0, load_pattern='uniform', load_cases=1, seed=None):
+    """generate a statically determinate truss of a standard family
+
+    Args:
+        family (str): warren, pratt, howe, k, or roof
+        bays (int): number of bays (panels) along the span
+        bay_length (float): length of one bay
+        height (float): height of the truss
+        load (float): force amplitude per loaded node
+        load_pattern (str): uniform (downward force on every top node), random (random amplitudes and angles), or point (one force at mid span)
+        load_cases (int): number of load cases, the first follows load_pattern and the others are random
+        seed (int, optional): seed of the random sections and loads
+
+    Raises:
+        ValueError: unknown family or load pattern
+
+    Returns:
+        TrussModel: the generated truss
+    """
+    if family not in GEOMETRIES:
+        raise ValueError('unknown truss family %s' % family)
+    rng = np.random.default_rng(seed)
+    names, xy, connectivity, top = GEOMETRIES[family](bays, bay_length, height)
+    n = len(names)
+    node_type = np.full(n, FREE, dtype=np.int8)
+    node_type[0] = FIXED
+    node_type[bays] = LOOSE
+    member_names = np.char.add(np.char.add(names[connectivity[:, 0]], '-'), names[connectivity[:, 1]])
+    shape, dimensions, e_module, yield_strength = randomSections(len(connectivity), rng)
+
+    load_node = []
+    load_magnitude = []
+    load_angle = []
+    load_case = []
+    for c in range(load_cases):
+        pattern = load_pattern if c == 0 else 'random'
+        if pattern == 'uniform':
+            nodes = top
+            magnitude = np.full(len(top), load)
+            angle = np.full(len(top), 270.0)
+        elif pattern == 'random':
+            nodes = rng.choice(n, max(1, n//4), replace=False)
+            magnitude = rng.uniform(0, load, len(nodes))
+            angle = rng.uniform(180, 360, len(nodes))
+        elif pattern == 'point':
+            nodes = np.array([bays//2])
+            magnitude = np.array([load])
+            angle = np.array([270.0])
+        else:
+            raise ValueError('unknown load pattern %s' % pattern)
+        load_node.append(nodes)
+        load_magnitude.append(magnitude)
+        load_angle.append(angle)
+        load_case.append(np.full(len(nodes), c))
+    case_names = ['LC%d' % (c+1) for c in range(load_cases)] if load_cases > 1 else None
+
+    return TrussModel(names, xy, node_type, np.zeros(n), member_names, connectivity, shape, dimensions, e_module, yield_strength,
+                      np.concatenate(load_node), np.concatenate(load_magnitude), np.concatenate(load_angle), np.concatenate(load_case), case_names)
+
+def baysForMembers(family, members):
+    """number of bays which gives about the requested number of members
+
+    Returns:
+        int: bays
+    """
+    per_bay = {'warren': 4, 'pratt': 4, 'howe': 4, 'k': 6, 'roof': 4}[family]
+    bays = max(2, int(round(members/per_bay)))
+    if family == 'roof':
+        bays = bays + bays % 2
+    return bays
+
+if __name__ == '__main__':
+    # python generators.py pratt 100 pratt100.txt
+    from loader import writeText
+    family = sys.argv[1]
+    bays = int(sys.argv[2])
+    writeText(generateTruss(family, bays, seed=0), sys.argv[3])
@@ -0,0 +1,178 @@
+import sys
+import argparse
+import numpy as np
+import scipy.sparse as sp
+from collections import namedtuple
+
+# extreme forces of every unknown over all vehicle positions, with the lead axle position where they occur
+Envelope = namedtuple('Envelope', ['maximum', 'minimum', 'max_position', 'min_position'])
+
+def _nodeIndexes(model, nodes):
+    """map node names (or indexes) onto node indexes
+
+    Raises:
+        ValueError: The external force is acting on the undefined node
+    """
+    index = {str(name): i for i, name in enumerate(model.node_names)}
+    try:
+        return np.array([index[n] if isinstance(n, str) else int(n) for n in nodes], dtype=np.int64)
+    except KeyError:
+        raise ValueError('The external force is acting on the undefined node')
+
+def unitLoads(model, nodes, angle=270.0):
+    """load matrix with a unit force on one node per column
+
+    Args:
+        model (TrussModel): truss definition
+        nodes (list): node names or indexes
+        angle(deg) (float): direction of the unit force, downwards by default
+
+    Returns:
+        ndarray: (2N, len(nodes)) external forces
+    """
+    nodes = _nodeIndexes(model, nodes)
+    f = np.zeros((2*model.number_of_nodes, len(nodes)))
+    position = np.arange(len(nodes))
+    f[2*nodes, position] = np.cos(angle*np.pi/180)
+    f[2*nodes+1, position] = np.sin(angle*np.pi/180)
+    return f
+
+def influenceMatrix(truss, nodes, angle=270.0, chunk_size=1024):
+    """influence lines of all member forces and reactions for a unit load moving over the nodes
+
+    The truss matrix is factorized once; the unit loads are solved chunk_size columns at a time.
+
+    Args:
+        truss (Truss): truss solver, solved first if it was not solved yet
+        nodes (list): loaded node names or indexes, e.g. the deck nodes
+        angle(deg) (float): direction of the unit load
+        chunk_size (int): unit loads solved at once
+
+    Returns:
+        ndarray: (members+reactions, len(nodes)) force per unit load at each node
+    """
+    if getattr(truss, 'factorization', None) is None:
+        truss.solveForceEquations()
+    nodes = _nodeIndexes(truss.model, nodes)
+    influence = np.zeros((truss.number_of_member + truss.number_of_reactions, len(nodes)))
+    for start in range(0, len(nodes), chunk_size):
+        columns = slice(start, min(start+chunk_size, len(nodes)))
+        influence[:, columns] = truss.solveLoads(unitLoads(truss.model, nodes[columns], angle))
+    return influence
+
+def axlePositions(stations, axle_offsets):
+    """lead axle positions at which some axle stands on a node
+
+    The influence lines are linear between the nodes, so the force of an axle group is extreme
+    when one of its axles stands on a node.
+
+    Returns:
+        ndarray: sorted lead axle positions
+    """
+    return np.unique((stations[:, None] + np.asarray(axle_offsets, dtype=float)[None, :]).ravel())
+
+def axleLoads(stations, positions, axle_offsets, axle_loads):
+    """distribute every axle onto the two nodes around it (simply supported deck panels)
+
+    Args:
+        stations (array): (P,) increasing distances of the path nodes from the start of the path
+        positions (array): (S,) lead axle positions
+        axle_offsets (array): (A,) distances of the axles behind the lead axle
+        axle_loads (array): (A,) axle forces
+
+    Returns:
+        csc_matrix: (P, S) nodal loads of every vehicle position
+    """
+    offsets = np.asarray(axle_offsets, dtype=float)
+    x = (positions[None, :] - offsets[:, None]).ravel()
+    weight = np.repeat(np.asarray(axle_loads, dtype=float), len(positions))
+    column = np.tile(np.arange(len(positions)), len(offsets))
+    # axles off the path do not load the truss
+    on = (x >= stations[0]) & (x <= stations[-1])
+    x = x[on]
+    weight = weight[on]
+    column = column[on]
+    panel = np.clip(np.searchsorted(stations, x, side='right') - 1, 0, len(stations)-2)
+    t = (x - stations[panel])/(stations[panel+1] - stations[panel])
+    rows = np.concatenate([panel, panel+1])
+    cols = np.concatenate([column, column])
+    values = np.concatenate([weight*(1-t), weight*t])
+    return sp.csc_matrix((values, (rows, cols)), shape=(len(stations), len(positions)))
+
+def movingLoad(truss, path, axle_offsets, axle_loads, angle=270.0, positions=None, chunk_size=256):
+    """envelopes of all member forces and reactions for an axle group moving along a path of nodes
+
+    Args:
+        truss (Truss): truss solver, solved first if it was not solved yet
+        path (list): node names or indexes in the driving order, at least two
+        axle_offsets (list): distances of the axles behind the lead axle
+        axle_loads (list): axle forces
+        angle(deg) (float): direction of the axle loads
+        positions (array, optional): lead axle positions along the path, by default every position with an axle on a node
+        chunk_size (int): vehicle positions evaluated at once, bounds the memory to unknowns x chunk_size
+
+    Raises:
+        ValueError: the path has less than two nodes or a segment of zero length
+
+    Returns:
+        Envelope: max/min force of every unknown and the lead axle positions where they occur
+    """
+    if getattr(truss, 'factorization', None) is None:
+        truss.solveForceEquations()
+    model = truss.model
+    nodes = _nodeIndexes(model, path)
+    if len(nodes) < 2:
+        raise ValueError('the path needs at least two nodes')
+    segments = np.hypot(*np.diff(model.xy[nodes], axis=0).T)
+    if np.any(segments <= 0):
+        raise ValueError('the path has a segment of zero length')
+    # distance of every path node from the start of the path
+    stations = np.concatenate([[0], np.cumsum(segments)])
+    if positions is None:
+        positions = axlePositions(stations, axle_offsets)
+    positions = np.asarray(positions, dtype=float)
+    W = axleLoads(stations, positions, axle_offsets, axle_loads)
+    direction = np.array([np.cos(angle*np.pi/180), np.sin(angle*np.pi/180)])
+
+    size = truss.number_of_member + truss.number_of_reactions
+    maximum = np.full(size, -np.inf)
+    minimum = np.full(size, np.inf)
+    max_position = np.zeros(size)
+    min_position = np.zeros(size)
+    for start in range(0, len(positions), chunk_size):
+        columns = slice(start, min(start+chunk_size, len(positions)))
+        # the nodal loads of a chunk of vehicle positions are solved like load cases
+        f = np.zeros((2*model.number_of_nodes, columns.stop - columns.start))
+        loads = W[:, columns].toarray()
+        np.add.at(f, 2*nodes, direction[0]*loads)
+        np.add.at(f, 2*nodes+1, direction[1]*loads)
+        forces = truss.solveLoads(f)
+        high = np.argmax(forces, axis=1)
+        low = np.argmin(forces, axis=1)
+        value = forces[np.arange(size), high]
+        better = value > maximum
+        maximum[better] = value[better]
+        max_position[better] = positions[columns][high[better]]
+        value = forces[np.arange(size), low]
+        better = value < minimum
+        minimum[better] = value[better]
+        min_position[better] = positions[columns][low[better]]
+    return Envelope(maximum, minimum, max_position, min_position)
+
+if __name__ == '__main__':
+    # python influence.py bridge.txt --path B0 B1 B2 B3 B4 --axles 0:35000 4.3:145000 8.6:145000
+    from loader import loadTruss
+    from truss import Truss
+    arg_parser = argparse.ArgumentParser(description='member force envelopes of an axle group moving along a path of nodes')
+    arg_parser.add_argument('truss_definition', help='.txt or binary truss definition')
+    arg_parser.add_argument('--path', nargs='+', required=True, help='node names in the driving order')
+    arg_parser.add_argument('--axles', nargs='+', required=True, help='offset:force of every axle, offsets behind the lead axle')
+    arg_parser.add_argument('--angle', type=float, default=270.0, help='direction of the axle loads in degrees')
+    args = arg_parser.parse_args()
+
+    model = loadTruss(args.truss_definition)
+    axles = np.array([[float(v) for v in a.split(':')] for a in args.axles])
+    envelope = movingLoad(Truss.fromModel(model), args.path, axles[:, 0], axles[:, 1], args.angle)
+    for k in range(model.number_of_members):
+        print('member', model.member_names[k], 'max =', envelope.maximum[k], 'at', envelope.max_position[k],
+              '; min =', envelope.minimum[k], 'at', envelope.min_position[k])
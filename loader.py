@@ -0,0 +1,314 @@
+import sys
+import re
+import json
+from operator import itemgetter
+import numpy as np
+from node import DEFAULT_CASE
+from model import TrussModel, NODE_TYPES, MEMBER_SHAPES
+
+# binary container: magic, header length, json header, then the raw arrays aligned to ALIGNMENT bytes
+MAGIC = b'TRUSSBIN'
+VERSION = 1
+ALIGNMENT = 64
+# lookup table of the bytes str.split() treats as whitespace
+WHITESPACE = np.zeros(256, dtype=bool)
+WHITESPACE[[9, 10, 11, 12, 13, 32]] = True
+# arrays stored in the binary container, in this order
+ARRAY_FIELDS = ['node_names', 'xy', 'node_type', 'inclination', 'member_names', 'connectivity', 'shape', 'dimensions',
+                'e_module', 'yield_strength', 'load_node', 'load_magnitude', 'load_angle', 'load_case']
+
+def _splitRows(section):
+    """tokenize a section, every non-empty line is one row
+
+    Returns:
+        tokens: flat list of all tokens
+        starts: (rows,) index of the first token of every row
+        widths: (rows,) number of tokens of every row
+    """
+    tokens = section.split()
+    if not tokens:
+        # an empty section, or one with comments only, has no rows
+        return tokens, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    # count the tokens of every line on the raw bytes instead of splitting line by line
+    data = np.frombuffer(section.encode(), dtype=np.uint8)
+    space = WHITESPACE[data]
+    first = ~space
+    first[1:] = first[1:] & space[:-1]
+    token_line = np.cumsum(data == 10, dtype=np.int32)[first]
+    change = np.flatnonzero(np.diff(token_line)) + 1
+    widths = np.diff(np.concatenate([[0], change, [len(token_line)]])).astype(np.int64)
+    if widths.sum() != len(tokens):
+        # exotic whitespace, fall back to splitting line by line
+        rows = [row for row in map(str.split, section.split('\n')) if row]
+        widths = np.fromiter(map(len, rows), dtype=np.int64, count=len(rows))
+    starts = np.cumsum(widths) - widths
+    return tokens, starts, widths
+
+def _column(tokens, index, dtype=float):
+    """gather one column of tokens into an array
+
+    Args:
+        tokens (list): flat list of tokens
+        index (array): token index of every row
+        dtype: float for numeric columns or str for names
+
+    Returns:
+        ndarray: the column
+    """
+    if len(index) == 0:
+        return np.zeros(0, dtype=dtype)
+    values = itemgetter(*index.tolist())(tokens) if len(index) > 1 else (tokens[index[0]],)
+    if dtype is str:
+        return np.array(values, dtype=str)
+    return np.fromiter(map(float, values), dtype=float, count=len(values))
+
+def _lookup(names, keys):
+    """find the index of every key in names
+
+    Returns:
+        index: (keys,) position of every key in names
+        found: (keys,) if the key is defined
+    """
+    order = np.argsort(names, kind='stable')
+    sorted_names = names[order]
+    position = np.clip(np.searchsorted(sorted_names, keys), 0, max(len(names) - 1, 0))
+    if len(names) == 0:
+        return np.zeros(len(keys), dtype=np.int64), np.zeros(len(keys), dtype=bool)
+    return order[position], sorted_names[position] == keys
+
+def parseText(text):
+    """parse the text truss definition column-wise into a TrussModel
+
+    Raises:
+        ValueError: The node is defined more than once
+        ValueError: The member is connecting to the undefined node
+        ValueError: The member is connecting a node to itself
+        ValueError: Please config the member in a correct way
+        ValueError: The external force is acting on the undefined node
+
+    Returns:
+        TrussModel: the array-backed model
+    """
+    # comments start with '#' and run to the end of the line
+    if '#' in text:
+        text = re.sub(r'#[^\n]*', '', text)
+    # Extract file info into three parts
+    # split the buffer by '----\n'
+    infos = text.split('----\n')
+    if len(infos) < 3:
+        raise ValueError('The truss definition needs a node, a member, and a force section')
+
+    # nodes: name, type, [inclination], x, y
+    tokens, starts, widths = _splitRows(infos[0])
+    if np.any((widths != 4) & (widths != 5)):
+        raise ValueError('Please config the node in a correct way')
+    node_names = _column(tokens, starts, str)
+    unique_names, counts = np.unique(node_names, return_counts=True)
+    if np.any(counts > 1):
+        raise ValueError('The node %s is defined more than once' % unique_names[np.argmax(counts > 1)])
+    type_names = _column(tokens, starts+1, str)
+    node_type = np.full(len(starts), -1, dtype=np.int8)
+    for code, name in enumerate(NODE_TYPES):
+        node_type[type_names == name] = code
+    if np.any(node_type < 0):
+        raise ValueError('wrong type for nodes')
+    # check if it contains angle info
+    angled = widths > 4
+    inclination = np.where(angled, _column(tokens, starts+2), 0)
+    xy = np.stack([_column(tokens, starts+2+angled), _column(tokens, starts+3+angled)], axis=1)
+
+    # members: name, shape, dimensions..., young's modulus, yield strength
+    tokens, starts, widths = _splitRows(infos[1])
+    member_names = _column(tokens, starts, str)
+    connectors = np.char.partition(member_names, '-')
+    index_i, found_i = _lookup(node_names, connectors[:, 0])
+    index_j, found_j = _lookup(node_names, connectors[:, 2])
+    # a row without a shape reads its own name instead of the next row and is rejected below
+    short = widths < 2
+    shape = _column(tokens, np.where(short, starts, starts+1), str)
+    circular = shape == 'O'
+    known = np.isin(shape, MEMBER_SHAPES) & ~short
+    # the I-shape, C-shape, and T-shape members have 3 dimensions, the O-shape members 2
+    bad_node = ~(found_i & found_j)
+    bad_loop = ~bad_node & (index_i == index_j)
+    bad_config = short | (known & (widths != np.where(circular, 6, 7)))
+    bad = bad_node | bad_loop | bad_config | ~(known | short)
+    if np.any(bad):
+        # report the error of the first bad line like the line by line parser did
+        k = np.argmax(bad)
+        if bad_node[k]:
+            raise ValueError('The member is connecting to the undefined node')
+        if bad_loop[k]:
+            raise ValueError('The member is connecting a node to itself')
+        if bad_config[k]:
+            raise ValueError('Please config the member in a correct way')
+        raise ValueError('Wrong type for members')
+    connectivity = np.stack([index_i, index_j], axis=1)
+    dimensions = np.zeros((len(starts), 3))
+    dimensions[:, 0] = _column(tokens, starts+2)
+    dimensions[:, 1] = _column(tokens, starts+3)
+    dimensions[:, 2] = np.where(circular, 0, _column(tokens, starts+4))
+    e_module = _column(tokens, starts+widths-2)
+    yield_strength = _column(tokens, starts+widths-1)
+
+    # forces: node, amplitude, angle, [load case]
+    tokens, starts, widths = _splitRows(infos[2])
+    load_node, found = _lookup(node_names, _column(tokens, starts, str))
+    if not np.all(found):
+        raise ValueError('The external force is acting on the undefined node')
+    if np.any((widths != 3) & (widths != 4)):
+        raise ValueError('Please config the external force in a correct way')
+    load_magnitude = _column(tokens, starts+1)
+    load_angle = _column(tokens, starts+2)
+    # the optional fourth column names the load case
+    named = widths > 3
+    case_names = np.where(named, _column(tokens, np.where(named, starts+3, starts), str), DEFAULT_CASE)
+    # keep the cases in the order they first appear
+    load_cases, first, load_case = np.unique(case_names, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    load_case = rank[load_case.reshape(-1)]
+    load_cases = [str(c) for c in load_cases[order]]
+
+    return TrussModel(node_names, xy, node_type, inclination, member_names, connectivity, shape, dimensions, e_module, yield_strength,
+                      load_node, load_magnitude, load_angle, load_case, load_cases)
+
+def loadText(truss_definition):
+    """load a text truss definition
+
+    Args:
+        truss_definition (path): .txt file path
+
+    Returns:
+        TrussModel: the array-backed model
+    """
+    with open(truss_definition) as f:
+        return parseText(f.read())
+
+def formatText(model):
+    """format the model as a text truss definition, the inverse of parseText
+
+    Returns:
+        str: the truss definition
+    """
+    _str = lambda a: np.asarray(a).astype(str)
+    _join = lambda *columns: '\n'.join(map(' '.join, zip(*columns))) + '\n'
+    node_type = np.asarray(NODE_TYPES)[np.asarray(model.node_type)]
+    # only loose nodes carry the inclination of their support
+    loose = np.asarray(model.node_type) == NODE_TYPES.index('Loose')
+    node_type = np.where(loose, np.char.add(np.char.add(node_type, ' '), _str(model.inclination)), node_type)
+    nodes = _join(_str(model.node_names), node_type, _str(model.xy[:, 0]), _str(model.xy[:, 1]))
+
+    dimensions = _str(model.dimensions)
+    # the O-shape members have 2 dimensions
+    third = np.where(np.asarray(model.shape) == 'O', '', np.char.add(' ', dimensions[:, 2]))
+    dimensions = np.char.add(np.char.add(np.char.add(dimensions[:, 0], ' '), dimensions[:, 1]), third)
+    members = _join(_str(model.member_names), _str(model.shape), dimensions, _str(model.e_module), _str(model.yield_strength))
+
+    forces = [_str(model.node_names)[np.asarray(model.load_node)], _str(model.load_magnitude), _str(model.load_angle)]
+    if list(model.load_cases) != [DEFAULT_CASE]:
+        forces.append(np.asarray(model.load_cases, dtype=str)[np.asarray(model.load_case)])
+    return nodes + '----\n' + members + '----\n' + (_join(*forces) if len(model.load_node) else '')
+
+def writeText(model, path):
+    """write the model as a text truss definition
+
+    Args:
+        model (TrussModel): truss definition
+        path (path): output .txt file path
+    """
+    with open(path, 'w') as f:
+        f.write(formatText(model))
+
+def saveBinary(model, path):
+    """write the model into the binary container
+
+    Args:
+        model (TrussModel): truss definition
+        path (path): output file path
+    """
+    header = {'version': VERSION, 'load_cases': model.load_cases, 'arrays': {}}
+    arrays = [np.ascontiguousarray(getattr(model, name)) for name in ARRAY_FIELDS]
+    # the header length changes the offsets, so reserve room for it first
+    header_size = len(json.dumps({**header, 'arrays': {name: {'dtype': a.dtype.str, 'shape': a.shape, 'offset': 10**15} for name, a in zip(ARRAY_FIELDS, arrays)}}))
+    offset = -(-(len(MAGIC) + 8 + header_size) // ALIGNMENT)*ALIGNMENT
+    for name, a in zip(ARRAY_FIELDS, arrays):
+        header['arrays'][name] = {'dtype': a.dtype.str, 'shape': list(a.shape), 'offset': offset}
+        offset = offset + -(-a.nbytes // ALIGNMENT)*ALIGNMENT
+    encoded = json.dumps(header).encode()
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(encoded)).tobytes())
+        f.write(encoded)
+        for name, a in zip(ARRAY_FIELDS, arrays):
+            f.write(b'\0'*(header['arrays'][name]['offset'] - f.tell()))
+            f.write(a.tobytes())
+
+def loadBinary(path, mmap=True):
+    """load a model from the binary container
+
+    Args:
+        path (path): binary file path
+        mmap (bool): memory-map the arrays instead of reading them into memory
+
+    Raises:
+        ValueError: the file is not a binary truss definition
+
+    Returns:
+        TrussModel: the array-backed model, backed by the file if mmap is True
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError('The file is not a binary truss definition')
+        size = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+        header = json.loads(f.read(size).decode())
+        arrays = {}
+        for name in ARRAY_FIELDS:
+            info = header['arrays'][name]
+            dtype = np.dtype(info['dtype'])
+            shape = tuple(info['shape'])
+            if int(np.prod(shape)) == 0:
+                arrays[name] = np.zeros(shape, dtype=dtype)
+            elif mmap:
+                arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=info['offset'], shape=shape)
+            else:
+                f.seek(info['offset'])
+                arrays[name] = np.fromfile(f, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+    return TrussModel(load_cases=header['load_cases'], **arrays)
+
+def isBinary(path):
+    """check the magic bytes of a file
+
+    Returns:
+        bool: if the file is a binary truss definition
+    """
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def loadTruss(truss_definition, mmap=True):
+    """load a truss definition in either the text or the binary format
+
+    Args:
+        truss_definition (path): .txt or binary file path
+        mmap (bool): memory-map binary files
+
+    Returns:
+        TrussModel: the array-backed model
+    """
+    if isBinary(truss_definition):
+        return loadBinary(truss_definition, mmap=mmap)
+    return loadText(truss_definition)
+
+def convert(source, destination):
+    """convert a text truss definition into the binary format
+
+    Args:
+        source (path): .txt file path
+        destination (path): binary file path
+    """
+    saveBinary(loadText(source), destination)
+
+if __name__ == '__main__':
+    # python loader.py trussN.txt trussN.trb
+    convert(sys.argv[1], sys.argv[2])
@@ -1,119 +1,127 @@
 import sys
-from truss import Truss
-from node import Node
+import argparse
+# numpy, scipy, and the solver modules are imported where they are used, so --help and --validate start fast
 
-def run(truss_definition, verbose):
-    """post precess the txt file
+def run(truss_definition, verbose, profiler=None, method='equilibrium', check=False, cache=None, deflection_limit=None,
+        summary=None, export=None, as_result=False):
+    """post precess the truss definition file
 
     Args:
-        truss_definition (path): .txt file path 
+        truss_definition (path): .txt file path or binary file path (see loader.py)
+        profiler (Profiler, optional): collects per-phase statistics, read them with profiler.stats() after the call
+        method (str): 'equilibrium' for statically determinate trusses, 'joints' for simple ones, or 'stiffness' for any stable truss
+        check (bool): reject mechanisms with the rigidity check before the matrix is built
+        cache (ResultCache or path, optional): reuse results and factorizations of earlier solves
+        deflection_limit (float, optional): also solve the nodal displacements and check them against this limit
+        summary (int, optional): verbose output lists only every failing member and this many top utilized members per load case
+        export (path, optional): write the labelled results to a .csv, .jsonl, or .npz file (see results.py)
+        as_result (bool): return the labelled results.TrussResult instead of the list
 
     Returns:
-        list: the first element is the force vector, and the second element is the failure vector
+        list: the first element is the force vector (one column per load case), and the second element is the failure vector
     """    
+    from truss import Truss
+    from results import TrussResult
+    from loader import loadTruss, ARRAY_FIELDS
+    from profiling import phase
+    from cache import ResultCache
+    # parse the nodes, members, and forces column-wise into arrays
+    with phase(profiler, 'load'):
+        model = loadTruss(truss_definition)
+        if profiler is not None:
+            profiler.recordArrays(*[getattr(model, name) for name in ARRAY_FIELDS])
 
-    with open(truss_definition) as f:
-        lines = f.read()
+    # the cache keeps forces and failures only, the deflection check needs the factorization
+    if cache is not None and deflection_limit is None:
+        if not isinstance(cache, ResultCache):
+            cache = ResultCache(cache)
+        # the cached result has the same fields as the solved truss
+        truss_solver = cache.solve(model, method=method, check=check, profiler=profiler)
+    else:
+        # init truss
+        truss_solver = Truss.fromModel(model)
+        # compute the member axis forces, reaction forces, and failures
+        truss_solver.solveForceEquations(profiler, method, check)
+        if deflection_limit is not None:
+            truss_solver.solveDisplacements(profiler)
+            truss_solver.checkDeflections(deflection_limit)
 
-    # Extract file info into three parts
-    # split the buffer by '----\n'
-    infos = lines.split('----\n')
-    node_info = infos[0]
-    member_info = infos[1]
-    force_info = infos[2]
+    with phase(profiler, 'output'):
+        result = TrussResult.fromTruss(model, truss_solver)
+        if verbose:
+            printResults(result, summary)
+        if export is not None:
+            result.export(export)
 
-    # init nodes
-    node_info = node_info.split('\n')
-    node_info = list(filter(None, node_info))
-    node_dict = {}
-    for i in range(len(node_info)):
-        node_definition = node_info[i].split(' ')
-        node_definition = list(filter(None, node_definition))
-        node_name = node_definition[0]
-        node_type = node_definition[1]
-        # check if it contains angle info
-        if len(node_definition) > 4:
-            angle = float(node_definition[2])
-            x = float(node_definition[3])
-            y = float(node_definition[4])
-        else:
-            angle = 0
-            x = float(node_definition[2])
-            y = float(node_definition[3])
-        
-        # add a initialized node to dict
-        node_dict[node_name] = Node(i, node_type, x, y, inclination=angle)
+    if as_result:
+        return result
+    return [truss_solver.unknown_forces, result.failure_vector]
 
-    # init member
-    member_info = member_info.split('\n')
-    member_info = list(filter(None, member_info))
-    member_names = []
-    for i in range(len(member_info)):
-        member_definition = member_info[i].split(' ')       
-        member_definition = list(filter(None, member_definition))
-        member_names.append(member_definition[0])
-        connectors = member_definition[0].split('-')
-        if connectors[0] not in node_dict.keys() or connectors[1] not in node_dict.keys():
-            raise ValueError('The member is connecting to the undefined node')
-        shape = member_definition[1]
-        if shape == 'O':
-            if len(member_definition[2:]) != 4:
-                raise ValueError('Please config the member in a correct way')
-        elif shape == 'I' or shape == 'C' or shape == 'T':
-            if len(member_definition[2:]) != 5:
-                raise ValueError('Please config the member in a correct way')
-        if shape == 'O':
-            if len(member_definition[2:-2]) != 2:
-                raise ValueError('The O-shape member should have 2 dimensions')
-        elif shape == 'I' or shape == 'C' or shape == 'T':
-            if len(member_definition[2:-2]) != 3:
-                raise ValueError('The I-shape, C-shape, and T-shape member should have 3 dimensions')
-        dimensions = [float(i) for i in member_definition[2:-2]]
-        e_module = float(member_definition[-2])
-        yield_strength = float(member_definition[-1])
+def validate(truss_definition, method='equilibrium'):
+    """parse the truss definition and check it with the rigidity check, no matrix is built
 
-        # add members to each node
-        node_dict[connectors[0]].add_member(i, node_dict[connectors[0]], node_dict[connectors[1]], shape, dimensions, e_module, yield_strength)
-        node_dict[connectors[1]].add_member(i, node_dict[connectors[1]], node_dict[connectors[0]], shape, dimensions, e_module, yield_strength)
+    Args:
+        truss_definition (path): .txt file path or binary file path (see loader.py)
+        method (str): 'stiffness' accepts statically indeterminate trusses
 
-    # init forces
-    force_info = force_info.split('\n')
-    force_info = list(filter(None, force_info))
-    for i in range(len(force_info)):
-        force_definition = force_info[i].split(' ')          
-        force_definition = list(filter(None, force_definition))
-        bearing_node = force_definition[0]
-        if bearing_node not in node_dict.keys():
-            raise ValueError('The external force is acting on the undefined node')
-        magnitude = float(force_definition[1])
-        angle = float(force_definition[2])
+    Raises:
+        ValueError: the definition can not be parsed, the system is not deterministic, or the truss is a mechanism
 
-        # add the force to the specified node
-        node_dict[bearing_node].add_force(magnitude, angle)
+    Returns:
+        TrussModel: the parsed model
+    """
+    from loader import loadTruss
+    from truss import validateModel
+    model = loadTruss(truss_definition)
+    validateModel(model, method, True)
+    return model
 
-    # init truss
-    truss_solver = Truss(node_dict, len(member_info))
-    # compute the member axis forces, reaction forces, and failures
-    truss_solver.solveForceEquations()
+def printResults(result, summary=None):
+    """print the member forces, failures, and reaction forces of every load case
 
-    if verbose:
-        for i in range(len(member_names)):
-            print('member', member_names[i], 'force =', truss_solver.unknown_forces[i], '; the member fails: ', truss_solver.failures[i])
-        
-        r = 0
-        for i, key in enumerate(truss_solver.nodes):
-            if truss_solver.nodes[key].r is not None:
-                if truss_solver.nodes[key].type == 'Loose':
-                    print('reaction force of node', key, '=', truss_solver.unknown_forces[len(member_info)+r, 0])
-                    r = r + 1
-                elif truss_solver.nodes[key].type == 'Fixed':
-                    print('reaction force of node', key, 'in x direction =', truss_solver.unknown_forces[len(member_info)+r, 0])
-                    print('reaction force of node', key, 'in y direction =', truss_solver.unknown_forces[len(member_info)+r+1, 0])
-                    r = r + 2
-    
-    return [truss_solver.unknown_forces, truss_solver.failures]
+    Args:
+        result (TrussResult): labelled results
+        summary (int, optional): print only every failing member and this many top utilized members per load case
+    """
+    if summary is None:
+        result.writeText(sys.stdout)
+    else:
+        print(result.summary(summary))
 
 if  __name__ == '__main__':
-    # pass the .txt file as the first argument
-    truss_definition = sys.argv[1]
-    run(truss_definition, True)
\ No newline at end of file
+    # python main.py truss2.txt [--profile] [--profile-json stats.json]
+    arg_parser = argparse.ArgumentParser(description='solve a truss definition and check the members for failure')
+    arg_parser.add_argument('truss_definition', help='.txt or binary truss definition')
+    arg_parser.add_argument('--method', choices=['equilibrium', 'joints', 'stiffness'], default='equilibrium',
+                            help='global joint equilibrium, joint by joint for simple trusses, or direct stiffness method')
+    arg_parser.add_argument('--check', action='store_true', help='name flexible joints and redundant members before the solve')
+    arg_parser.add_argument('--validate', action='store_true', help='only parse and check the definition, nothing is solved')
+    arg_parser.add_argument('--deflection-limit', type=float, help='print the nodal displacements and check them against this limit')
+    arg_parser.add_argument('--summary', type=int, metavar='K', help='only print the failing and the K most utilized members')
+    arg_parser.add_argument('--export', help='write the results to a .csv, .jsonl, or .npz file')
+    arg_parser.add_argument('--cache', help='directory of the result cache')
+    arg_parser.add_argument('--profile', action='store_true', help='print the time, calls, and allocations of every phase')
+    arg_parser.add_argument('--profile-memory', action='store_true', help='also trace the peak memory of every phase')
+    arg_parser.add_argument('--profile-json', help='write the profile statistics as JSON to this file')
+    args = arg_parser.parse_args()
+
+    if args.validate:
+        try:
+            model = validate(args.truss_definition, args.method)
+        except ValueError as e:
+            print('invalid:', e, file=sys.stderr)
+            sys.exit(1)
+        print('valid:', model.number_of_nodes, 'nodes,', model.number_of_members, 'members,', len(model.load_cases), 'load cases')
+        sys.exit(0)
+
+    profiler = None
+    if args.profile or args.profile_memory or args.profile_json:
+        from profiling import Profiler
+        profiler = Profiler(memory=args.profile_memory)
+    run(args.truss_definition, True, profiler, args.method, args.check, args.cache, args.deflection_limit, args.summary, args.export)
+    if profiler is not None:
+        if args.profile or args.profile_memory:
+            print(profiler.report(), file=sys.stderr)
+        if args.profile_json:
+            with open(args.profile_json, 'w') as f:
+                f.write(profiler.toJson())
\ No newline at end of file
@@ -1,4 +1,175 @@
 import numpy as np 
+from collections import namedtuple
+from functools import lru_cache
+
+# result of the vectorized failure check, every field has the shape of the member forces
+FailureResult = namedtuple('FailureResult', ['failure', 'buckling', 'yielding', 'critical_force', 'utilization'])
+# section properties of one cross section
+SectionProperties = namedtuple('SectionProperties', ['area', 'inertia_xx', 'inertia_yy', 'centroid_x', 'centroid_y'])
+
+def iSection(B, H, h):
+    """section properties of I-shaped members, works on scalars and arrays
+
+    Returns:
+        area, inertia_xx, inertia_yy
+    """
+    b = h
+    area = H*b + 2*B*h
+    inertia_xx = H**3*b/12 + 2*(h**3*B/12 + h*B*(H+h)**2/4)
+    inertia_yy = b**3*H/12 + 2*(B**3*h/12)
+    return area, inertia_xx, inertia_yy
+
+def tSection(B, H, h):
+    """section properties of T-shaped members, works on scalars and arrays
+
+    Returns:
+        area, inertia_xx, inertia_yy
+    """
+    b = h
+    area = B*h + H*b
+    centroid_y = ((H+h/2)*h*B + H**2*b/2)/area
+    inertia_xx = b*H*(centroid_y-H/2)**2 + h*H**3/12 + h*B*(H+h/2-centroid_y)**2 + h**3*B/12
+    inertia_yy = b**3*H/12 + B**3*h/12
+    return area, inertia_xx, inertia_yy
+
+def cSection(B, H, h):
+    """section properties of C-shaped members, works on scalars and arrays
+
+    Returns:
+        area, inertia_xx, inertia_yy
+    """
+    b = h
+    area = H*b + 2*B*h
+    centroid_x = (2*h*B**2/2 + b**2*H/2)/area
+    inertia_yy = H**3*b/12 + b*H*(centroid_x-b/2)**2 + 2*B**3*h/12 + 2*B*h*(centroid_x-B/2)**2
+    inertia_xx = H**3*b/12 + 2*(h**3*B/12 + h*B*(h+H)**2/4)
+    return area, inertia_xx, inertia_yy
+
+def oSection(d, t):
+    """section properties of O-shaped (tube) members, works on scalars and arrays
+
+    Returns:
+        area, inertia_xx, inertia_yy
+    """
+    d1 = d - t
+    area = (d/2)**2*np.pi - (d1/2)**2*np.pi
+    inertia_xx = np.pi/64*(d**4 - d1**4)
+    return area, inertia_xx, inertia_xx
+
+def sectionProperties(shape, dimensions):
+    """compute the section properties of many members at once
+
+    Args:
+        shape (array): (M,) cross-section shape I, T, C, or O
+        dimensions (array): (M, 3) parameters to describe the shape, O-shaped members use the first two
+
+    Raises:
+        ValueError: Wrong type excluding I, T, C, O
+
+    Returns:
+        area, inertia_xx, inertia_yy: (M,) arrays
+    """
+    shape = np.asarray(shape)
+    dimensions = np.asarray(dimensions, dtype=float).reshape(-1, 3)
+    area = np.zeros(len(shape))
+    inertia_xx = np.zeros(len(shape))
+    inertia_yy = np.zeros(len(shape))
+    known = np.zeros(len(shape), dtype=bool)
+    for name, kernel in [('I', iSection), ('T', tSection), ('C', cSection)]:
+        mask = shape == name
+        if np.any(mask):
+            d = dimensions[mask]
+            area[mask], inertia_xx[mask], inertia_yy[mask] = kernel(d[:, 0], d[:, 1], d[:, 2])
+        known = known | mask
+    mask = shape == 'O'
+    if np.any(mask):
+        d = dimensions[mask]
+        area[mask], inertia_xx[mask], inertia_yy[mask] = oSection(d[:, 0], d[:, 1])
+    known = known | mask
+    if not np.all(known):
+        raise ValueError('Wrong type for members')
+    return area, inertia_xx, inertia_yy
+
+def sectionRecord(shape, dimensions):
+    """section properties of one cross section, memoized by (shape, dimensions)
+
+    Args:
+        shape (str): cross-section shape I, T, C, or O
+        dimensions (list): the parameters to describe the shape
+
+    Raises:
+        ValueError: Wrong type excluding I, T, C, O
+
+    Returns:
+        SectionProperties: area, second moments of inertia, and centroid
+    """
+    return _sectionRecord(shape, tuple(float(d) for d in dimensions))
+
+@lru_cache(maxsize=65536)
+def _sectionRecord(shape, dimensions):
+    if shape == 'I':
+        B, H, h = dimensions[:3]
+        # doubly symmetric, the centroid is in the middle of the flanges and the web
+        return SectionProperties(*iSection(B, H, h), B/2, (H+2*h)/2)
+    elif shape == 'T':
+        B, H, h = dimensions[:3]
+        area, inertia_xx, inertia_yy = tSection(B, H, h)
+        return SectionProperties(area, inertia_xx, inertia_yy, B/2, ((H+h/2)*h*B + H**2*h/2)/area)
+    elif shape == 'C':
+        B, H, h = dimensions[:3]
+        area, inertia_xx, inertia_yy = cSection(B, H, h)
+        return SectionProperties(area, inertia_xx, inertia_yy, (2*h*B**2/2 + h**2*H/2)/area, (H+2*h)/2)
+    elif shape == 'O':
+        d, t = dimensions[:2]
+        return SectionProperties(*oSection(d, t), d/2, d/2)
+    raise ValueError('Wrong type for members')
+
+def evaluateFailures(external_force, area, inertia_min, length, e_module, yield_strength):
+    """check buckling and yielding of all members in one pass, the vectorized counterpart of Member.fail()
+
+    Args:
+        external_force (array): (M,) or (M, cases) axial forces acting on the members, compression is negative
+        area (array): (M,) cross-sectional areas
+        inertia_min (array): (M,) smaller second moment of inertia, min(Ixx, Iyy)
+        length (array): (M,) member lengths
+        e_module (array): (M,) young's modulus
+        yield_strength (array): (M,) yield stress
+
+    Returns:
+        FailureResult: failure, buckling, and yielding flags, critical force, and utilization (|force|/critical force)
+    """
+    external_force = np.asarray(external_force, dtype=float)
+    # broadcast the member properties over the load cases
+    column = (slice(None),) + (None,)*(external_force.ndim - 1)
+    buckling_force = (np.pi**2*np.asarray(e_module)*np.asarray(inertia_min)/np.asarray(length)**2)[column]
+    yield_force = (np.asarray(yield_strength)*np.asarray(area))[column]
+    # compression members buckle, tension members yield
+    compression = external_force < 0
+    tension = external_force > 0
+    critical_force = np.where(compression, buckling_force, yield_force)
+    magnitude = np.abs(external_force)
+    utilization = magnitude/critical_force
+    buckling = compression & (magnitude > critical_force)
+    yielding = tension & (magnitude > critical_force)
+    return FailureResult(buckling | yielding, buckling, yielding, critical_force, utilization)
+
+def criticalForceDerivative(external_force, critical_force, length):
+    """derivative of the critical force with respect to the member length
+
+    The buckling force pi^2 E I / L^2 of compression members gives dP/dL = -2 P / L,
+    the yield force of tension members does not depend on the length.
+
+    Args:
+        external_force (array): (M,) or (M, cases) axial forces acting on the members, compression is negative
+        critical_force (array): critical forces with the shape of external_force (see evaluateFailures)
+        length (array): (M,) member lengths
+
+    Returns:
+        ndarray: dP/dL with the shape of external_force
+    """
+    external_force = np.asarray(external_force, dtype=float)
+    column = (slice(None),) + (None,)*(external_force.ndim - 1)
+    return np.where(external_force < 0, -2*np.asarray(critical_force)/np.asarray(length, dtype=float)[column], 0.0)
 
 class Member:
     def __init__(self, member_index, node_i, node_j, shape, dimensions, e_module, yield_strength):
@@ -52,6 +223,8 @@ class Member:
         if self.external_force < 0:
             # check if buckling
             self.critical_force = pow(np.pi, 2)*self._e_module*min(self.inertia_xx, self.inertia_yy)/pow(self._length, 2)
+            # dP/dL of the buckling force
+            self.critical_force_derivative = -2*self.critical_force/self._length
             if abs(self.external_force) > self.critical_force:
                 self.buckling = True
                 self.failure = True
@@ -62,6 +235,7 @@ class Member:
         elif self.external_force > 0:
             # check if yielding because the member is subject to tension force
             self.critical_force = self._yield_strength*self.area
+            self.critical_force_derivative = 0.0
             if abs(self.external_force) > self.critical_force:
                 self.yielding = True
                 self.failure = True
@@ -73,7 +247,12 @@ class Member:
             # no external force
             self.buckling = False
             self.yielding = False
+            self.critical_force_derivative = 0.0
             return self.failure
+    def axialStiffness(self):
+        """axial stiffness EA/L, the force per unit elongation of the member
+        """
+        return self._e_module*self.area/self._length
     def getI(self):
         """compute second moment of inertia
         """        
@@ -90,15 +269,14 @@ class CShapedMember(Member):
         self.H = self._dimensions[1]
         self.h = self._dimensions[2]
         self.b = self.h
-        self.centroid_x = (2*self.h*pow(self.B, 2)/2+pow(self.b, 2)*self.H/2)/self.getA()
+        self.centroid_x = sectionRecord(self.shape, self._dimensions).centroid_x
         self.getI()
         self.getA() 
     def getI(self):
-        self.inertia_yy = pow(self.H, 3)*self.b/12+self.b*self.H*pow(self.centroid_x-self.b/2, 2)+2*pow(self.B, 3)*self.h/12+2*self.B*self.h*pow(self.centroid_x-self.B/2, 2) 
-        self.inertia_xx = pow(self.H, 3)*self.b/12+2*(pow(self.h, 3)*self.B/12+self.h*self.B*pow(self.h+self.H, 2)/4)
+        _, self.inertia_xx, self.inertia_yy = sectionRecord(self.shape, self._dimensions)[:3]
         return [self.inertia_xx, self.inertia_yy]
     def getA(self):
-        self.area = self.H*self.b+ 2*self.B*self.h
+        self.area = sectionRecord(self.shape, self._dimensions).area
         return self.area
     
 
@@ -109,16 +287,14 @@ class TShapedMember(Member):
         self.H = self._dimensions[1]
         self.h = self._dimensions[2]
         self.b = self._dimensions[2]
-        self.centroid_x = self.B/2
-        self.centroid_y = ((self.H+self.h/2)*self.h*self.B+pow(self.H, 2)*self.b/2)/self.getA()
+        self.centroid_x, self.centroid_y = sectionRecord(self.shape, self._dimensions)[3:]
         self.getI()
         self.getA()     
     def getI(self):
-        self.inertia_xx = self.b*self.H*pow(self.centroid_y-self.H/2, 2)+self.h*pow(self.H, 3)/12+self.h*self.B*pow(self.H+self.h/2-self.centroid_y, 2)+pow(self.h, 3)*self.B/12
-        self.inertia_yy = pow(self.b, 3)*self.H/12+pow(self.B, 3)*self.h/12
+        _, self.inertia_xx, self.inertia_yy = sectionRecord(self.shape, self._dimensions)[:3]
         return [self.inertia_xx, self.inertia_yy]
     def getA(self):
-        self.area = self.B*self.h + self.H*self.b
+        self.area = sectionRecord(self.shape, self._dimensions).area
         return self.area
 
 class IShapedMember(Member):
@@ -131,11 +307,10 @@ class IShapedMember(Member):
         self.getI()
         self.getA() 
     def getI(self):
-        self.inertia_xx = pow(self.H, 3)*self.b/12+2*(pow(self.h, 3)*self.B/12+self.h*self.B*pow(self.H+self.h, 2)/4)
-        self.inertia_yy = pow(self.b, 3)*self.H/12 + 2*(pow(self.B, 3)*self.h/12)
+        _, self.inertia_xx, self.inertia_yy = sectionRecord(self.shape, self._dimensions)[:3]
         return [self.inertia_xx, self.inertia_yy]
     def getA(self):
-        self.area = self.H*self.b + 2*self.B*self.h
+        self.area = sectionRecord(self.shape, self._dimensions).area
         return self.area
 class OShapedMember(Member):
     def __init__(self, member_index, node_i, node_j, shape, dimensions, e_module, yield_strength):
@@ -145,9 +320,8 @@ class OShapedMember(Member):
         self.getI()
         self.getA() 
     def getI(self):
-        self.inertia_xx = np.pi/64*(pow(self.d, 4)-pow(self.d1, 4))
-        self.inertia_yy = self.inertia_xx
+        _, self.inertia_xx, self.inertia_yy = sectionRecord(self.shape, self._dimensions)[:3]
         return [self.inertia_xx, self.inertia_yy]
     def getA(self):
-        self.area = pow(self.d/2, 2)*np.pi-pow(self.d1/2, 2)*np.pi
+        self.area = sectionRecord(self.shape, self._dimensions).area
         return self.area
\ No newline at end of file
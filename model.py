@@ -0,0 +1,255 @@
+from node import Node, DEFAULT_CASE
+from member import sectionProperties
+import numpy as np
+
+# codes of the node types stored in TrussModel.node_type
+NODE_TYPES = ['Free', 'Loose', 'Fixed']
+FREE = 0
+LOOSE = 1
+FIXED = 2
+# cross-section shapes, O-shaped members only use the first two dimension columns
+MEMBER_SHAPES = ['I', 'T', 'C', 'O']
+
+class TrussModel:
+    def __init__(self, node_names, xy, node_type, inclination, member_names, connectivity, shape, dimensions, e_module, yield_strength,
+                 load_node=None, load_magnitude=None, load_angle=None, load_case=None, load_cases=None):
+        """compact array-backed (struct-of-arrays) truss definition
+
+        Args:
+            node_names (array): (N,) names of the nodes
+            xy (array): (N, 2) node coordinates
+            node_type (array): (N,) node type codes FREE, LOOSE, or FIXED
+            inclination (array): (N,) inclination(deg) of the ground under loose nodes
+            member_names (array): (M,) names of the members
+            connectivity (array): (M, 2) node indexes connected by each member
+            shape (array): (M,) cross-section shape I, T, C, or O
+            dimensions (array): (M, 3) parameters to describe the shape, unused columns are zero
+            e_module (array): (M,) young's modulus
+            yield_strength (array): (M,) yield stress
+            load_node (array, optional): (L,) node index each external force acts on
+            load_magnitude (array, optional): (L,) force amplitudes
+            load_angle (array, optional): (L,) force angles(deg)
+            load_case (array, optional): (L,) index of the load case of each force in load_cases
+            load_cases (list, optional): names of the load cases
+        """
+        self.node_names = np.asarray(node_names, dtype=str)
+        self.xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+        self.node_type = np.asarray(node_type, dtype=np.int8)
+        self.inclination = np.asarray(inclination, dtype=float)
+        self.member_names = np.asarray(member_names, dtype=str)
+        self.connectivity = np.asarray(connectivity, dtype=np.int64).reshape(-1, 2)
+        self.shape = np.asarray(shape, dtype='<U1')
+        self.dimensions = np.asarray(dimensions, dtype=float).reshape(-1, 3)
+        self.e_module = np.asarray(e_module, dtype=float)
+        self.yield_strength = np.asarray(yield_strength, dtype=float)
+        self.load_node = np.zeros(0, dtype=np.int64) if load_node is None else np.asarray(load_node, dtype=np.int64)
+        self.load_magnitude = np.zeros(0) if load_magnitude is None else np.asarray(load_magnitude, dtype=float)
+        self.load_angle = np.zeros(0) if load_angle is None else np.asarray(load_angle, dtype=float)
+        self.load_case = np.zeros(len(self.load_node), dtype=np.int64) if load_case is None else np.asarray(load_case, dtype=np.int64)
+        if load_cases is None:
+            load_cases = [DEFAULT_CASE] if len(self.load_node) > 0 else []
+        self.load_cases = list(load_cases)
+
+    @property
+    def number_of_nodes(self):
+        return len(self.node_names)
+
+    @property
+    def number_of_members(self):
+        return len(self.member_names)
+
+    def countReactions(self):
+        """count the reaction forces, fixed nodes have two and loose nodes have one
+
+        Returns:
+            int: number of reactions
+        """
+        return int(2*np.count_nonzero(self.node_type == FIXED) + np.count_nonzero(self.node_type == LOOSE))
+
+    def directionCosines(self):
+        """compute the member orientations from the node_i to the node_j of every member
+
+        Returns:
+            cosines: (M, 2) cosine and sine of the member angles
+            length: (M,) member lengths
+        """
+        d = self.xy[self.connectivity[:, 1]] - self.xy[self.connectivity[:, 0]]
+        length = np.hypot(d[:, 0], d[:, 1])
+        return d/length[:, None], length
+
+    def sectionProperties(self):
+        """compute the cross-sectional area and second moments of inertia of all members
+
+        Returns:
+            area, inertia_xx, inertia_yy: (M,) arrays
+        """
+        return sectionProperties(self.shape, self.dimensions)
+
+    def axialStiffness(self):
+        """axial stiffness EA/L of every member, the vectorized counterpart of Member.axialStiffness()
+
+        Returns:
+            ndarray: (M,) force per unit elongation
+        """
+        return self.e_module*self.sectionProperties()[0]/self.directionCosines()[1]
+
+    def reactionLayout(self):
+        """list the reaction forces in initialization order, fixed nodes contribute x then y
+
+        Returns:
+            reaction_node: (R,) node index of every reaction
+            reaction_direction: (R, 2) unit vector of every reaction
+        """
+        # every node contributes as many rows as it has reactions
+        counts = np.where(self.node_type == FIXED, 2, np.where(self.node_type == LOOSE, 1, 0))
+        reaction_node = np.repeat(np.arange(self.number_of_nodes), counts)
+        # position of the reaction inside its node: 0 for x (or the loose direction), 1 for y
+        first = np.cumsum(counts) - counts
+        local = np.arange(len(reaction_node)) - np.repeat(first, counts)
+        # loose nodes only have reactions perpendicular to the ground
+        angle = self.inclination[reaction_node]*np.pi/180 + np.pi/2
+        loose = self.node_type[reaction_node] == LOOSE
+        reaction_direction = np.zeros((len(reaction_node), 2))
+        reaction_direction[:, 0] = np.where(loose, np.cos(angle), local == 0)
+        reaction_direction[:, 1] = np.where(loose, np.sin(angle), local == 1)
+        return reaction_node, reaction_direction
+
+    def buildEquilibriumMatrix(self):
+        """build the coefficient matrix A of the system AF + f = 0 with vectorized operations
+
+        Returns:
+            csc_matrix: (2N, M+R) equilibrium matrix, member forces followed by reaction forces
+        """
+        cosines, length = self.directionCosines()
+        i = self.connectivity[:, 0]
+        j = self.connectivity[:, 1]
+        m = np.arange(self.number_of_members)
+        reaction_node, reaction_direction = self.reactionLayout()
+        r = self.number_of_members + np.arange(len(reaction_node))
+        # a member pulls node_i towards node_j and node_j towards node_i
+        rows = np.concatenate([2*i, 2*i+1, 2*j, 2*j+1, 2*reaction_node, 2*reaction_node+1])
+        cols = np.concatenate([m, m, m, m, r, r])
+        values = np.concatenate([cosines[:, 0], cosines[:, 1], -cosines[:, 0], -cosines[:, 1], reaction_direction[:, 0], reaction_direction[:, 1]])
+        # drop the structural zeros of the reactions
+        keep = values != 0
+        # scipy is only loaded once a matrix is built, parsing and validation do without it
+        from solver import assembleMatrix
+        return assembleMatrix(rows[keep], cols[keep], values[keep], (2*self.number_of_nodes, self.number_of_members + len(r)))
+
+    def buildStiffnessMatrix(self):
+        """build the global stiffness matrix K of the unsupported truss
+
+        The member columns B of the equilibrium matrix are the transposed compatibility matrix,
+        so K = B diag(EA/L) B^T with the member stiffnesses EA/L.
+
+        Returns:
+            csc_matrix: (2N, 2N) symmetric stiffness matrix in x, y order of the nodes
+        """
+        B = self.buildEquilibriumMatrix()[:, :self.number_of_members]
+        return (B.multiply(self.axialStiffness()) @ B.T).tocsc()
+
+    def buildLoadMatrix(self, load_cases=None):
+        """build the external force vectors f of the system AF + f = 0
+
+        Args:
+            load_cases (list, optional): names of the cases to build, by default all cases
+
+        Returns:
+            ndarray: (2N, cases) external forces, one column per load case
+        """
+        if load_cases is None:
+            load_cases = self.load_cases if len(self.load_cases) > 0 else [DEFAULT_CASE]
+        f = np.zeros((2*self.number_of_nodes, len(load_cases)))
+        # map the stored case indexes onto the requested columns, -1 for cases which are not requested
+        column = np.array([load_cases.index(c) if c in load_cases else -1 for c in self.load_cases], dtype=np.int64)
+        if len(self.load_node) > 0:
+            c = column[self.load_case]
+            keep = c >= 0
+            angle = self.load_angle[keep]*np.pi/180
+            np.add.at(f, (2*self.load_node[keep], c[keep]), self.load_magnitude[keep]*np.cos(angle))
+            np.add.at(f, (2*self.load_node[keep]+1, c[keep]), self.load_magnitude[keep]*np.sin(angle))
+        return f
+
+    @classmethod
+    def fromNodes(cls, nodes, number_of_member):
+        """gather a compact model from initialized Node and Member objects
+
+        Args:
+            nodes (dict): truss definition by a set of nodes
+            number_of_member (int): total number of the bars
+
+        Raises:
+            ValueError: Wrong type for node exluding Fixed, Loose, and Free
+
+        Returns:
+            TrussModel: the array-backed model
+        """
+        names = list(nodes.keys())
+        position = {}
+        node_type = np.zeros(len(names), dtype=np.int8)
+        xy = np.zeros((len(names), 2))
+        inclination = np.zeros(len(names))
+        for i, key in enumerate(names):
+            node = nodes[key]
+            if node.type not in NODE_TYPES:
+                raise ValueError('wrong type for nodes')
+            position[id(node)] = i
+            node_type[i] = NODE_TYPES.index(node.type)
+            xy[i] = [node.x, node.y]
+            inclination[i] = node.angle*180/np.pi
+
+        member_names = np.zeros(number_of_member, dtype=object)
+        connectivity = np.zeros((number_of_member, 2), dtype=np.int64)
+        shape = np.zeros(number_of_member, dtype='<U1')
+        dimensions = np.zeros((number_of_member, 3))
+        e_module = np.zeros(number_of_member)
+        yield_strength = np.zeros(number_of_member)
+        load_node = []
+        load_magnitude = []
+        load_angle = []
+        load_case = []
+        load_cases = []
+        for key in names:
+            node = nodes[key]
+            for member in node.members:
+                k = member.member_index
+                i = position[id(member.node_i)]
+                j = position[id(member.node_j)]
+                member_names[k] = names[i] + '-' + names[j]
+                connectivity[k] = [i, j]
+                shape[k] = member.shape
+                dimensions[k, :len(member._dimensions)] = member._dimensions
+                e_module[k] = member._e_module
+                yield_strength[k] = member._yield_strength
+            for case, force in node.loads.items():
+                if case not in load_cases:
+                    load_cases.append(case)
+                load_node.append(position[id(node)])
+                load_magnitude.append(np.hypot(force[0], force[1]))
+                load_angle.append(np.arctan2(force[1], force[0])*180/np.pi)
+                load_case.append(load_cases.index(case))
+
+        return cls(names, xy, node_type, inclination, member_names.astype(str), connectivity, shape, dimensions, e_module, yield_strength,
+                   load_node, load_magnitude, load_angle, load_case, load_cases)
+
+    def toNodes(self):
+        """create the Node and Member view of the model, every member is shared by its two nodes
+
+        Returns:
+            dict: node name -> Node
+        """
+        nodes = {}
+        node_list = []
+        for i in range(self.number_of_nodes):
+            node = Node(i, NODE_TYPES[self.node_type[i]], self.xy[i, 0], self.xy[i, 1], inclination=self.inclination[i])
+            nodes[str(self.node_names[i])] = node
+            node_list.append(node)
+        for k in range(self.number_of_members):
+            node_i = node_list[self.connectivity[k, 0]]
+            node_j = node_list[self.connectivity[k, 1]]
+            dimensions = list(self.dimensions[k, :2] if self.shape[k] == 'O' else self.dimensions[k])
+            member = node_i.add_member(k, node_i, node_j, str(self.shape[k]), dimensions, self.e_module[k], self.yield_strength[k])
+            node_j.members.append(member)
+        for l in range(len(self.load_node)):
+            node_list[self.load_node[l]].add_force(self.load_magnitude[l], self.load_angle[l], self.load_cases[self.load_case[l]])
+        return nodes
@@ -1,6 +1,9 @@
 from member import IShapedMember, TShapedMember, CShapedMember, OShapedMember
 import numpy as np
 
+# load case of the forces which are not assigned to a named case
+DEFAULT_CASE = 'default'
+
 class Node:
     def __init__(self, node_index, node_type, x, y, inclination=0):
         """constructor for a node
@@ -15,11 +18,19 @@ class Node:
         # external forces act on the node
         self.fx = 0
         self.fy = 0
+        # external forces of every load case, case name -> [fx, fy]
+        self.loads = {}
+        # x and y displacement and the deflection check, set by Truss.checkDeflections
+        self.displacement = None
+        self.deflection_failure = None
     def add_member(self, member_index, node_i, node_j, member_type, dimensions, e_module, yield_strength):
         """add a bar member by connecting it with two initialized nodes
 
         Raises:
             ValueError: Wrong type excluding I, T, C, O
+
+        Returns:
+            member: the created member, it can be shared with the other node
         """        
         if member_type == 'I':
             member = IShapedMember(member_index, node_i, node_j, member_type, dimensions, e_module, yield_strength)
@@ -33,16 +44,24 @@ class Node:
             raise ValueError('Wrong type for members')
     
         self.members.append(member)
+        return member
 
-    def add_force(self, amp, angle):
-        """specfic the force acting on the node
+    def add_force(self, amp, angle, case=DEFAULT_CASE):
+        """specfic the force acting on the node, forces of the same case are accumulated
 
         Args:
             amplitude (float): the force amplitude acts on the node
             angle(deg) (float): the force angle acts on the node
+            case (str): the load case the force belongs to
         """
-        self.fx = amp*np.cos(angle*np.pi/180) 
-        self.fy = amp*np.sin(angle*np.pi/180)
+        fx = amp*np.cos(angle*np.pi/180) 
+        fy = amp*np.sin(angle*np.pi/180)
+        if case not in self.loads:
+            self.loads[case] = np.zeros(2)
+        self.loads[case] = self.loads[case] + np.array([fx, fy])
+        if case == DEFAULT_CASE:
+            self.fx = self.fx + fx
+            self.fy = self.fy + fy
 
     def buildForceEquations(self):
         """build forces equilibrium equation on the node
@@ -0,0 +1,209 @@
+import time
+import numpy as np
+
+class NoEliminationOrder(ValueError):
+    """the truss can not be solved joint by joint, the global solver has to be used
+    """
+
+def eliminationOrder(model, reactions_first=True):
+    """find an order in which the joints can be solved one by one (method of joints)
+
+    A joint can be solved once at most two of its unknown forces are left. If reactions_first
+    is True the reactions are treated as known, they come from the equilibrium of the whole truss.
+
+    Args:
+        model (TrussModel): truss definition
+        reactions_first (bool): solve the reactions from the global equilibrium first
+
+    Returns:
+        list: [(node, [unknown, ...]), ...] in solving order, unknowns are columns of the equilibrium matrix;
+              None if the truss is not simple
+    """
+    n = model.number_of_nodes
+    m = model.number_of_members
+    reaction_node = model.reactionLayout()[0]
+    r = len(reaction_node)
+    # unknowns acting on every node: its members and its reactions
+    nodes = np.concatenate([model.connectivity[:, 0], model.connectivity[:, 1], reaction_node])
+    unknowns = np.concatenate([np.arange(m), np.arange(m), m + np.arange(r)])
+    order = np.argsort(nodes, kind='stable')
+    start = np.searchsorted(nodes[order], np.arange(n+1)).tolist()
+    incident = unknowns[order].tolist()
+    ends = model.connectivity.tolist() + [[v] for v in reaction_node.tolist()]
+
+    solved = [False]*(m + r)
+    remaining = [start[v+1] - start[v] for v in range(n)]
+    if reactions_first:
+        for u in range(m, m + r):
+            solved[u] = True
+            remaining[ends[u][0]] = remaining[ends[u][0]] - 1
+    queue = [v for v in range(n) if remaining[v] <= 2]
+    done = [False]*n
+    steps = []
+    while queue:
+        v = queue.pop()
+        if done[v]:
+            continue
+        done[v] = True
+        current = [u for u in incident[start[v]:start[v+1]] if not solved[u]]
+        if not current:
+            continue
+        steps.append((v, current))
+        for u in current:
+            solved[u] = True
+            for w in ends[u]:
+                remaining[w] = remaining[w] - 1
+                if remaining[w] <= 2 and not done[w]:
+                    queue.append(w)
+    if not all(solved):
+        return None
+    return steps
+
+class JointSolver:
+    def __init__(self, model):
+        """solve a simple truss joint by joint
+
+        The joints are eliminated in the order of eliminationOrder. Every joint keeps only the
+        inverse of its (at most 2x2) block and the direction cosines of its members which are
+        already solved, so a solve is one sweep over the joints and no global matrix is built.
+
+        Args:
+            model (TrussModel): truss definition
+
+        Raises:
+            NoEliminationOrder: the truss is not simple or a joint block is singular
+            ValueError: the system is not deterministic
+        """
+        start = time.perf_counter()
+        n = model.number_of_nodes
+        m = model.number_of_members
+        reaction_node, reaction_direction = model.reactionLayout()
+        r = len(reaction_node)
+        # the reactions of a truss on three supports follow from the global equilibrium
+        G = np.stack([reaction_direction[:, 0], reaction_direction[:, 1],
+                      model.xy[reaction_node, 0]*reaction_direction[:, 1] - model.xy[reaction_node, 1]*reaction_direction[:, 0]])
+        global_equilibrium = r == 3 and np.linalg.cond(G) < 1e12
+        for reactions_first in ([True, False] if global_equilibrium else [False]):
+            steps = eliminationOrder(model, reactions_first)
+            if steps is not None:
+                break
+        if steps is None:
+            raise NoEliminationOrder('the truss is not simple, no joint by joint elimination order')
+        self.steps = steps
+        self.stats = {'size': m + r, 'steps': len(steps), 'order_time': time.perf_counter() - start}
+
+        start = time.perf_counter()
+        if (3 if reactions_first else 0) + sum(len(current) for v, current in steps) != m + r:
+            raise ValueError('system is not deterministic')
+        cosines = model.directionCosines()[0]
+        # coefficients of every unknown in the two equations of the nodes it acts on
+        nodes = np.concatenate([model.connectivity[:, 0], model.connectivity[:, 1], reaction_node])
+        unknowns = np.concatenate([np.arange(m), np.arange(m), m + np.arange(r)])
+        coefficients = np.concatenate([cosines, -cosines, reaction_direction])
+        order = np.argsort(nodes, kind='stable')
+        bounds = np.searchsorted(nodes[order], np.arange(n+1))
+        unknowns = unknowns[order]
+        coefficients = coefficients[order]
+
+        if reactions_first:
+            # global equilibrium: the sums of the x forces, the y forces, and the moments about the origin
+            S = np.zeros((3, 2*n))
+            S[0, 0::2] = 1
+            S[1, 1::2] = 1
+            S[2, 0::2] = -model.xy[:, 1]
+            S[2, 1::2] = model.xy[:, 0]
+            self._reactions = m + np.arange(r)
+            self._combination = np.linalg.solve(G, S)
+        else:
+            self._reactions = None
+        # every incident unknown of a joint is either solved there (current) or at an earlier joint (known)
+        step_node = np.array([v for v, current in steps], dtype=np.int64)
+        step_of = np.full(m + r, -1)
+        step_of[[u for v, current in steps for u in current]] = np.repeat(np.arange(len(steps)), [len(current) for v, current in steps])
+        lengths = bounds[step_node+1] - bounds[step_node]
+        owner = np.repeat(np.arange(len(steps)), lengths)
+        entry = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths - bounds[step_node], lengths)
+        incident = unknowns[entry]
+        block = coefficients[entry]
+        current = step_of[incident] == owner
+        known = ~current
+        size = np.bincount(owner[current], minlength=len(steps))
+        first = np.cumsum(size) - size
+        current_block = block[current]
+        inverse = np.zeros((len(steps), 2, 2))
+        # joints with two unknowns: the inverse of the 2x2 block
+        two = np.flatnonzero(size == 2)
+        if len(two) > 0:
+            B = np.stack([current_block[first[two]], current_block[first[two]+1]], axis=2)
+            determinant = B[:, 0, 0]*B[:, 1, 1] - B[:, 0, 1]*B[:, 1, 0]
+            if np.any(np.abs(determinant) < 1e-12):
+                raise NoEliminationOrder('system is singular, the truss is probably a mechanism')
+            inverse[two] = np.linalg.inv(B)
+        # joints with one unknown: least squares over both equations, the residual must vanish
+        one = np.flatnonzero(size == 1)
+        if len(one) > 0:
+            a = current_block[first[one]]
+            norm = np.einsum('ij,ij->i', a, a)
+            if np.any(norm < 1e-24):
+                raise NoEliminationOrder('system is singular, the truss is probably a mechanism')
+            inverse[one, 0] = a/norm[:, None]
+        # per joint x_current = W (b_joint - K x_known), stored as one map M = W [I, -K] from the
+        # joint loads and the known unknowns to the current ones; the unknowns follow the loads in one vector
+        ends = np.cumsum(size).tolist()
+        known_ends = np.cumsum(np.bincount(owner[known], minlength=len(steps))).tolist()
+        current_unknowns = (2*n + incident[current]).tolist()
+        known_unknowns = (2*n + incident[known]).tolist()
+        # the columns -W c of every known unknown c, for all joints at once
+        known_columns = -np.einsum('eij,ej->ie', inverse[owner[known]], block[known])
+        self._sweep = [(np.array(current_unknowns[i-k:i]), np.array([2*v, 2*v+1] + known_unknowns[j-l:j]),
+                        np.concatenate([W[:k], known_columns[:k, j-l:j]], axis=1))
+                       for v, i, k, j, l, W in zip(step_node.tolist(), ends, size.tolist(), known_ends,
+                                                   np.diff(known_ends, prepend=0).tolist(), inverse)]
+        self._size = m + r
+        self._nodes = n
+        self.method = 'joints'
+        self.stats['method'] = self.method
+        self.stats['factor_time'] = time.perf_counter() - start
+        self.stats['solve_time'] = 0.0
+
+    def solve(self, b):
+        """solve Ax = b, A being the equilibrium matrix
+
+        Args:
+            b (ndarray): right hand side, a vector or a matrix with one column per case
+
+        Returns:
+            ndarray: solution with the same shape as b
+        """
+        start = time.perf_counter()
+        b = np.asarray(b, dtype=float)
+        z = np.concatenate([b, np.zeros((self._size,) + b.shape[1:])])
+        if self._reactions is not None:
+            z[2*self._nodes + self._reactions] = self._combination @ b
+        # one joint after the other, every joint only reads its loads and the unknowns solved before
+        for current, gather, M in self._sweep:
+            z[current] = M @ z[gather]
+        x = z[2*self._nodes:]
+        self.stats['solve_time'] = self.stats['solve_time'] + time.perf_counter() - start
+        return x
+
+    def solveTransposed(self, b):
+        """solve A^T x = b, A being the equilibrium matrix (adjoint systems)
+
+        Args:
+            b (ndarray): right hand side, a vector or a matrix with one column per case
+
+        Returns:
+            ndarray: solution with the same shape as b
+        """
+        start = time.perf_counter()
+        # the transposed sweep: the joints in reverse order pass their share back to the loads and known unknowns
+        b = np.asarray(b, dtype=float)
+        z = np.concatenate([np.zeros((2*self._nodes,) + b.shape[1:]), b])
+        for current, gather, M in reversed(self._sweep):
+            z[gather] = z[gather] + M.T @ z[current]
+        x = z[:2*self._nodes]
+        if self._reactions is not None:
+            x = x + self._combination.T @ z[2*self._nodes + self._reactions]
+        self.stats['solve_time'] = self.stats['solve_time'] + time.perf_counter() - start
+        return x
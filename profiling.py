@@ -0,0 +1,170 @@
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+import numpy as np
+import scipy.sparse as sp
+
+# shared do-nothing context used for every phase when no profiler is given
+NULL_PHASE = nullcontext()
+
+class PhaseStats:
+    def __init__(self, name):
+        """accumulated statistics of one phase of the solver pipeline
+
+        Args:
+            name (str): name of the phase
+        """
+        self.name = name
+        self.calls = 0
+        self.time = 0.0
+        self.bytes = 0
+        self.peak = None
+
+    def toDict(self):
+        return {'calls': self.calls, 'time': self.time, 'bytes': self.bytes, 'peak': self.peak}
+
+class Profiler:
+    def __init__(self, memory=False, condition=True):
+        """opt-in instrumentation of the solver pipeline
+
+        The solver functions take an optional profiler and only touch it through phase(),
+        so without a profiler they pay for one shared no-op context per phase.
+
+        Args:
+            memory (bool): measure the peak traced memory of every phase with tracemalloc
+            condition (bool): estimate the 1-norm condition number of the factorized matrices
+        """
+        self.memory = memory
+        self.condition = condition
+        self.phases = {}
+        self.matrices = {}
+        self._current = None
+        self._hooks = []
+        # peaks of the open phases which nested phases reset away, innermost last
+        self._peaks = []
+
+    def subscribe(self, callback):
+        """register a callback which receives every event as a dict
+
+        Phase events have the keys event='phase', name, time, bytes, and peak; matrix events
+        have event='matrix', name, and the matrix statistics.
+
+        Args:
+            callback (callable): called with one dict per event
+
+        Returns:
+            callable: the callback, to be passed to unsubscribe
+        """
+        self._hooks.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        self._hooks.remove(callback)
+
+    def _emit(self, event):
+        for callback in self._hooks:
+            callback(event)
+
+    @contextmanager
+    def phase(self, name):
+        """time the enclosed block as one call of the phase name
+        """
+        stats = self.phases.get(name)
+        if stats is None:
+            stats = self.phases[name] = PhaseStats(name)
+        outer = self._current
+        self._current = stats
+        bytes_before = stats.bytes
+        tracing = self.memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        if self.memory:
+            # the reset below would lose the peak the outer phase reached so far
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            self._peaks.append(current)
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            elapsed = time.perf_counter() - start
+            peak = None
+            if self.memory:
+                highest = max(self._peaks.pop(), tracemalloc.get_traced_memory()[1])
+                peak = highest - current
+                stats.peak = max(stats.peak or 0, peak)
+                if self._peaks:
+                    self._peaks[-1] = max(self._peaks[-1], highest)
+                if tracing:
+                    tracemalloc.stop()
+            stats.calls = stats.calls + 1
+            stats.time = stats.time + elapsed
+            self._current = outer
+            self._emit({'event': 'phase', 'name': name, 'time': elapsed, 'bytes': stats.bytes - bytes_before, 'peak': peak})
+
+    def recordArrays(self, *arrays):
+        """add the size of arrays allocated by the current phase
+        """
+        if self._current is None:
+            return
+        for a in arrays:
+            if sp.issparse(a):
+                a = a.tocsc() if not sp.isspmatrix_csc(a) else a
+                self._current.bytes = self._current.bytes + a.data.nbytes + a.indices.nbytes + a.indptr.nbytes
+            else:
+                self._current.bytes = self._current.bytes + np.asarray(a).nbytes
+
+    def recordMatrix(self, name, A, factorization=None):
+        """store the dimensions, the nonzeros, and the condition estimate of a system matrix
+
+        Args:
+            name (str): name of the matrix
+            A (sparse matrix or ndarray): the matrix
+            factorization (Factorization, optional): its factorization, used for the condition estimate
+        """
+        info = {'shape': list(A.shape), 'nnz': int(A.nnz if sp.issparse(A) else np.count_nonzero(A))}
+        if factorization is not None:
+            info['method'] = factorization.method
+            info['fill_in'] = factorization.stats['fill_in']
+            if self.condition:
+                info['condition'] = factorization.conditionEstimate(A)
+        self.matrices[name] = info
+        self._emit({'event': 'matrix', 'name': name, **info})
+
+    def stats(self):
+        """structured statistics of all phases and matrices
+
+        Returns:
+            dict: {'phases': {name: {calls, time, bytes, peak}}, 'matrices': {name: {...}}}
+        """
+        return {'phases': {name: s.toDict() for name, s in self.phases.items()}, 'matrices': dict(self.matrices)}
+
+    def toJson(self):
+        return json.dumps(self.stats(), indent=1)
+
+    def report(self):
+        """format the statistics as a text table
+
+        Returns:
+            str: the report
+        """
+        lines = ['%-12s %6s %12s %12s %12s' % ('phase', 'calls', 'time [ms]', 'bytes', 'peak')]
+        for name, s in self.phases.items():
+            lines.append('%-12s %6d %12.3f %12d %12s' % (name, s.calls, 1000*s.time, s.bytes, '-' if s.peak is None else s.peak))
+        for name, info in self.matrices.items():
+            lines.append('matrix %s: %s' % (name, ', '.join('%s=%s' % item for item in info.items())))
+        return '\n'.join(lines)
+
+def phase(profiler, name):
+    """context of one phase, a shared no-op context when profiler is None
+
+    Args:
+        profiler (Profiler or None): the profiler
+        name (str): name of the phase
+    """
+    if profiler is None:
+        return NULL_PHASE
+    return profiler.phase(name)
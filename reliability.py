@@ -0,0 +1,224 @@
+import os
+import argparse
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+import numpy as np
+import scipy.sparse as sp
+from node import DEFAULT_CASE
+from member import sectionProperties, evaluateFailures
+from truss import Truss
+
+# random scatter of one input: kind is 'normal', 'lognormal', or 'uniform' and cov the coefficient of variation
+# (for load_angle: the standard deviation in degrees); all inputs keep their nominal value as mean
+Scatter = namedtuple('Scatter', ['kind', 'cov'])
+# failure probabilities with (lower, upper) Wilson score intervals
+ReliabilityResult = namedtuple('ReliabilityResult', ['samples', 'member_probability', 'member_interval', 'system_probability', 'system_interval'])
+
+SCATTER_INPUTS = ['load_magnitude', 'load_angle', 'e_module', 'yield_strength', 'dimensions']
+# floats held per batch, the batch size follows from the number of unknowns
+BATCH_VALUES = 2**22
+
+def sampleFactors(scatter, shape, rng):
+    """random factors with mean 1 and the given coefficient of variation
+
+    Args:
+        scatter (Scatter): distribution
+        shape (tuple): shape of the samples
+        rng (Generator): random generator
+
+    Raises:
+        ValueError: unknown distribution
+
+    Returns:
+        ndarray: the factors
+    """
+    if scatter.kind == 'normal':
+        return 1 + scatter.cov*rng.standard_normal(shape)
+    if scatter.kind == 'lognormal':
+        sigma = np.sqrt(np.log(1 + scatter.cov**2))
+        return np.exp(sigma*rng.standard_normal(shape) - sigma**2/2)
+    if scatter.kind == 'uniform':
+        return 1 + scatter.cov*np.sqrt(3)*rng.uniform(-1, 1, shape)
+    raise ValueError('unknown distribution %s' % scatter.kind)
+
+class ReliabilityModel:
+    def __init__(self, model, scatter, case=None, method='equilibrium'):
+        """failure of sampled trusses around a nominal model with one factorization
+
+        The member forces are linear in the loads, so the sampled load vectors of a batch are solved
+        together with the factorization of the nominal truss. Material and section scatter only enters
+        the buckling and yielding checks; with the stiffness method the stiffness stays nominal.
+
+        Args:
+            model (TrussModel): nominal truss definition
+            scatter (dict): input name (see SCATTER_INPUTS) -> Scatter
+            case (str, optional): load case to sample, by default the first one
+            method (str): solver method of Truss.solveForceEquations
+
+        Raises:
+            ValueError: unknown input name
+            ValueError: unknown load case
+        """
+        unknown = set(scatter) - set(SCATTER_INPUTS)
+        if unknown:
+            raise ValueError('unknown scatter input %s' % ', '.join(sorted(unknown)))
+        cases = model.load_cases if len(model.load_cases) > 0 else [DEFAULT_CASE]
+        case = cases[0] if case is None else case
+        if case not in cases:
+            raise ValueError('unknown load case %s' % case)
+        self.model = model
+        self.scatter = scatter
+        self.truss = Truss.fromModel(model)
+        self.truss.solveForceEquations(method=method)
+        # a model without loads only has the empty default case
+        loads = np.flatnonzero(model.load_case == cases.index(case))
+        self._magnitude = model.load_magnitude[loads]
+        self._angle = model.load_angle[loads]
+        # scatter the x and y parts of every force onto the node rows
+        node = model.load_node[loads]
+        rows = np.concatenate([2*node, 2*node+1])
+        self._scatter = sp.csr_matrix((np.ones(len(rows)), (rows, np.arange(len(rows)))), shape=(2*model.number_of_nodes, len(rows)))
+        area, inertia_xx, inertia_yy = model.sectionProperties()
+        self._area = area
+        self._inertia_min = np.minimum(inertia_xx, inertia_yy)
+        self._length = model.directionCosines()[1]
+
+    def sample(self, size, rng):
+        """draw and check size sampled trusses
+
+        Args:
+            size (int): number of samples
+            rng (Generator): random generator
+
+        Returns:
+            ndarray: (members, size) failure flags
+        """
+        m = self.model.number_of_members
+        magnitude = self._magnitude[:, None]*np.ones((1, size))
+        angle = self._angle[:, None]*np.ones((1, size))
+        if 'load_magnitude' in self.scatter:
+            magnitude = magnitude*sampleFactors(self.scatter['load_magnitude'], magnitude.shape, rng)
+        if 'load_angle' in self.scatter:
+            angle = angle + self.scatter['load_angle'].cov*(sampleFactors(self.scatter['load_angle'], angle.shape, rng) - 1)
+        angle = angle*np.pi/180
+        f = self._scatter @ np.concatenate([magnitude*np.cos(angle), magnitude*np.sin(angle)])
+        external_force = -self.truss.solveLoads(f)[:m]
+
+        e_module = self.model.e_module[:, None]*np.ones((1, size))
+        yield_strength = self.model.yield_strength[:, None]*np.ones((1, size))
+        if 'e_module' in self.scatter:
+            e_module = e_module*sampleFactors(self.scatter['e_module'], e_module.shape, rng)
+        if 'yield_strength' in self.scatter:
+            yield_strength = yield_strength*sampleFactors(self.scatter['yield_strength'], yield_strength.shape, rng)
+        if 'dimensions' in self.scatter:
+            dimensions = self.model.dimensions[:, None, :]*sampleFactors(self.scatter['dimensions'], (m, size, 3), rng)
+            area, inertia_xx, inertia_yy = sectionProperties(np.repeat(self.model.shape, size), dimensions.reshape(-1, 3))
+            inertia_min = np.minimum(inertia_xx, inertia_yy)
+        else:
+            area = np.repeat(self._area, size)
+            inertia_min = np.repeat(self._inertia_min, size)
+        # one flat vector of members x samples through the vectorized buckling and yielding check
+        result = evaluateFailures(external_force.ravel(), area, inertia_min, np.repeat(self._length, size),
+                                  e_module.ravel(), yield_strength.ravel())
+        return result.failure.reshape(m, size)
+
+    def batchSize(self):
+        return max(1, BATCH_VALUES//max(self.model.number_of_members + self.truss.number_of_reactions, 1))
+
+# reliability model of a worker process, created once by the pool initializer
+_worker_model = None
+
+def _initWorker(model, scatter, case, method):
+    global _worker_model
+    _worker_model = ReliabilityModel(model, scatter, case, method)
+
+def _countFailures(reliability_model, seed, size):
+    """failure counts of one batch with its own random stream
+
+    Returns:
+        member_failures: (members,) failing samples per member
+        system_failures: samples with any failing member
+    """
+    failure = reliability_model.sample(size, np.random.default_rng(seed))
+    return failure.sum(axis=1), int(np.count_nonzero(failure.any(axis=0)))
+
+def _workerBatch(seed, size):
+    return _countFailures(_worker_model, seed, size)
+
+def wilsonInterval(failures, samples, confidence=0.95):
+    """Wilson score interval of a binomial probability
+
+    Returns:
+        lower, upper: bounds with the same shape as failures
+    """
+    z = NormalDist().inv_cdf(0.5 + confidence/2)
+    p = np.asarray(failures, dtype=float)/samples
+    center = (p + z**2/(2*samples))/(1 + z**2/samples)
+    half = z*np.sqrt(p*(1-p)/samples + z**2/(4*samples**2))/(1 + z**2/samples)
+    return np.maximum(center - half, 0), np.minimum(center + half, 1)
+
+def runReliability(model, scatter, samples, seed=0, workers=1, case=None, method='equilibrium', batch_size=None, confidence=0.95):
+    """Monte Carlo failure probabilities of every member and of the whole truss (any member fails)
+
+    The samples are drawn in fixed batches, every batch with its own stream spawned from
+    SeedSequence(seed), so the result does not depend on the number of workers.
+
+    Args:
+        model (TrussModel): nominal truss definition
+        scatter (dict): input name (see SCATTER_INPUTS) -> Scatter
+        samples (int): number of sampled trusses
+        seed (int): root seed
+        workers (int): worker processes, 1 runs in this process
+        case (str, optional): load case to sample, by default the first one
+        method (str): solver method of Truss.solveForceEquations
+        batch_size (int, optional): samples per batch, by default about BATCH_VALUES floats per batch
+        confidence (float): confidence level of the intervals
+
+    Returns:
+        ReliabilityResult: probabilities with their confidence intervals
+    """
+    reliability_model = ReliabilityModel(model, scatter, case, method)
+    batch_size = batch_size or reliability_model.batchSize()
+    sizes = [min(batch_size, samples - start) for start in range(0, samples, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if workers == 1:
+        counts = [_countFailures(reliability_model, s, n) for s, n in zip(seeds, sizes)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_initWorker, initargs=(model, scatter, case, method)) as pool:
+            counts = list(pool.map(_workerBatch, seeds, sizes))
+    member_failures = np.sum([c[0] for c in counts], axis=0)
+    system_failures = sum(c[1] for c in counts)
+    member_interval = np.stack(wilsonInterval(member_failures, samples, confidence), axis=1)
+    system_interval = wilsonInterval(system_failures, samples, confidence)
+    return ReliabilityResult(samples, member_failures/samples, member_interval, system_failures/samples,
+                             (float(system_interval[0]), float(system_interval[1])))
+
+if __name__ == '__main__':
+    # python reliability.py truss2.txt --samples 1000000 --load-cov 0.15 --angle-std 5 --fy-cov 0.07 -j 4
+    from loader import loadTruss
+    arg_parser = argparse.ArgumentParser(description='Monte Carlo failure probabilities of the members')
+    arg_parser.add_argument('truss_definition', help='.txt or binary truss definition')
+    arg_parser.add_argument('--samples', type=int, default=100000, help='number of sampled trusses')
+    arg_parser.add_argument('--seed', type=int, default=0, help='root seed')
+    arg_parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1, help='worker processes')
+    arg_parser.add_argument('--case', help='load case to sample, by default the first one')
+    arg_parser.add_argument('--distribution', default='normal', choices=['normal', 'lognormal', 'uniform'], help='distribution of the factors')
+    arg_parser.add_argument('--load-cov', type=float, help='coefficient of variation of the load magnitudes')
+    arg_parser.add_argument('--angle-std', type=float, help='standard deviation of the load angles in degrees')
+    arg_parser.add_argument('--e-cov', type=float, help="coefficient of variation of young's modulus")
+    arg_parser.add_argument('--fy-cov', type=float, help='coefficient of variation of the yield strength')
+    arg_parser.add_argument('--dim-cov', type=float, help='coefficient of variation of the section dimensions')
+    args = arg_parser.parse_args()
+
+    scatter = {}
+    for name, value in [('load_magnitude', args.load_cov), ('e_module', args.e_cov), ('yield_strength', args.fy_cov), ('dimensions', args.dim_cov)]:
+        if value:
+            scatter[name] = Scatter(args.distribution, value)
+    if args.angle_std:
+        scatter['load_angle'] = Scatter('normal', args.angle_std)
+    model = loadTruss(args.truss_definition)
+    result = runReliability(model, scatter, args.samples, args.seed, args.workers, args.case)
+    for k in range(model.number_of_members):
+        print('member', model.member_names[k], 'failure probability =', result.member_probability[k], 'in', result.member_interval[k])
+    print('system failure probability =', result.system_probability, 'in', result.system_interval)
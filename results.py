@@ -0,0 +1,261 @@
+import sys
+import json
+import numpy as np
+from model import LOOSE
+
+# failure mode codes of TrussResult.failure_mode
+FAILURE_MODES = ['none', 'buckling', 'yielding']
+# rows formatted and written at once
+CHUNK_SIZE = 65536
+EXPORT_FORMATS = ['csv', 'jsonl', 'npz']
+
+def _formatRows(template, columns):
+    """format rows with one %-template call per chunk instead of one call per row
+
+    Args:
+        template (str): format of one row
+        columns (list): equally long lists, one per placeholder
+
+    Returns:
+        str: the formatted rows
+    """
+    values = [v for row in zip(*columns) for v in row]
+    return (template*len(columns[0])) % tuple(values)
+
+class TrussResult:
+    def __init__(self, load_cases, member_names, force, critical_force, utilization, failure_mode, reaction_nodes,
+                 reaction_directions, reactions, node_names=None, displacements=None, deflection_failures=None):
+        """labelled columnar results of a solve
+
+        Args:
+            load_cases (list): names of the load cases, the columns of all (rows, cases) arrays
+            member_names (array): (M,) names of the members
+            force (array): (M, cases) member forces
+            critical_force (array): (M, cases) buckling or yield force of the check
+            utilization (array): (M, cases) |force|/critical force
+            failure_mode (array): (M, cases) index into FAILURE_MODES
+            reaction_nodes (array): (R,) node name of every reaction
+            reaction_directions (array): (R,) 'x' or 'y' for fixed nodes, 'normal' (perpendicular to the ground) for loose nodes
+            reactions (array): (R, cases) reaction forces
+            node_names (array, optional): (N,) names of the nodes, needed with displacements
+            displacements (array, optional): (N, 2, cases) nodal displacements
+            deflection_failures (array, optional): (N, cases) flags of the deflection check
+        """
+        self.load_cases = list(load_cases)
+        self.member_names = np.asarray(member_names, dtype=str)
+        self.force = np.asarray(force, dtype=float)
+        self.critical_force = np.asarray(critical_force, dtype=float)
+        self.utilization = np.asarray(utilization, dtype=float)
+        self.failure_mode = np.asarray(failure_mode, dtype=np.int8)
+        self.reaction_nodes = np.asarray(reaction_nodes, dtype=str)
+        self.reaction_directions = np.asarray(reaction_directions, dtype=str)
+        self.reactions = np.asarray(reactions, dtype=float)
+        self.node_names = None if node_names is None else np.asarray(node_names, dtype=str)
+        self.displacements = None if displacements is None else np.asarray(displacements, dtype=float)
+        self.deflection_failures = None if deflection_failures is None else np.asarray(deflection_failures, dtype=bool)
+
+    @classmethod
+    def fromTruss(cls, model, truss_solver):
+        """gather the results of a solved Truss (or a cached result)
+
+        Args:
+            model (TrussModel): truss definition
+            truss_solver (Truss or CachedResult): solved truss
+
+        Returns:
+            TrussResult: the labelled results
+        """
+        m = model.number_of_members
+        reaction_node, reaction_direction = model.reactionLayout()
+        loose = model.node_type[reaction_node] == LOOSE
+        # fixed nodes have an x reaction followed by a y reaction
+        directions = np.where(loose, 'normal', np.where(reaction_direction[:, 0] != 0, 'x', 'y'))
+        result = truss_solver.failure_result
+        failure_mode = np.where(result.buckling, 1, np.where(result.yielding, 2, 0))
+        displacements = getattr(truss_solver, 'displacements', None)
+        if displacements is not None:
+            displacements = displacements.reshape(model.number_of_nodes, 2, -1)
+        return cls(truss_solver.load_cases, model.member_names, truss_solver.unknown_forces[:m], result.critical_force, result.utilization,
+                   failure_mode, model.node_names[reaction_node], directions, truss_solver.unknown_forces[m:], model.node_names, displacements,
+                   getattr(truss_solver, 'deflection_failures', None))
+
+    @property
+    def failures(self):
+        """(M, cases) failure flags
+        """
+        return self.failure_mode != 0
+
+    @property
+    def failure_vector(self):
+        """(M,) failure flags of a single load case, (M, cases) with several cases
+        """
+        return self.failures[:, 0] if len(self.load_cases) == 1 else self.failures
+
+    def _rows(self, table, start, stop):
+        """columns of the rows start:stop of the case-major long table
+
+        Returns:
+            dict: column name -> list
+        """
+        if table == 'members':
+            names = self.member_names
+            values = [('force', self.force), ('critical_force', self.critical_force), ('utilization', self.utilization)]
+        elif table == 'reactions':
+            names = self.reaction_nodes
+            values = [('reaction', self.reactions)]
+        else:
+            raise ValueError('unknown table %s' % table)
+        size = len(names)
+        index = np.arange(start, stop)
+        case = index//size if size > 0 else index
+        row = index - case*size
+        columns = {'case': np.array(self.load_cases, dtype=str)[case].tolist()}
+        columns['member' if table == 'members' else 'node'] = names[row].tolist()
+        if table == 'reactions':
+            columns['direction'] = self.reaction_directions[row].tolist()
+        for name, array in values:
+            columns[name] = array[row, case].tolist()
+        if table == 'members':
+            columns['failure_mode'] = np.array(FAILURE_MODES)[self.failure_mode[row, case]].tolist()
+        return columns
+
+    def _size(self, table):
+        return len(self.load_cases)*(len(self.member_names) if table == 'members' else len(self.reaction_nodes))
+
+    def writeCsv(self, stream, table='members', chunk_size=CHUNK_SIZE):
+        """write one table as CSV, one row per member (or reaction) and load case
+
+        Args:
+            stream (file): writable text stream
+            table (str): 'members' (case, member, force, critical_force, utilization, failure_mode)
+                         or 'reactions' (case, node, direction, reaction)
+            chunk_size (int): rows formatted at once
+
+        Raises:
+            ValueError: unknown table
+        """
+        size = self._size(table)
+        columns = self._rows(table, 0, 0)
+        stream.write(','.join(columns) + '\n')
+        # names are written as they are, the parser does not allow commas or spaces in them
+        template = ','.join('%r' if name in ['force', 'critical_force', 'utilization', 'reaction'] else '%s' for name in columns) + '\n'
+        for start in range(0, size, chunk_size):
+            stream.write(_formatRows(template, list(self._rows(table, start, min(start + chunk_size, size)).values())))
+
+    def writeJsonLines(self, stream, table='members', chunk_size=CHUNK_SIZE):
+        """write one table as JSON Lines, one object per member (or reaction) and load case
+
+        Args:
+            stream (file): writable text stream
+            table (str): 'members' or 'reactions', see writeCsv
+            chunk_size (int): rows formatted at once
+
+        Raises:
+            ValueError: unknown table
+        """
+        size = self._size(table)
+        names = list(self._rows(table, 0, 0))
+        numbers = ['force', 'critical_force', 'utilization', 'reaction']
+        template = '{' + ', '.join('"%s": %%s' % name for name in names) + '}\n'
+        for start in range(0, size, chunk_size):
+            columns = self._rows(table, start, min(start + chunk_size, size))
+            for name in names:
+                if name in numbers:
+                    # JSON has no NaN or infinity, non-finite values are written as null
+                    finite = np.isfinite(columns[name]).tolist()
+                    if not all(finite):
+                        columns[name] = [repr(value) if f else 'null' for value, f in zip(columns[name], finite)]
+                else:
+                    # strings are quoted once per distinct value
+                    quoted = {value: json.dumps(value) for value in set(columns[name])}
+                    columns[name] = [quoted[value] for value in columns[name]]
+            stream.write(_formatRows(template, [columns[name] for name in names]))
+
+    def saveNpz(self, path):
+        """store all columns as arrays in an .npz file, see loadNpz
+        """
+        arrays = {'load_cases': np.array(self.load_cases, dtype=str), 'member_names': self.member_names, 'force': self.force,
+                  'critical_force': self.critical_force, 'utilization': self.utilization, 'failure_mode': self.failure_mode,
+                  'reaction_nodes': self.reaction_nodes, 'reaction_directions': self.reaction_directions, 'reactions': self.reactions}
+        if self.displacements is not None:
+            arrays['node_names'] = self.node_names
+            arrays['displacements'] = self.displacements
+        if self.deflection_failures is not None:
+            arrays['deflection_failures'] = self.deflection_failures
+        np.savez(path, **arrays)
+
+    @classmethod
+    def loadNpz(cls, path):
+        """read the results written by saveNpz
+
+        Returns:
+            TrussResult: the stored results
+        """
+        with np.load(path) as data:
+            return cls(data['load_cases'].tolist(), data['member_names'], data['force'], data['critical_force'], data['utilization'],
+                       data['failure_mode'], data['reaction_nodes'], data['reaction_directions'], data['reactions'],
+                       *[data[name] if name in data else None for name in ['node_names', 'displacements', 'deflection_failures']])
+
+    def export(self, path, chunk_size=CHUNK_SIZE):
+        """write the results by the file extension: .csv and .jsonl write the member table followed by the reactions
+        into '<name>.reactions.<ext>', .npz stores every array
+
+        Raises:
+            ValueError: unknown format
+        """
+        extension = path.rsplit('.', 1)[-1]
+        if extension == 'npz':
+            self.saveNpz(path)
+            return
+        if extension not in EXPORT_FORMATS:
+            raise ValueError('unknown export format %s' % extension)
+        write = self.writeCsv if extension == 'csv' else self.writeJsonLines
+        for table, target in [('members', path), ('reactions', path[:-len(extension)] + 'reactions.' + extension)]:
+            with open(target, 'w') as f:
+                write(f, table, chunk_size)
+
+    def writeText(self, stream=sys.stdout, chunk_size=CHUNK_SIZE):
+        """write the console listing of the members and reactions of every load case
+        """
+        m = len(self.member_names)
+        for c, case in enumerate(self.load_cases):
+            if len(self.load_cases) > 1:
+                stream.write('load case %s\n' % case)
+            for start in range(0, m, chunk_size):
+                rows = slice(start, min(start + chunk_size, m))
+                stream.write(_formatRows('member %s force = %.10g ; the member fails:  %s\n',
+                                         [self.member_names[rows].tolist(), self.force[rows, c].tolist(), self.failures[rows, c].tolist()]))
+            direction = np.where(self.reaction_directions == 'normal', '', ' in ' + self.reaction_directions + ' direction')
+            stream.write(_formatRows('reaction force of node %s%s = %.10g\n',
+                                     [self.reaction_nodes.tolist(), direction.tolist(), self.reactions[:, c].tolist()]))
+            if self.deflection_failures is not None:
+                stream.write(_formatRows('displacement of node %s = [%.10g, %.10g] ; the deflection exceeds the limit:  %s\n',
+                                         [self.node_names.tolist(), self.displacements[:, 0, c].tolist(), self.displacements[:, 1, c].tolist(),
+                                          self.deflection_failures[:, c].tolist()]))
+
+    def summary(self, top=10, failing_only=False):
+        """compact report: per load case every failing member and the top utilized members, by decreasing utilization
+
+        Args:
+            top (int): most utilized members listed per load case in addition to the failing ones
+            failing_only (bool): list only the failing members
+
+        Returns:
+            str: the report
+        """
+        lines = []
+        m = len(self.member_names)
+        for c, case in enumerate(self.load_cases):
+            utilization = self.utilization[:, c]
+            failing = np.flatnonzero(self.failures[:, c])
+            lines.append('load case %s: %d of %d members fail, max utilization %.4g' % (case, len(failing), m, utilization.max(initial=0)))
+            chosen = failing
+            k = min(top, m)
+            if not failing_only and k > 0:
+                # the k largest utilizations without sorting all members
+                chosen = np.union1d(failing, np.argpartition(-utilization, k - 1)[:k])
+            chosen = chosen[np.argsort(-utilization[chosen], kind='stable')]
+            for k in chosen.tolist():
+                lines.append('  member %s force = %.6g ; utilization = %.4f ; %s' % (self.member_names[k], self.force[k, c], utilization[k],
+                                                                                     FAILURE_MODES[self.failure_mode[k, c]]))
+        return '\n'.join(lines)
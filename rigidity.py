@@ -0,0 +1,174 @@
+import numpy as np
+from collections import namedtuple
+from model import FIXED, LOOSE
+
+# the outcome of the pebble game: rigid means no joint can move, the indexes refer to the model arrays
+RigidityResult = namedtuple('RigidityResult', ['rigid', 'degrees_of_freedom', 'flexible_nodes', 'redundant_members', 'redundant_supports'])
+
+class PebbleGame:
+    def __init__(self, number_of_vertices):
+        """(2, 3) pebble game of Jacobs and Hendrickson on a bar-joint graph
+
+        Every vertex starts with two pebbles (its degrees of freedom in the plane). An edge is
+        independent if four pebbles can be gathered on its ends; it then takes one of them and
+        is directed away from the vertex which gave it.
+
+        Args:
+            number_of_vertices (int): number of vertices
+        """
+        self.pebbles = [2]*number_of_vertices
+        self.out = [[] for _ in range(number_of_vertices)]
+        self._seen = [0]*number_of_vertices
+        self._stamp = 0
+
+    def _search(self, v, blocked):
+        """move a free pebble onto v along a directed path, vertices in blocked keep their pebbles
+
+        Returns:
+            bool: True if a pebble was moved, otherwise the vertices visited by the search
+        """
+        self._stamp = self._stamp + 1
+        stamp = self._stamp
+        seen = self._seen
+        seen[v] = stamp
+        for b in blocked:
+            seen[b] = stamp
+        parent = {v: -1}
+        stack = [v]
+        while stack:
+            x = stack.pop()
+            for y in self.out[x]:
+                if seen[y] == stamp:
+                    continue
+                seen[y] = stamp
+                parent[y] = x
+                if self.pebbles[y] > 0:
+                    # reverse the path so that the pebble of y ends up on v
+                    self.pebbles[y] = self.pebbles[y] - 1
+                    while y != v:
+                        x = parent[y]
+                        self.out[x].remove(y)
+                        self.out[y].append(x)
+                        y = x
+                    self.pebbles[v] = self.pebbles[v] + 1
+                    return True
+                stack.append(y)
+        return list(parent)
+
+    def gather(self, v, count, blocked):
+        """collect count pebbles on v
+
+        Returns:
+            bool: if v holds count pebbles
+        """
+        while self.pebbles[v] < count:
+            if self._search(v, blocked) is not True:
+                return False
+        return True
+
+    def insert(self, u, v):
+        """try to insert the edge u-v
+
+        Returns:
+            bool: True if the edge is independent, False if it is redundant; a loop u-u never constrains anything
+        """
+        if u == v:
+            return False
+        if not (self.gather(u, 2, (v,)) and self.gather(v, 2, (u,))):
+            return False
+        self.pebbles[u] = self.pebbles[u] - 1
+        self.out[u].append(v)
+        return True
+
+    def rigidWith(self, u, v, w):
+        """check if w belongs to the rigid component of the independent edge u-v
+
+        The three pebbles left on a rigid body are pinned on u and v; w moves relative
+        to them if it can still reach a free pebble.
+
+        Returns:
+            bool or list: False if w is flexible, otherwise the vertices of the failed search which are all rigid with u-v
+        """
+        self.gather(u, 2, (v,))
+        self.gather(v, 3 - self.pebbles[u], (u,))
+        if self.pebbles[w] > 0:
+            return False
+        found = self._search(w, (u, v))
+        if found is True:
+            return False
+        return found
+
+def checkRigidity(model):
+    """combinatorial (generic) rigidity analysis of the truss and its supports, no matrix is built
+
+    The ground is one rigid body, represented by the two ground vertices g1-g2 with a bar between
+    them; fixed nodes are tied to both ground vertices and loose nodes to one of them. The truss is
+    statically determinate exactly when every bar is independent and only the three rigid body
+    pebbles of the ground are left. Special geometry (e.g. three parallel reactions) is only found
+    by the matrix solve.
+
+    Args:
+        model (TrussModel): truss definition
+
+    Returns:
+        RigidityResult: rigidity, free degrees of freedom, flexible joints, redundant members and supports
+    """
+    n = model.number_of_nodes
+    g1 = n
+    g2 = n + 1
+    game = PebbleGame(n + 2)
+    game.insert(g1, g2)
+
+    redundant_supports = []
+    for i in np.flatnonzero(model.node_type == FIXED).tolist():
+        if not game.insert(i, g1):
+            redundant_supports.append(i)
+        if not game.insert(i, g2):
+            redundant_supports.append(i)
+    for i in np.flatnonzero(model.node_type == LOOSE).tolist():
+        if not game.insert(i, g1):
+            redundant_supports.append(i)
+
+    redundant_members = [k for k, (i, j) in enumerate(model.connectivity.tolist()) if not game.insert(i, j)]
+    degrees_of_freedom = sum(game.pebbles) - 3
+
+    flexible_nodes = []
+    if degrees_of_freedom > 0:
+        rigid = np.zeros(n + 2, dtype=bool)
+        for w in range(n):
+            if rigid[w]:
+                continue
+            found = game.rigidWith(g1, g2, w)
+            if found is False:
+                flexible_nodes.append(w)
+            else:
+                rigid[found] = True
+    return RigidityResult(degrees_of_freedom == 0, degrees_of_freedom, np.array(flexible_nodes, dtype=np.int64),
+                          np.array(redundant_members, dtype=np.int64), np.array(sorted(set(redundant_supports)), dtype=np.int64))
+
+def validateRigidity(model, redundant=False):
+    """reject mechanisms, and over-constrained trusses unless redundant is True
+
+    Args:
+        model (TrussModel): truss definition
+        redundant (bool): accept redundant members and supports (e.g. for the stiffness method)
+
+    Raises:
+        ValueError: the truss is a mechanism, naming the flexible joints
+        ValueError: the truss is over-constrained, naming the redundant members and supports
+
+    Returns:
+        RigidityResult: the rigidity analysis
+    """
+    result = checkRigidity(model)
+    details = []
+    if len(result.redundant_members) > 0:
+        details.append('redundant members: ' + ', '.join(model.member_names[result.redundant_members]))
+    if len(result.redundant_supports) > 0:
+        details.append('redundant supports: ' + ', '.join(model.node_names[result.redundant_supports]))
+    if not result.rigid:
+        raise ValueError('the truss is a mechanism, flexible joints: ' + ', '.join(model.node_names[result.flexible_nodes]) +
+                         ''.join('; ' + d for d in details))
+    if details and not redundant:
+        raise ValueError('the truss is over-constrained, ' + '; '.join(details))
+    return result
@@ -0,0 +1,219 @@
+import numpy as np
+import scipy.sparse as sp
+from member import criticalForceDerivative
+from stiffness import StiffnessSolver
+
+# entries below this fraction of the largest entry are dropped from sparse Jacobians
+SPARSE_TOLERANCE = 1e-12
+# member forces below this fraction of the largest force are zero-force members, |F| has a kink there
+ZERO_FORCE = 1e-9
+# columns of the input derivative solved at once by the direct method
+BLOCK_COLUMNS = 256
+
+def _dropRoundoff(J):
+    """sparse copy of J without the entries below SPARSE_TOLERANCE of its largest entry
+    """
+    J = sp.csr_matrix(J)
+    J.data[np.abs(J.data) <= SPARSE_TOLERANCE*np.abs(J.data).max(initial=0)] = 0
+    J.eliminate_zeros()
+    return J
+
+def lengthJacobian(model):
+    """derivatives of the member lengths with respect to the node coordinates
+
+    Returns:
+        csr_matrix: (M, 2N) dL/dx in x, y order of the nodes
+    """
+    cosines = model.directionCosines()[0]
+    i = model.connectivity[:, 0]
+    j = model.connectivity[:, 1]
+    m = np.arange(model.number_of_members)
+    rows = np.concatenate([m, m, m, m])
+    cols = np.concatenate([2*j, 2*j+1, 2*i, 2*i+1])
+    values = np.concatenate([cosines[:, 0], cosines[:, 1], -cosines[:, 0], -cosines[:, 1]])
+    return sp.csr_matrix((values, (rows, cols)), shape=(model.number_of_members, 2*model.number_of_nodes))
+
+def geometricMatrix(model, member_forces):
+    """derivative of the equilibrium residual A F with respect to the node coordinates at fixed forces F
+
+    A member pulls its nodes with F c, c being its direction cosines; dc/dx_j = (I - c c^T)/L = -dc/dx_i.
+
+    Args:
+        model (TrussModel): truss definition
+        member_forces (array): (M,) member forces F of one load case
+
+    Returns:
+        csr_matrix: (2N, 2N) d(A F)/dx
+    """
+    cosines, length = model.directionCosines()
+    i = model.connectivity[:, 0]
+    j = model.connectivity[:, 1]
+    # K = F (I - c c^T)/L of every member as (M, 2, 2) blocks
+    K = (np.identity(2)[None, :, :] - cosines[:, :, None]*cosines[:, None, :])*(member_forces/length)[:, None, None]
+    rows = []
+    cols = []
+    values = []
+    # d(residual of node i)/dx_j = K, d/dx_i = -K; the residual of node j has the opposite sign
+    for a, b, sign in [(i, j, 1.0), (i, i, -1.0), (j, i, 1.0), (j, j, -1.0)]:
+        for p in range(2):
+            for q in range(2):
+                rows.append(2*a+p)
+                cols.append(2*b+q)
+                values.append(sign*K[:, p, q])
+    n = 2*model.number_of_nodes
+    return sp.csr_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))), shape=(n, n))
+
+class SensitivityAnalysis:
+    def __init__(self, truss):
+        """design sensitivities of a solved statically determinate truss
+
+        The equilibrium A(x) F = -f is differentiated: dF/df = -A^-1 and dF/dx = -A^-1 G with the
+        geometric matrix G = d(A F)/dx. Gradients of one weighted sum cost one adjoint solve
+        A^T lambda = w, Jacobians either one direct solve per input or one adjoint solve per output,
+        whichever is fewer; all solves reuse the factorization of the truss.
+
+        Args:
+            truss (Truss): truss solved with the 'equilibrium' or 'joints' method
+
+        Raises:
+            ValueError: the truss was not solved yet
+            ValueError: the truss was solved with the stiffness method
+        """
+        factorization = getattr(truss, 'factorization', None)
+        if factorization is None:
+            raise ValueError('the truss has to be solved first')
+        if isinstance(factorization, StiffnessSolver):
+            raise ValueError('sensitivities need the equilibrium matrix of a statically determinate truss')
+        self.truss = truss
+        self.model = truss.model
+        self.factorization = factorization
+        self.number_of_member = truss.number_of_member
+        self._length = self.model.directionCosines()[1]
+        self._dLdx = lengthJacobian(self.model)
+
+    def _forces(self, case):
+        return self.truss.unknown_forces[:, case]
+
+    def _jacobian(self, rows, G, sparse):
+        """rows of -A^-1 G with the cheaper of the direct and the adjoint solves
+        """
+        size = self.truss.unknown_forces.shape[0]
+        if len(rows) < G.shape[1]:
+            # adjoint: one transposed solve per output
+            E = np.zeros((size, len(rows)))
+            E[rows, np.arange(len(rows))] = 1
+            J = -np.asarray((G.T @ self.factorization.solveTransposed(E)).T)
+            return _dropRoundoff(J) if sparse else J
+        # direct: one solve per input, in blocks of columns so that G is never dense as a whole
+        G = sp.csc_matrix(G)
+        blocks = []
+        for start in range(0, G.shape[1], BLOCK_COLUMNS):
+            block = -self.factorization.solve(G[:, start:start + BLOCK_COLUMNS].toarray())[rows]
+            blocks.append(_dropRoundoff(block) if sparse else block)
+        if sparse:
+            # the blocks only dropped entries below their own largest entry, which is at most the overall one
+            return _dropRoundoff(sp.hstack(blocks, format='csr'))
+        return np.hstack(blocks)
+
+    def _rows(self, outputs):
+        if outputs is None:
+            return np.arange(self.truss.unknown_forces.shape[0])
+        return np.asarray(outputs, dtype=np.int64)
+
+    def _inputs(self, wrt, case):
+        """derivative of the residual A F + f with respect to the inputs
+        """
+        if wrt == 'coordinates':
+            return geometricMatrix(self.model, self._forces(case)[:self.number_of_member])
+        if wrt == 'loads':
+            return sp.identity(2*self.model.number_of_nodes, format='csr')
+        raise ValueError('unknown input %s' % wrt)
+
+    def forceJacobian(self, wrt='coordinates', case=0, outputs=None, sparse=False):
+        """derivatives of the member forces and reactions
+
+        Args:
+            wrt (str): 'coordinates' (x, y of every node) or 'loads' (x, y load component of every node)
+            case (int): load case column
+            outputs (array, optional): unknowns (members followed by reactions) to differentiate, by default all
+            sparse (bool): return a csr_matrix without the roundoff entries
+
+        Raises:
+            ValueError: unknown input
+
+        Returns:
+            ndarray or csr_matrix: (outputs, 2N) Jacobian
+        """
+        return self._jacobian(self._rows(outputs), self._inputs(wrt, case), sparse)
+
+    def _utilizationTerms(self, case, members):
+        """du/dF and du/dL of the members, u = |F|/P with the critical force P(L)
+        """
+        forces = self._forces(case)[:self.number_of_member]
+        F = forces[members]
+        critical_force = self.truss.failure_result.critical_force[members, case]
+        utilization = np.abs(F)/critical_force
+        # the failure check acts on the external force -F
+        dPdL = criticalForceDerivative(-F, critical_force, self._length[members])
+        # the mean of the one-sided derivatives at the kink of zero-force members
+        sign = np.where(np.abs(F) > ZERO_FORCE*np.abs(forces).max(initial=0), np.sign(F), 0.0)
+        return sign/critical_force, -utilization/critical_force*dPdL
+
+    def utilizationJacobian(self, wrt='coordinates', case=0, members=None, sparse=False):
+        """derivatives of the member utilizations |force|/critical force
+
+        Moving the nodes changes both the member forces and, through the lengths, the buckling forces.
+
+        Args:
+            wrt (str): 'coordinates' or 'loads'
+            case (int): load case column
+            members (array, optional): members to differentiate, by default all
+            sparse (bool): return a csr_matrix without the roundoff entries
+
+        Raises:
+            ValueError: unknown input
+
+        Returns:
+            ndarray or csr_matrix: (members, 2N) Jacobian
+        """
+        members = np.arange(self.number_of_member) if members is None else np.asarray(members, dtype=np.int64)
+        dudF, dudL = self._utilizationTerms(case, members)
+        J = sp.diags(dudF) @ self._jacobian(members, self._inputs(wrt, case), sparse)
+        if wrt == 'coordinates':
+            dLdx = self._dLdx[members].multiply(dudL[:, None])
+            J = J + (dLdx if sparse else dLdx.toarray())
+        if sparse:
+            return _dropRoundoff(J)
+        return np.asarray(J)
+
+    def gradient(self, weights, wrt='coordinates', case=0, of='forces'):
+        """gradient of one weighted sum of the forces or utilizations with a single adjoint solve
+
+        Args:
+            weights (array): (members+reactions,) weights of the forces or (members,) of the utilizations
+            wrt (str): 'coordinates' or 'loads'
+            case (int): load case column
+            of (str): 'forces' or 'utilization'
+
+        Raises:
+            ValueError: unknown input or output
+
+        Returns:
+            ndarray: (2N,) gradient
+        """
+        weights = np.asarray(weights, dtype=float)
+        G = self._inputs(wrt, case)
+        if of == 'forces':
+            c = weights
+        elif of == 'utilization':
+            members = np.arange(self.number_of_member)
+            dudF, dudL = self._utilizationTerms(case, members)
+            c = np.zeros(self.truss.unknown_forces.shape[0])
+            c[:self.number_of_member] = weights*dudF
+        else:
+            raise ValueError('unknown output %s' % of)
+        # d(w^T F) = -lambda^T G with A^T lambda = w
+        g = -(G.T @ self.factorization.solveTransposed(c))
+        if of == 'utilization' and wrt == 'coordinates':
+            g = g + self._dLdx.T @ (weights*dudL)
+        return np.asarray(g)
@@ -0,0 +1,284 @@
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import threading
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# requests being solved at once over all connections, a connection holds its next request until one is answered
+DEFAULT_MAX_INFLIGHT = 64
+# longest request line, a text definition of a large truss is sent as one JSON line
+MAX_LINE = 2**27
+# latencies kept for the percentiles
+LATENCY_WINDOW = 10000
+PERCENTILES = [50, 90, 99]
+
+def _warmWorker():
+    """import the solver and solve a small truss in every worker before the first request arrives
+    """
+    from generators import generateTruss
+    from batch import solveModel
+    # large enough for the sparse factorization as well
+    solveModel(generateTruss('warren', 40))
+
+def _ping():
+    return os.getpid()
+
+def solveRequest(request):
+    """solve one request inside a worker process, errors are reported instead of raised
+
+    Args:
+        request (dict): 'text' with a text truss definition or 'model' with the TrussModel arrays (see loader.ARRAY_FIELDS
+                        and load_cases), optional 'method' and 'check'
+
+    Returns:
+        dict: forces, reactions, and failures (see batch.solveModel) or the error message
+    """
+    start = time.perf_counter()
+    try:
+        from loader import parseText, ARRAY_FIELDS
+        from model import TrussModel
+        from batch import solveModel
+        if 'text' in request:
+            model = parseText(request['text'])
+        elif 'model' in request:
+            model = TrussModel(**{name: request['model'][name] for name in ARRAY_FIELDS + ['load_cases'] if name in request['model']})
+        else:
+            raise ValueError("the request needs a 'text' or a 'model'")
+        result = solveModel(model, request.get('check', True), request.get('method', 'equilibrium'))
+    except Exception as e:
+        result = {'ok': False, 'error': '%s: %s' % (type(e).__name__, e)}
+    result['solve_time'] = time.perf_counter() - start
+    return result
+
+def percentiles(values, ranks=PERCENTILES):
+    """nearest-rank percentiles
+
+    Returns:
+        dict: 'p50', ... -> value, None without values
+    """
+    values = sorted(values)
+    return {'p%d' % q: values[min(len(values) - 1, max(0, -(-q*len(values)//100) - 1))] if values else None for q in ranks}
+
+class TrussServer:
+    def __init__(self, workers=None, max_inflight=DEFAULT_MAX_INFLIGHT, max_line=MAX_LINE):
+        """asyncio solver service answering JSON lines with a pool of warm worker processes
+
+        Every line of a connection is one request; requests of a connection are solved concurrently
+        and answered as they finish, with the 'id' of the request. Once max_inflight requests are
+        being solved the server stops reading, so clients are held back by their socket buffers.
+        A crashed worker breaks the pool: its requests are answered with an error and a new pool is started.
+
+        Args:
+            workers (int, optional): worker processes, by default the number of cores
+            max_inflight (int): requests solved at once
+            max_line (int): longest request line in bytes, a longer line is answered with an error and ends the connection
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.max_inflight = max_inflight
+        self.max_line = max_line
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.counters = {'requests': 0, 'errors': 0, 'inflight': 0}
+        self._pool = None
+        self._server = None
+
+    async def start(self, host='127.0.0.1', port=0, path=None):
+        """start the workers and listen on localhost TCP or on the Unix socket path
+
+        Returns:
+            str or tuple: the socket path or the (host, port) address
+        """
+        loop = asyncio.get_running_loop()
+        self._pool = self._startPool()
+        # start every worker now instead of on the first requests
+        await asyncio.gather(*[loop.run_in_executor(self._pool, _ping) for _ in range(self.workers)])
+        self._semaphore = asyncio.Semaphore(self.max_inflight)
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._handle, path=path, limit=self.max_line)
+            self.address = path
+        else:
+            self._server = await asyncio.start_server(self._handle, host, port, limit=self.max_line)
+            self.address = self._server.sockets[0].getsockname()[:2]
+        return self.address
+
+    def _startPool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_warmWorker)
+
+    async def serve(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        """stop listening and shut the workers down
+        """
+        self._server.close()
+        await self._server.wait_closed()
+        self._pool.shutdown()
+
+    def stats(self):
+        """request counters and latency percentiles (seconds) of the last LATENCY_WINDOW requests
+        """
+        latencies = list(self.latencies)
+        latency = percentiles(latencies)
+        latency['max'] = max(latencies) if latencies else None
+        latency['mean'] = sum(latencies)/len(latencies) if latencies else None
+        return dict(self.counters, ok=True, workers=self.workers, max_inflight=self.max_inflight, latency=latency)
+
+    async def _handle(self, reader, writer):
+        """read the requests of one connection
+        """
+        lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError) as e:
+                    # the request line is longer than max_line or the client went away
+                    await self._write(writer, lock, {'ok': False, 'error': '%s: %s' % (type(e).__name__, e)})
+                    break
+                if not line:
+                    break
+                # backpressure: the next request is read once this one has a free slot, idle connections hold none
+                await self._semaphore.acquire()
+                task = asyncio.ensure_future(self._respond(line, writer, lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            writer.close()
+
+    async def _respond(self, line, writer, lock):
+        """solve one request and write its response
+        """
+        start = time.perf_counter()
+        self.counters['inflight'] = self.counters['inflight'] + 1
+        request = {}
+        try:
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError('the request has to be a JSON object')
+            except ValueError as e:
+                request = {}
+                response = {'ok': False, 'error': '%s: %s' % (type(e).__name__, e)}
+            else:
+                if request.get('stats'):
+                    response = self.stats()
+                else:
+                    pool = self._pool
+                    try:
+                        response = await asyncio.get_running_loop().run_in_executor(pool, solveRequest, request)
+                    except BrokenProcessPool as e:
+                        # a worker crashed, the requests of the broken pool fail and the next ones get a new pool
+                        if self._pool is pool:
+                            self._pool = self._startPool()
+                            pool.shutdown(wait=False)
+                        response = {'ok': False, 'error': '%s: %s' % (type(e).__name__, e)}
+            if 'id' in request:
+                response['id'] = request['id']
+            if not request.get('stats'):
+                self.counters['requests'] = self.counters['requests'] + 1
+                if not response['ok']:
+                    self.counters['errors'] = self.counters['errors'] + 1
+                self.latencies.append(time.perf_counter() - start)
+            await self._write(writer, lock, response)
+        finally:
+            self.counters['inflight'] = self.counters['inflight'] - 1
+            self._semaphore.release()
+
+    async def _write(self, writer, lock, response):
+        async with lock:
+            try:
+                writer.write((json.dumps(response) + '\n').encode())
+                await writer.drain()
+            except ConnectionError:
+                pass
+
+def request(address, requests, timeout=None):
+    """blocking client: send requests over one connection and wait for all responses
+
+    Args:
+        address (str or tuple): Unix socket path or (host, port)
+        requests (list): request dicts, see solveRequest; {'stats': True} asks for the server statistics
+        timeout (float, optional): socket timeout in seconds
+
+    Raises:
+        ConnectionError: the server closed the connection, e.g. after an error which belongs to no request
+
+    Returns:
+        list: the responses in the order of the requests
+    """
+    requests = [dict(r, id=k) for k, r in enumerate(requests)]
+    if isinstance(address, str):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    connection.settimeout(timeout)
+    with connection:
+        connection.connect(address if isinstance(address, str) else tuple(address))
+        # send from a thread while the responses are read, the server stops reading when it is busy
+        responses = [None]*len(requests)
+        stream = connection.makefile('rb')
+        def send():
+            try:
+                for r in requests:
+                    connection.sendall((json.dumps(r) + '\n').encode())
+            except OSError:
+                # the server or the reader closed the connection, the reader reports it
+                pass
+        sender = threading.Thread(target=send)
+        sender.start()
+        error = None
+        for _ in range(len(requests)):
+            line = stream.readline()
+            if not line:
+                error = 'the server closed the connection'
+                break
+            response = json.loads(line)
+            if response.get('id') is None:
+                # errors of the connection itself, e.g. a line longer than max_line, end the connection
+                error = 'the server closed the connection: %s' % response.get('error')
+                break
+            responses[response['id']] = response
+        if error is not None:
+            # the remaining sends of the sender fail instead of blocking
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        sender.join()
+    if error is not None:
+        raise ConnectionError(error)
+    for response in responses:
+        del response['id']
+    return responses
+
+if __name__ == '__main__':
+    # python server.py --port 8765 -j 4  or  python server.py --unix /tmp/truss.sock
+    arg_parser = argparse.ArgumentParser(description='solver service answering JSON lines over TCP or a Unix socket')
+    arg_parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    arg_parser.add_argument('--port', type=int, default=8765, help='TCP port')
+    arg_parser.add_argument('--unix', help='listen on this Unix socket path instead of TCP')
+    arg_parser.add_argument('-j', '--workers', type=int, help='number of worker processes')
+    arg_parser.add_argument('--max-inflight', type=int, default=DEFAULT_MAX_INFLIGHT, help='requests solved at once')
+    args = arg_parser.parse_args()
+
+    async def main():
+        server = TrussServer(args.workers, args.max_inflight)
+        address = await server.start(args.host, args.port, args.unix)
+        print('listening on', address, 'with', server.workers, 'workers', file=sys.stderr)
+        try:
+            await server.serve()
+        finally:
+            await server.close()
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
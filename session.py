@@ -0,0 +1,265 @@
+import numpy as np
+from collections import namedtuple
+from member import sectionProperties, evaluateFailures
+from model import TrussModel
+from solver import Factorization
+from truss import Truss
+
+# members whose force or failure flags changed with an edit, forces and failures are (changed members, cases)
+SessionUpdate = namedtuple('SessionUpdate', ['members', 'forces', 'failures'])
+
+class SolverSession:
+    def __init__(self, model, load_cases=None, max_rank=32):
+        """stateful solver that keeps its factorization between local edits of the truss
+
+        Geometry edits change a few columns of the equilibrium matrix A. They are applied as a
+        low-rank (Woodbury) update of the stored factorization of the original A0 until more than
+        max_rank columns differ, then the current matrix is factorized again.
+
+        Args:
+            model (TrussModel): truss definition, the session works on its own copy
+            load_cases (list, optional): names of the load cases to solve
+            max_rank (int): number of changed columns before the matrix is factorized again
+
+        Raises:
+            ValueError: system is not deterministic
+        """
+        self.model = TrussModel(model.node_names, np.array(model.xy), model.node_type, model.inclination, np.array(model.member_names),
+                                np.array(model.connectivity), np.array(model.shape), np.array(model.dimensions), np.array(model.e_module),
+                                np.array(model.yield_strength), np.array(model.load_node), np.array(model.load_magnitude),
+                                np.array(model.load_angle), np.array(model.load_case), list(model.load_cases))
+        self.max_rank = max_rank
+        self.truss = Truss.fromModel(self.model, load_cases=load_cases)
+        self.truss.solveForceEquations()
+        self.load_cases = self.truss.load_cases
+        self.number_of_member = self.model.number_of_members
+        self.unknown_forces = self.truss.unknown_forces
+        self.failure_result = self.truss.failure_result
+        self._f = self.truss._f
+        self._node_index = {str(name): i for i, name in enumerate(self.model.node_names)}
+        self._member_index = {str(name): k for k, name in enumerate(self.model.member_names)}
+        area, inertia_xx, inertia_yy = self.model.sectionProperties()
+        self._area = area
+        self._inertia_min = np.minimum(inertia_xx, inertia_yy)
+        self._length = self.model.directionCosines()[1]
+        self._refactorize(self.truss._A, self.truss.factorization)
+
+    def _refactorize(self, A, factorization=None):
+        """store A as the new base matrix A0 and drop the low-rank corrections
+        """
+        self._A0 = A.tocsc()
+        self._base = factorization if factorization is not None else Factorization(self._A0)
+        # changed column indexes C, their differences D = A[:, C] - A0[:, C], and Z = A0^-1 D
+        self._columns = []
+        self._D = np.zeros((self._A0.shape[0], 0))
+        self._Z = np.zeros((self._A0.shape[0], 0))
+
+    def _solve(self, b):
+        """solve Ax = b for the current matrix A = A0 + D E_C^T with the Woodbury identity
+        """
+        y = self._base.solve(b)
+        if len(self._columns) == 0:
+            return y
+        C = self._columns
+        # A^-1 b = y - Z (I + E_C^T Z)^-1 E_C^T y
+        capacitance = np.identity(len(C)) + self._Z[C, :]
+        try:
+            correction = np.linalg.solve(capacitance, y[C])
+        except np.linalg.LinAlgError:
+            raise ValueError('system is singular, the truss is probably a mechanism')
+        return y - np.matmul(self._Z, correction)
+
+    def _memberColumn(self, k):
+        """dense column of member k in the equilibrium matrix for the current geometry
+        """
+        i, j = self.model.connectivity[k]
+        d = self.model.xy[j] - self.model.xy[i]
+        cosine = d/np.hypot(d[0], d[1])
+        column = np.zeros(self._A0.shape[0])
+        column[2*i:2*i+2] = column[2*i:2*i+2] + cosine
+        column[2*j:2*j+2] = column[2*j:2*j+2] - cosine
+        return column
+
+    def _updateColumns(self, members):
+        """replace the columns of the given members with a low-rank update or a new factorization
+        """
+        members = [int(k) for k in members]
+        new_columns = [k for k in members if k not in self._columns]
+        if len(self._columns) + len(new_columns) > self.max_rank:
+            # too many changed columns, the correction would cost more than a new factorization
+            A = self.model.buildEquilibriumMatrix()
+            self._refactorize(A)
+            return
+        self._columns = self._columns + new_columns
+        D = np.zeros((self._A0.shape[0], len(self._columns)))
+        D[:, :self._D.shape[1]] = self._D
+        Z = np.zeros_like(D)
+        Z[:, :self._Z.shape[1]] = self._Z
+        changed = [self._columns.index(k) for k in members]
+        for position, k in zip(changed, members):
+            D[:, position] = self._memberColumn(k) - self._A0[:, [k]].toarray()[:, 0]
+        Z[:, changed] = self._base.solve(D[:, changed])
+        self._D = D
+        self._Z = Z
+
+    def _update(self, forces, members=None):
+        """store the new forces, re-check the failures, and report what changed
+
+        Args:
+            forces (ndarray): (members+reactions, cases) new unknown forces
+            members (array, optional): members whose failure has to be checked, by default all
+
+        Returns:
+            SessionUpdate: changed members with their forces and failure flags
+        """
+        m = self.number_of_member
+        if members is None:
+            members = np.arange(m)
+        members = np.asarray(members, dtype=np.int64)
+        result = evaluateFailures(-forces[members, :], self._area[members], self._inertia_min[members], self._length[members],
+                                  self.model.e_module[members], self.model.yield_strength[members])
+        old_forces = self.unknown_forces[:m]
+        old_failures = self.failure_result.failure[members]
+        for field, value in zip(result._fields, result):
+            getattr(self.failure_result, field)[members, :] = value
+        self.unknown_forces = forces
+        tolerance = 1e-9*max(np.abs(forces[:m]).max(initial=0), 1e-300)
+        changed = np.any(np.abs(forces[:m] - old_forces) > tolerance, axis=1)
+        changed[members] = changed[members] | np.any(result.failure != old_failures, axis=1)
+        changed = np.flatnonzero(changed)
+        return SessionUpdate(changed, forces[changed], self.failure_result.failure[changed])
+
+    @property
+    def failures(self):
+        """(members, cases) failure flags of the current truss
+        """
+        return self.failure_result.failure
+
+    def set_load(self, node, amp, angle, case=None):
+        """replace the external force of a node in one load case
+
+        Args:
+            node (str): name of the loaded node
+            amp (float): the force amplitude
+            angle(deg) (float): the force angle
+            case (str, optional): load case, by default the first one
+
+        Returns:
+            SessionUpdate: changed members with their forces and failure flags
+        """
+        i = self._node_index[node]
+        c = 0 if case is None else self.load_cases.index(case)
+        # keep the model in sync: the new force replaces all forces of this node and case
+        case = self.load_cases[c]
+        if case not in self.model.load_cases:
+            self.model.load_cases.append(case)
+        stored_case = self.model.load_cases.index(case)
+        keep = ~((self.model.load_node == i) & (self.model.load_case == stored_case))
+        self.model.load_node = np.append(self.model.load_node[keep], i)
+        self.model.load_magnitude = np.append(self.model.load_magnitude[keep], amp)
+        self.model.load_angle = np.append(self.model.load_angle[keep], angle)
+        self.model.load_case = np.append(self.model.load_case[keep], stored_case)
+        self._f[2*i, c] = amp*np.cos(angle*np.pi/180)
+        self._f[2*i+1, c] = amp*np.sin(angle*np.pi/180)
+        # only the edited load case has to be solved again, the matrix does not change
+        forces = self.unknown_forces.copy()
+        forces[:, c] = self._solve(-self._f[:, c])
+        return self._update(forces)
+
+    def set_section(self, member, shape, dimensions, e_module=None, yield_strength=None):
+        """swap the cross section of one member
+
+        The forces of a statically determinate truss do not depend on the sections,
+        so only the failure of this member is checked again.
+
+        Args:
+            member (str): name of the member
+            shape (str): cross-section shape I, T, C, or O
+            dimensions (list): the parameters to describe the shape
+            e_module (float, optional): young's modulus, unchanged by default
+            yield_strength (float, optional): yield stress, unchanged by default
+
+        Returns:
+            SessionUpdate: the member if its failure flags changed
+        """
+        k = self._member_index[member]
+        self._setSection(k, shape, self._sectionOf(shape, dimensions), e_module, yield_strength)
+        return self._update(self.unknown_forces, [k])
+
+    def _sectionOf(self, shape, dimensions):
+        """padded dimensions, area, and minimum inertia of a new section, nothing is stored yet
+        """
+        padded = np.zeros(self.model.dimensions.shape[1])
+        padded[:len(dimensions)] = dimensions
+        area, inertia_xx, inertia_yy = sectionProperties(np.array([shape]), padded[None, :])
+        return padded, area[0], min(inertia_xx[0], inertia_yy[0])
+
+    def _setSection(self, k, shape, section, e_module, yield_strength):
+        """store the new section of member k with the properties from _sectionOf
+        """
+        self.model.shape[k] = shape
+        self.model.dimensions[k], self._area[k], self._inertia_min[k] = section
+        if e_module is not None:
+            self.model.e_module[k] = e_module
+        if yield_strength is not None:
+            self.model.yield_strength[k] = yield_strength
+
+    def move_node(self, node, x, y):
+        """move one joint, the columns of its members are updated with a low-rank correction
+
+        Args:
+            node (str): name of the node
+            x (float): new x position
+            y (float): new y position
+
+        Returns:
+            SessionUpdate: changed members with their forces and failure flags
+        """
+        i = self._node_index[node]
+        self.model.xy[i] = [x, y]
+        members = np.flatnonzero(np.any(self.model.connectivity == i, axis=1))
+        self._updateColumns(members)
+        d = self.model.xy[self.model.connectivity[members, 1]] - self.model.xy[self.model.connectivity[members, 0]]
+        self._length[members] = np.hypot(d[:, 0], d[:, 1])
+        return self._update(self._solve(-self._f))
+
+    def replace_member(self, member, node_i, node_j, shape=None, dimensions=None, e_module=None, yield_strength=None):
+        """reconnect one member to other nodes and optionally swap its section
+
+        Args:
+            member (str): name of the member
+            node_i (str): name of the first new node
+            node_j (str): name of the second new node
+            shape (str, optional): new cross-section shape
+            dimensions (list, optional): new parameters to describe the shape
+            e_module (float, optional): new young's modulus
+            yield_strength (float, optional): new yield stress
+
+        Returns:
+            SessionUpdate: changed members with their forces and failure flags
+        """
+        # check every input before the session changes, a failed edit leaves it as it was
+        k = self._member_index[member]
+        connectivity = [self._node_index[node_i], self._node_index[node_j]]
+        section = self._sectionOf(shape, dimensions) if shape is not None else None
+        old_connectivity = self.model.connectivity[k].copy()
+        old_state = (self._A0, self._base, self._columns, self._D, self._Z)
+        self.model.connectivity[k] = connectivity
+        try:
+            self._updateColumns([k])
+            forces = self._solve(-self._f)
+        except Exception:
+            self.model.connectivity[k] = old_connectivity
+            self._A0, self._base, self._columns, self._D, self._Z = old_state
+            raise
+        name = node_i + '-' + node_j
+        if len(name) > self.model.member_names.dtype.itemsize//4:
+            self.model.member_names = self.model.member_names.astype('<U%d' % len(name))
+        self.model.member_names[k] = name
+        del self._member_index[member]
+        self._member_index[name] = k
+        if section is not None:
+            self._setSection(k, shape, section, e_module, yield_strength)
+        d = self.model.xy[connectivity[1]] - self.model.xy[connectivity[0]]
+        self._length[k] = np.hypot(d[0], d[1])
+        return self._update(forces)
@@ -0,0 +1,129 @@
+import sys
+import itertools
+import numpy as np
+from collections import namedtuple
+from member import sectionRecord
+from truss import Truss
+
+# catalog index of the chosen section per member (-1 if no section passes) and the resulting area
+SizingResult = namedtuple('SizingResult', ['section', 'area', 'feasible', 'volume'])
+
+class SectionCatalog:
+    def __init__(self, entries):
+        """candidate cross sections, sorted from the lightest to the heaviest
+
+        Args:
+            entries (list): (shape, dimensions) of every candidate section
+
+        Raises:
+            ValueError: Wrong type excluding I, T, C, O
+        """
+        records = [sectionRecord(shape, dimensions) for shape, dimensions in entries]
+        area = np.array([r.area for r in records])
+        # the lightest section per unit length has the smallest area
+        order = np.argsort(area, kind='stable')
+        self.shapes = np.array([entries[k][0] for k in order], dtype='<U1')
+        self.dimensions = np.zeros((len(entries), 3))
+        for row, k in enumerate(order):
+            self.dimensions[row, :len(entries[k][1])] = entries[k][1]
+        self.area = area[order]
+        self.inertia_min = np.array([min(records[k].inertia_xx, records[k].inertia_yy) for k in order])
+
+    def __len__(self):
+        return len(self.area)
+
+    @classmethod
+    def fromFile(cls, path):
+        """read a catalog file, one section per line: shape followed by its dimensions
+
+        Args:
+            path (path): catalog file path
+
+        Returns:
+            SectionCatalog: the catalog
+        """
+        entries = []
+        with open(path) as f:
+            for line in f:
+                definition = line.split('#')[0].split()
+                if definition:
+                    entries.append((definition[0], [float(d) for d in definition[1:]]))
+        return cls(entries)
+
+    @classmethod
+    def grid(cls, shape, *dimension_ranges):
+        """catalog of all combinations of the given dimension values for one shape
+
+        Args:
+            shape (str): cross-section shape I, T, C, or O
+            dimension_ranges (list): candidate values of every dimension
+
+        Returns:
+            SectionCatalog: the catalog
+        """
+        return cls([(shape, list(d)) for d in itertools.product(*dimension_ranges)])
+
+def sizeMembers(truss, catalog, chunk_size=4096):
+    """pick the lightest catalog section per member which neither buckles nor yields in any load case
+
+    The member forces of a statically determinate truss do not depend on the sections, so the
+    truss is solved once and the check is vectorized over members x catalog entries.
+
+    Args:
+        truss (Truss): truss to size, it is solved if it was not solved yet
+        catalog (SectionCatalog): candidate sections
+        chunk_size (int): members checked at once, bounds the memory to chunk_size x catalog entries
+
+    Returns:
+        SizingResult: chosen catalog index, area, and feasibility per member, and the total volume
+    """
+    if not hasattr(truss, 'unknown_forces'):
+        truss.solveForceEquations()
+    model = truss.model
+    m = model.number_of_members
+    # same sign convention as Member.fail(): the force acting on the member, compression is negative
+    external_force = -truss.unknown_forces[:m]
+    compression = np.maximum(-external_force.min(axis=1), 0)
+    tension = np.maximum(external_force.max(axis=1), 0)
+    length = model.directionCosines()[1]
+
+    section = np.full(m, -1, dtype=np.int64)
+    for start in range(0, m, chunk_size):
+        rows = slice(start, min(start+chunk_size, m))
+        buckling_force = np.pi**2*model.e_module[rows, None]*catalog.inertia_min[None, :]/length[rows, None]**2
+        yield_force = model.yield_strength[rows, None]*catalog.area[None, :]
+        passes = (compression[rows, None] <= buckling_force) & (tension[rows, None] <= yield_force)
+        # the catalog is sorted by area, so the first passing entry is the lightest
+        first = np.argmax(passes, axis=1)
+        section[rows] = np.where(passes[np.arange(len(first)), first], first, -1)
+
+    feasible = section >= 0
+    area = np.where(feasible, catalog.area[section], np.nan)
+    return SizingResult(section, area, feasible, float(np.nansum(area*length)))
+
+def applySizing(model, catalog, result):
+    """write the chosen sections into the model, infeasible members keep their section
+
+    Args:
+        model (TrussModel): truss definition, changed in place
+        catalog (SectionCatalog): candidate sections
+        result (SizingResult): output of sizeMembers
+    """
+    chosen = np.flatnonzero(result.feasible)
+    model.shape = np.array(model.shape)
+    model.dimensions = np.array(model.dimensions)
+    model.shape[chosen] = catalog.shapes[result.section[chosen]]
+    model.dimensions[chosen] = catalog.dimensions[result.section[chosen]]
+
+if __name__ == '__main__':
+    # python sizing.py truss2.txt catalog.txt
+    from loader import loadTruss
+    model = loadTruss(sys.argv[1])
+    catalog = SectionCatalog.fromFile(sys.argv[2])
+    result = sizeMembers(Truss.fromModel(model), catalog)
+    for k in range(model.number_of_members):
+        if result.feasible[k]:
+            print('member', model.member_names[k], 'section =', catalog.shapes[result.section[k]], catalog.dimensions[result.section[k]])
+        else:
+            print('member', model.member_names[k], 'no section of the catalog passes')
+    print('total volume =', result.volume)
@@ -0,0 +1,107 @@
+import time
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+
+# systems with fewer unknowns than this are solved with the dense pseudo inverse
+DENSE_LIMIT = 64
+
+def assembleMatrix(rows, cols, values, shape):
+    """assemble a sparse matrix from coordinate (COO) triplets
+
+    Args:
+        rows (array): row index of every nonzero
+        cols (array): column index of every nonzero
+        values (array): value of every nonzero
+        shape (tuple): shape of the matrix
+
+    Returns:
+        csc_matrix: the assembled matrix, duplicated entries are summed
+    """
+    return sp.coo_matrix((values, (rows, cols)), shape=shape).tocsc()
+
+class Factorization:
+    def __init__(self, A, dense_limit=DENSE_LIMIT):
+        """factorize a square system matrix once so that it can be solved for many right hand sides
+
+        Args:
+            A (sparse matrix or ndarray): square coefficient matrix
+            dense_limit (int): below this size the dense pseudo inverse is used
+
+        Raises:
+            ValueError: the matrix is singular
+        """
+        self.shape = A.shape
+        self.nnz = A.nnz if sp.issparse(A) else np.count_nonzero(A)
+        self.stats = {'size': self.shape[0], 'nnz': int(self.nnz)}
+
+        start = time.perf_counter()
+        if self.shape[0] < dense_limit:
+            # tiny systems: the dense pseudo inverse is cheaper than the sparse machinery
+            self.method = 'dense'
+            dense = A.toarray() if sp.issparse(A) else np.asarray(A, dtype=float)
+            self._A_pinv = np.linalg.pinv(dense)
+            self.stats['fill_in'] = 1.0
+        else:
+            self.method = 'sparse'
+            try:
+                self._lu = spla.splu(sp.csc_matrix(A, dtype=float))
+            except RuntimeError:
+                raise ValueError('system is singular, the truss is probably a mechanism')
+            # fill-in: nonzeros of the factors relative to the nonzeros of the matrix
+            self.stats['fill_in'] = (self._lu.L.nnz + self._lu.U.nnz)/max(self.nnz, 1)
+        self.stats['method'] = self.method
+        self.stats['factor_time'] = time.perf_counter() - start
+        self.stats['solve_time'] = 0.0
+
+    def solve(self, b):
+        """solve Ax = b with the stored factorization
+
+        Args:
+            b (ndarray): right hand side, a vector or a matrix with one column per case
+
+        Returns:
+            ndarray: solution with the same shape as b
+        """
+        start = time.perf_counter()
+        if self.method == 'dense':
+            x = np.matmul(self._A_pinv, b)
+        else:
+            x = self._lu.solve(np.asarray(b, dtype=float))
+        self.stats['solve_time'] = self.stats['solve_time'] + time.perf_counter() - start
+        return x
+
+    def solveTransposed(self, b):
+        """solve A^T x = b with the stored factorization (adjoint systems)
+
+        Args:
+            b (ndarray): right hand side, a vector or a matrix with one column per case
+
+        Returns:
+            ndarray: solution with the same shape as b
+        """
+        start = time.perf_counter()
+        if self.method == 'dense':
+            x = np.matmul(self._A_pinv.T, b)
+        else:
+            x = self._lu.solve(np.asarray(b, dtype=float), trans='T')
+        self.stats['solve_time'] = self.stats['solve_time'] + time.perf_counter() - start
+        return x
+
+    def conditionEstimate(self, A):
+        """estimate the 1-norm condition number ||A|| ||A^-1|| of the factorized matrix
+
+        The dense path uses the stored pseudo inverse, the sparse path estimates ||A^-1|| with
+        a few solves through the factors (Higham's block 1-norm estimator).
+
+        Args:
+            A (sparse matrix or ndarray): the factorized matrix
+
+        Returns:
+            float: the condition estimate
+        """
+        norm = spla.onenormest(A) if sp.issparse(A) else np.linalg.norm(A, 1)
+        if self.method == 'dense':
+            return float(norm*np.linalg.norm(self._A_pinv, 1))
+        inverse = spla.LinearOperator(self.shape, matvec=self._lu.solve, rmatvec=lambda b: self._lu.solve(b, trans='T'), dtype=float)
+        return float(norm*spla.onenormest(inverse))
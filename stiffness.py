@@ -0,0 +1,174 @@
+import time
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+import scipy.linalg as la
+from scipy.sparse.csgraph import reverse_cuthill_mckee
+from model import FREE, LOOSE
+
+# the banded Cholesky factor is used while it needs fewer than this many bytes, sparse LU otherwise
+BANDED_LIMIT = 2**28
+
+def bandwidth(K):
+    """largest distance of a nonzero from the diagonal
+
+    Returns:
+        int: the half bandwidth
+    """
+    K = K.tocoo()
+    return int(np.abs(K.row - K.col).max(initial=0))
+
+def supportTransformation(model):
+    """map the free degrees of freedom onto the nodal x, y displacements, u = T s
+
+    Free nodes keep both displacements, loose nodes can only slide along their ground,
+    and fixed nodes do not move.
+
+    Returns:
+        csc_matrix: (2N, free degrees of freedom) transformation T
+    """
+    node_type = model.node_type
+    counts = np.where(node_type == FREE, 2, np.where(node_type == LOOSE, 1, 0))
+    node = np.repeat(np.arange(model.number_of_nodes), counts)
+    first = np.cumsum(counts) - counts
+    local = np.arange(len(node)) - np.repeat(first, counts)
+    # loose nodes slide along the ground inclination
+    angle = model.inclination[node]*np.pi/180
+    loose = node_type[node] == LOOSE
+    column = np.arange(len(node))
+    rows = np.concatenate([2*node, 2*node+1])
+    cols = np.concatenate([column, column])
+    values = np.concatenate([np.where(loose, np.cos(angle), local == 0), np.where(loose, np.sin(angle), local == 1)])
+    keep = values != 0
+    return sp.csc_matrix((values[keep], (rows[keep], cols[keep])), shape=(2*model.number_of_nodes, len(node)))
+
+class StiffnessSolver:
+    def __init__(self, model, reorder=True, banded_limit=BANDED_LIMIT):
+        """factorize the reduced stiffness matrix of a (possibly statically indeterminate) truss
+
+        The free degrees of freedom are renumbered with reverse Cuthill-McKee to shrink the
+        bandwidth; the reordered matrix is factorized with a banded Cholesky decomposition, or
+        with a sparse LU if the band would need more than banded_limit bytes.
+
+        Args:
+            model (TrussModel): truss definition
+            reorder (bool): renumber the degrees of freedom with reverse Cuthill-McKee
+            banded_limit (int): largest banded factor in bytes
+
+        Raises:
+            ValueError: the truss is a mechanism
+        """
+        self.model = model
+        self.K = model.buildStiffnessMatrix()
+        self.T = supportTransformation(model)
+        K_r = (self.T.T @ self.K @ self.T).tocsr()
+        n = K_r.shape[0]
+        self.stats = {'size': n, 'nnz': int(K_r.nnz), 'bandwidth': bandwidth(K_r)}
+
+        start = time.perf_counter()
+        if reorder and n > 0:
+            self.permutation = reverse_cuthill_mckee(K_r, symmetric_mode=True).astype(np.int64)
+        else:
+            self.permutation = np.arange(n)
+        K_r = K_r[self.permutation][:, self.permutation]
+        self.reduced_matrix = K_r
+        self.stats['reordered_bandwidth'] = bandwidth(K_r)
+        self.stats['reorder_time'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        w = self.stats['reordered_bandwidth']
+        if (w+1)*n*8 <= banded_limit:
+            self.method = 'banded'
+            # upper banded storage: ab[w + i - j, j] = K[i, j] for i <= j
+            upper = sp.triu(K_r).tocoo()
+            ab = np.zeros((w+1, n))
+            ab[w + upper.row - upper.col, upper.col] = upper.data
+            try:
+                self._cholesky = la.cholesky_banded(ab)
+            except la.LinAlgError:
+                raise ValueError('system is singular, the truss is probably a mechanism')
+            self.stats['fill_in'] = (w+1)*n/max(upper.nnz, 1)
+        else:
+            self.method = 'sparse'
+            try:
+                self._lu = spla.splu(K_r.tocsc(), permc_spec='NATURAL', diag_pivot_thresh=0, options={'SymmetricMode': True})
+            except RuntimeError:
+                raise ValueError('system is singular, the truss is probably a mechanism')
+            self.stats['fill_in'] = (self._lu.L.nnz + self._lu.U.nnz)/max(K_r.nnz, 1)
+        self.stats['method'] = self.method
+        self.stats['factor_time'] = time.perf_counter() - start
+        self.stats['solve_time'] = 0.0
+
+    def solve(self, f):
+        """nodal displacements under the external forces
+
+        Args:
+            f (ndarray): (2N, cases) external forces, as built by TrussModel.buildLoadMatrix
+
+        Returns:
+            ndarray: (2N, cases) displacements in x, y order of the nodes
+        """
+        start = time.perf_counter()
+        s = self._solveReduced((self.T.T @ f)[self.permutation])
+        # undo the renumbering
+        s_r = np.empty_like(s)
+        s_r[self.permutation] = s
+        self.stats['solve_time'] = self.stats['solve_time'] + time.perf_counter() - start
+        return self.T @ s_r
+
+    def _solveReduced(self, b):
+        """solve the reordered reduced system with the stored factor
+        """
+        if len(b) == 0:
+            return np.array(b, dtype=float)
+        if self.method == 'banded':
+            return la.cho_solve_banded((self._cholesky, False), b)
+        return self._lu.solve(np.asarray(b, dtype=float))
+
+    def conditionEstimate(self, A=None):
+        """estimate the 1-norm condition number of the reduced stiffness matrix
+
+        Args:
+            A (sparse matrix, optional): the factorized matrix, by default reduced_matrix
+
+        Returns:
+            float: the condition estimate
+        """
+        A = self.reduced_matrix if A is None else A
+        if A.shape[0] == 0:
+            return 1.0
+        # K is symmetric, so the transposed solve is the same solve
+        inverse = spla.LinearOperator(A.shape, matvec=self._solveReduced, rmatvec=self._solveReduced, dtype=float)
+        return float(spla.onenormest(A)*spla.onenormest(inverse))
+
+    def memberForces(self, displacements):
+        """axial member forces from the elongations, tension is positive
+
+        Args:
+            displacements (ndarray): (2N, cases) nodal displacements
+
+        Returns:
+            ndarray: (M, cases) member forces
+        """
+        cosines, length = self.model.directionCosines()
+        area = self.model.sectionProperties()[0]
+        u = displacements.reshape(self.model.number_of_nodes, 2, -1)
+        i = self.model.connectivity[:, 0]
+        j = self.model.connectivity[:, 1]
+        elongation = np.einsum('mk,mkc->mc', cosines, u[j] - u[i])
+        return (self.model.e_module*area/length)[:, None]*elongation
+
+    def reactions(self, displacements, f):
+        """support reactions in the order of TrussModel.reactionLayout
+
+        Args:
+            displacements (ndarray): (2N, cases) nodal displacements
+            f (ndarray): (2N, cases) external forces
+
+        Returns:
+            ndarray: (R, cases) reaction forces along the reaction directions
+        """
+        # the supports balance what the members do not carry: R = K u - f
+        residual = (self.K @ displacements - f).reshape(self.model.number_of_nodes, 2, -1)
+        reaction_node, reaction_direction = self.model.reactionLayout()
+        return np.einsum('rk,rkc->rc', reaction_direction, residual[reaction_node])
@@ -1,10 +1,57 @@
 import unittest
 import sys
 import os
+import tempfile
+import io
+import json
 import numpy as np
 
 # your main script for truss solver
 import main
+import loader
+import batch
+from solver import Factorization
+from model import TrussModel, FREE, LOOSE, FIXED
+from truss import Truss
+from node import Node
+from member import sectionProperties, evaluateFailures, criticalForceDerivative
+from session import SolverSession
+from sizing import SectionCatalog, sizeMembers, applySizing
+from generators import FAMILIES, generateTruss
+import benchmark
+from profiling import Profiler
+from stiffness import StiffnessSolver
+from rigidity import checkRigidity
+from peeling import eliminationOrder, JointSolver, NoEliminationOrder
+from influence import influenceMatrix, movingLoad
+from reliability import Scatter, runReliability
+from cache import ResultCache, resultKey, geometryKey
+import asyncio
+import server
+from sensitivity import SensitivityAnalysis
+import csv
+from results import TrussResult
+
+def warrenModel(bays):
+    """simply supported Warren truss with a downward force on every top node
+    """
+    names = ['B%d' % k for k in range(bays+1)] + ['T%d' % k for k in range(bays)]
+    xy = [[k, 0] for k in range(bays+1)] + [[k+0.5, 1] for k in range(bays)]
+    node_type = [FIXED] + [FREE]*(2*bays)
+    node_type[bays] = LOOSE
+    connectivity = [(k, k+1) for k in range(bays)] + [(bays+1+k, bays+2+k) for k in range(bays-1)]
+    connectivity = connectivity + [(k, bays+1+k) for k in range(bays)] + [(bays+1+k, k+1) for k in range(bays)]
+    member_names = [names[i] + '-' + names[j] for i, j in connectivity]
+    m = len(connectivity)
+    return TrussModel(names, xy, node_type, [0]*(2*bays+1), member_names, connectivity, ['O']*m, [[0.1, 0.01, 0]]*m, [2.1e11]*m, [3.4e8]*m,
+                      load_node=range(bays+1, 2*bays+1), load_magnitude=[1e4]*bays, load_angle=[270]*bays)
+
+def crashingChunk(paths, check=True):
+    """batch.solveChunk which kills its worker process on truss3.txt
+    """
+    if 'truss3.txt' in paths:
+        os._exit(1)
+    return [batch.solveFile(p, check) for p in paths]
 
 class Test(unittest.TestCase):
 
@@ -69,5 +116,672 @@ class Test(unittest.TestCase):
             # truss6.txt
             output = main.run('truss6.txt', True)
 
+    def test_sparse_solver(self):
+        """function to test if the sparse LU agrees with the dense pseudo inverse
+        """
+        rng = np.random.default_rng(0)
+        A = np.eye(100)*4 + rng.normal(size=(100, 100))*(rng.random((100, 100)) < 0.03)
+        b = rng.normal(size=(100, 3))
+        sparse = Factorization(A, dense_limit=0)
+        dense = Factorization(A, dense_limit=1000)
+        self.assertEqual(sparse.method, 'sparse')
+        self.assertEqual(dense.method, 'dense')
+        np.testing.assert_allclose(sparse.solve(b), dense.solve(b), rtol=1e-8, atol=1e-10)
+        self.assertGreaterEqual(sparse.stats['fill_in'], 1.0)
+
+    def test_load_cases(self):
+        """function to test if named load cases are accumulated and solved together
+        """
+        # truss7.txt is truss2.txt with the load split into the cases dead, live, and wind
+        single = main.run('truss2.txt', False)
+        output = main.run('truss7.txt', False)
+        self.assertEqual(output[0].shape, (6, 3))
+        self.assertEqual(output[1].shape, (3, 3))
+        np.testing.assert_allclose(output[0][:, [0]], single[0], rtol=1e-8)
+        np.testing.assert_allclose(output[0][:, [1]], single[0], rtol=1e-8)
+        np.testing.assert_allclose(output[0][:, [2]], -0.5*single[0], rtol=1e-8)
+
+    def test_model(self):
+        """function to test if the array-backed model reproduces the node based truss
+        """
+        # truss2.txt as arrays
+        model = TrussModel(['N1', 'N2', 'N3'], [[4, 3], [4, 0], [0, 0]], [FREE, LOOSE, FIXED], [0, 45, 0],
+                           ['N1-N2', 'N1-N3', 'N2-N3'], [[0, 1], [0, 2], [1, 2]], ['I', 'T', 'C'], [[0.1, 0.2, 0.01]]*3,
+                           [210000000000]*3, [340000000]*3, load_node=[0], load_magnitude=[30000], load_angle=[0])
+        truss = Truss.fromModel(model)
+        truss.solveForceEquations()
+        np.testing.assert_allclose(truss.unknown_forces, self.TEST_CASES['truss2.txt'][0], rtol=1e-4)
+        # the node view converts back to the same equations
+        view = TrussModel.fromNodes(model.toNodes(), model.number_of_members)
+        np.testing.assert_allclose(view.buildEquilibriumMatrix().toarray(), model.buildEquilibriumMatrix().toarray(), atol=1e-12)
+        np.testing.assert_allclose(view.buildLoadMatrix(), model.buildLoadMatrix(), atol=1e-9)
+
+    def test_vectorized_failures(self):
+        """function to test if the vectorized failure check agrees with Member.fail()
+        """
+        node_i = Node(0, 'Fixed', 0, 0)
+        node_j = Node(1, 'Free', 3, 4)
+        shapes = ['I', 'T', 'C', 'O']
+        dimensions = [[0.1, 0.2, 0.01], [0.1, 0.2, 0.01], [0.05, 0.1, 0.005], [0.02, 0.002, 0]]
+        members = [node_i.add_member(k, node_i, node_j, shapes[k], dimensions[k][:2] if shapes[k] == 'O' else dimensions[k], 2.1e11, 3.4e8) for k in range(4)]
+        area, inertia_xx, inertia_yy = sectionProperties(shapes, dimensions)
+        np.testing.assert_allclose(area, [m.area for m in members])
+        np.testing.assert_allclose(np.minimum(inertia_xx, inertia_yy), [min(m.inertia_xx, m.inertia_yy) for m in members])
+
+        forces = np.array([[-3e7, 1e5], [-1e3, 4e6], [-5e5, 1e7], [2e4, -1e4]])
+        result = evaluateFailures(forces, area, np.minimum(inertia_xx, inertia_yy), np.full(4, 5.0), np.full(4, 2.1e11), np.full(4, 3.4e8))
+        for c in range(2):
+            for k, member in enumerate(members):
+                member.external_force = forces[k, c]
+                self.assertEqual(member.fail(), result.failure[k, c])
+                self.assertAlmostEqual(member.critical_force/result.critical_force[k, c], 1.0)
+        np.testing.assert_allclose(result.utilization, np.abs(forces)/result.critical_force)
+
+    def test_binary_format(self):
+        """function to test if the binary format is loaded zero-copy and solves like the text file
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'truss7.trb')
+            loader.convert('truss7.txt', path)
+            model = loader.loadTruss(path)
+            self.assertFalse(model.dimensions.flags.owndata)
+            self.assertEqual(model.load_cases, ['dead', 'live', 'wind'])
+            output = main.run(path, False)
+            del model
+        expected = main.run('truss7.txt', False)
+        np.testing.assert_allclose(output[0], expected[0])
+        np.testing.assert_array_equal(output[1], expected[1])
+
+    def test_batch(self):
+        """function to test if the batch solver reports the results and the errors of every file
+        """
+        paths = batch.collectDefinitions(['truss[1-6].txt'])
+        output = io.StringIO()
+        summary = batch.runBatch(paths, output, workers=2, chunksize=2)
+        self.assertEqual(summary['solved'], 2)
+        self.assertEqual(summary['failed'], 4)
+        results = {r['file']: r for r in map(json.loads, output.getvalue().splitlines())}
+        np.testing.assert_allclose(results['truss2.txt']['forces'], self.TEST_CASES['truss2.txt'][0][:3], rtol=1e-4)
+        self.assertEqual(results['truss4.txt']['error'], 'ValueError: The member is connecting to the undefined node')
+
+        # a crashing worker only fails its own file, the other files of the broken pool are solved again
+        solveChunk = batch.solveChunk
+        batch.solveChunk = crashingChunk
+        try:
+            output = io.StringIO()
+            summary = batch.runBatch(paths*2, output, workers=2, chunksize=3)
+        finally:
+            batch.solveChunk = solveChunk
+        results = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual((summary['solved'], summary['failed']), (4, 8))
+        self.assertEqual(sorted(r['file'] for r in results if not r['ok'] and r['error'].startswith('BrokenProcessPool')), ['truss3.txt']*2)
+
+        # non-finite forces are written as null, the output stays valid JSON
+        with open('truss2.txt') as f:
+            text = f.read()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'nan.txt')
+            with open(path, 'w') as f:
+                f.write(text.replace('N1 30000 0', 'N1 nan 0'))
+            output = io.StringIO()
+            batch.runBatch([path], output, workers=1)
+        result = json.loads(output.getvalue(), parse_constant=lambda name: self.fail('%s in the output' % name))
+        self.assertIsNone(result['forces'][0][0])
+
+    def test_session(self):
+        """function to test if the incremental edits of a session match a full solve
+        """
+        session = SolverSession(warrenModel(20), max_rank=8)
+        self.assertEqual(session._base.method, 'sparse')
+        session.move_node('T3', 3.6, 1.2)
+        session.replace_member('B3-T3', 'T3', 'B3')
+        self.assertGreater(len(session._columns), 0)
+        reference = Truss.fromModel(session.model)
+        reference.solveForceEquations()
+        np.testing.assert_allclose(session.unknown_forces, reference.unknown_forces, rtol=1e-8, atol=1e-6)
+        np.testing.assert_array_equal(session.failures, reference.failures)
+
+        # a section change only re-checks that member
+        update = session.set_section('B0-B1', 'O', [0.001, 0.0005])
+        np.testing.assert_array_equal(update.members, [0])
+        self.assertTrue(update.failures[0, 0])
+        update = session.set_load('T1', 2e4, 270)
+        reference = Truss.fromModel(session.model)
+        reference.solveForceEquations()
+        np.testing.assert_allclose(session.unknown_forces, reference.unknown_forces, rtol=1e-8, atol=1e-6)
+        self.assertGreater(len(update.members), 0)
+
+        # a rejected edit leaves the session unchanged
+        forces = session.unknown_forces.copy()
+        self.assertRaises(KeyError, session.replace_member, 'T3-B3', 'T3', 'X9')
+        self.assertRaises(ValueError, session.replace_member, 'T3-B3', 'T3', 'B4', 'Z', [0.1])
+        self.assertIn('T3-B3', session._member_index)
+        np.testing.assert_array_equal(session.unknown_forces, forces)
+        session.set_section('T3-B3', 'O', [0.05, 0.01])
+
+    def test_sizing(self):
+        """function to test if the sizing picks the lightest passing catalog section
+        """
+        model = warrenModel(10)
+        catalog = SectionCatalog.grid('O', [0.02, 0.04, 0.06, 0.1], [0.002, 0.004, 0.008])
+        result = sizeMembers(Truss.fromModel(model), catalog)
+        self.assertTrue(np.all(result.feasible))
+        applySizing(model, catalog, result)
+        sized = Truss.fromModel(model)
+        sized.solveForceEquations()
+        self.assertFalse(np.any(sized.failures))
+        # every lighter section fails
+        for k in range(model.number_of_members):
+            for lighter in range(result.section[k]):
+                model.dimensions[k] = catalog.dimensions[lighter]
+                check = Truss.fromModel(model)
+                check.solveForceEquations()
+                self.assertTrue(check.failures[k, 0])
+            model.dimensions[k] = catalog.dimensions[result.section[k]]
+
+    def test_comments(self):
+        """function to test if comments are ignored by the parser
+        """
+        with open('truss2.txt') as f:
+            text = f.read()
+        commented = text.replace('N1 Free 4 3\n', '# joints\nN1 Free 4 3 # x = 4, y = 3\n').replace('N1 30000 0', 'N1 30000 0 # load')
+        model = loader.parseText(commented)
+        np.testing.assert_array_equal(model.buildEquilibriumMatrix().toarray(), loader.parseText(text).buildEquilibriumMatrix().toarray())
+        np.testing.assert_array_equal(model.buildLoadMatrix(), loader.parseText(text).buildLoadMatrix())
+
+    def test_malformed_rows(self):
+        """function to test if rows which are short, duplicated, or connect a node to itself are rejected
+        """
+        with open('truss2.txt') as f:
+            text = f.read()
+        nodes, members, forces = text.split('----\n')
+        first_member = members.splitlines()[0]
+        cases = {'Please config the member in a correct way': nodes + '----\n' + first_member.split()[0] + '\n' + members + '----\n' + forces,
+                 'The node N1 is defined more than once': nodes + nodes.splitlines()[0] + '\n----\n' + members + '----\n' + forces,
+                 'The member is connecting a node to itself': nodes + '----\n' + members + first_member.replace('N1-N2', 'N1-N1', 1) + '\n----\n' + forces}
+        for message, definition in cases.items():
+            with self.assertRaises(ValueError) as cm:
+                loader.parseText(definition)
+            self.assertEqual(str(cm.exception), message)
+
+    def test_no_loads(self):
+        """function to test if a truss without load lines is parsed, solved with zero forces, and written back
+        """
+        with open('truss2.txt') as f:
+            nodes, members, forces = f.read().split('----\n')
+        for section in ['', '# no loads\n']:
+            model = loader.parseText(nodes + '----\n' + members + '----\n' + section)
+            self.assertEqual(len(model.load_node), 0)
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'unloaded.txt')
+                loader.writeText(model, path)
+                output = main.run(path, False)
+            np.testing.assert_array_equal(output[0], np.zeros((6, 1)))
+            np.testing.assert_array_equal(output[1], [False, False, False])
+
+    def test_generators(self):
+        """function to test if the generated trusses are determinate, solvable, and survive the text format
+        """
+        for family in FAMILIES:
+            for bays in [2, 4, 10]:
+                model = generateTruss(family, bays, load_pattern='random', load_cases=2, seed=bays)
+                A = model.buildEquilibriumMatrix().toarray()
+                self.assertEqual(A.shape[0], A.shape[1])
+                self.assertEqual(np.linalg.matrix_rank(A), A.shape[0])
+                parsed = loader.parseText(loader.formatText(model))
+                np.testing.assert_allclose(parsed.buildEquilibriumMatrix().toarray(), A)
+                np.testing.assert_allclose(parsed.buildLoadMatrix(), model.buildLoadMatrix())
+                np.testing.assert_array_equal(parsed.shape, model.shape)
+
+    def test_benchmark(self):
+        """function to test if the benchmark measures every phase and catches regressions
+        """
+        records = benchmark.runBenchmark(['pratt'], [40], repeat=1)
+        self.assertEqual(set(records[0]['phases']), set(benchmark.PHASES))
+        self.assertEqual(benchmark.compareBaseline(records, records), [])
+        baseline = json.loads(json.dumps(records))
+        baseline[0]['phases']['solve']['time'] = records[0]['phases']['solve']['time']/10 - benchmark.MIN_TIME
+        regressions = benchmark.compareBaseline(records, baseline)
+        self.assertEqual([r[2:4] for r in regressions], [('solve', 'time')])
+
+    def test_profiler(self):
+        """function to test if the profiler reports every phase to its subscribers without changing the results
+        """
+        profiler = Profiler(memory=True)
+        events = []
+        profiler.subscribe(events.append)
+        output = main.run('truss7.txt', False, profiler)
+        self.assertEqual(len(output), 2)
+        np.testing.assert_allclose(output[0], main.run('truss7.txt', False)[0])
+        stats = profiler.stats()
+        self.assertEqual(list(stats['phases']), ['load', 'assemble', 'factorize', 'solve', 'failures', 'output'])
+        self.assertEqual([e['name'] for e in events if e['event'] == 'phase'], list(stats['phases']))
+        self.assertEqual(stats['matrices']['A']['shape'], [6, 6])
+        A = loader.loadText('truss7.txt').buildEquilibriumMatrix().toarray()
+        self.assertAlmostEqual(stats['matrices']['A']['condition'], np.linalg.cond(A, 1))
+        self.assertGreater(stats['phases']['solve']['bytes'], 0)
+        self.assertGreater(stats['phases']['load']['peak'], 0)
+
+        # a nested phase does not hide the peak the outer phase reached before it
+        profiler = Profiler(memory=True)
+        with profiler.phase('outer'):
+            block = np.ones(2**20)
+            del block
+            with profiler.phase('inner'):
+                pass
+        self.assertGreaterEqual(profiler.phases['outer'].peak, 8*2**20)
+        self.assertLess(profiler.phases['inner'].peak, 2**20)
+
+    def test_stiffness(self):
+        """function to test if the stiffness method agrees with the equilibrium method and solves redundant trusses
+        """
+        np.testing.assert_allclose(main.run('truss2.txt', False, method='stiffness')[0], self.TEST_CASES['truss2.txt'][0], rtol=1e-6)
+        # truss3.txt has one redundant reaction
+        output = main.run('truss3.txt', False, method='stiffness')
+        np.testing.assert_allclose(output[0][:3, 0], [-22500, 37500, 0], atol=1e-6)
+
+        # Warren truss with a second diagonal in every bay is 9 times redundant
+        model = warrenModel(10)
+        extra = np.array([(k, 12+k) for k in range(9)])
+        model = TrussModel(model.node_names, model.xy, model.node_type, model.inclination, np.concatenate([model.member_names, ['X%d' % k for k in range(9)]]),
+                           np.concatenate([model.connectivity, extra]), ['O']*48, [[0.1, 0.01, 0]]*48, [2.1e11]*48, [3.4e8]*48,
+                           model.load_node, model.load_magnitude, model.load_angle)
+        truss = Truss.fromModel(model)
+        truss.solveForceEquations(method='stiffness')
+        np.testing.assert_allclose(model.buildEquilibriumMatrix() @ truss.unknown_forces, -model.buildLoadMatrix(), atol=1e-6)
+        self.assertEqual(truss.displacements.shape, (42, 1))
+        banded = StiffnessSolver(model)
+        sparse = StiffnessSolver(model, banded_limit=0)
+        self.assertEqual(banded.method, 'banded')
+        self.assertEqual(sparse.method, 'sparse')
+        self.assertLess(banded.stats['reordered_bandwidth'], banded.stats['bandwidth'])
+        np.testing.assert_allclose(sparse.solve(model.buildLoadMatrix()), truss.displacements, rtol=1e-8, atol=1e-15)
+
+    def test_rigidity(self):
+        """function to test if the pebble game finds mechanisms and redundant members which pass the counting rule
+        """
+        for family in FAMILIES:
+            self.assertTrue(checkRigidity(generateTruss(family, 8, seed=0)).rigid)
+        # truss3.txt connects two fixed nodes by a member
+        result = checkRigidity(loader.loadText('truss3.txt'))
+        self.assertTrue(result.rigid)
+        np.testing.assert_array_equal(result.redundant_members, [2])
+
+        # move the diagonal of the last panel of a Pratt truss into the panel before: 2n = m + r still holds
+        model = generateTruss('pratt', 6, seed=0)
+        model.connectivity[-1] = model.connectivity[-2][::-1]
+        model.member_names[-1] = '-'.join(model.node_names[model.connectivity[-1]])
+        result = checkRigidity(model)
+        self.assertFalse(result.rigid)
+        self.assertEqual(result.degrees_of_freedom, 1)
+        np.testing.assert_array_equal(result.redundant_members, [model.number_of_members-1])
+        self.assertNotIn(0, result.flexible_nodes)
+        with self.assertRaises(ValueError) as cm:
+            Truss.fromModel(model).solveForceEquations(check=True)
+        self.assertIn('mechanism', str(cm.exception))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'mechanism.txt')
+            loader.writeText(model, path)
+            output = io.StringIO()
+            summary = batch.runBatch([path, 'truss2.txt'], output, workers=1)
+        self.assertEqual(summary['failed'], 1)
+        self.assertIn('flexible joints: B1', output.getvalue())
+
+        # a member from a node to itself is redundant and leaves the pebbles of the node alone
+        model = generateTruss('pratt', 6, seed=0)
+        model.connectivity[-1] = [3, 3]
+        result = checkRigidity(model)
+        np.testing.assert_array_equal(result.redundant_members, [model.number_of_members-1])
+        self.assertEqual(result.degrees_of_freedom, 1)
+
+    def test_joints(self):
+        """function to test if the joint by joint solver agrees with the global solver and falls back for K-trusses
+        """
+        for key, item in self.TEST_CASES.items():
+            np.testing.assert_allclose(main.run(key, False, method='joints')[0], item[0], rtol=1e-4, atol=1e-9)
+        for family in FAMILIES:
+            model = generateTruss(family, 12, load_cases=3, seed=1)
+            joints = Truss.fromModel(model)
+            joints.solveForceEquations(method='joints')
+            reference = Truss.fromModel(model)
+            reference.solveForceEquations()
+            np.testing.assert_allclose(joints.unknown_forces, reference.unknown_forces, rtol=1e-8, atol=1e-6)
+            np.testing.assert_array_equal(joints.failures, reference.failures)
+            # K-trusses need the method of sections
+            self.assertEqual(joints.solver_stats['method'], 'sparse' if family == 'k' else 'joints')
+            if family != 'k':
+                # the transposed sweep solves the adjoint systems
+                b = np.random.default_rng(0).normal(size=(2*model.number_of_nodes, 2))
+                np.testing.assert_allclose(joints.factorization.solveTransposed(b), reference.factorization.solveTransposed(b), rtol=1e-8, atol=1e-9)
+        self.assertIsNone(eliminationOrder(generateTruss('k', 12, seed=1)))
+        with self.assertRaises(NoEliminationOrder):
+            JointSolver(generateTruss('k', 12, seed=1))
+
+    def test_influence(self):
+        """function to test if the influence lines and the moving load envelopes match single solves
+        """
+        model = generateTruss('pratt', 8, seed=0)
+        deck = ['B%d' % k for k in range(9)]
+        truss = Truss.fromModel(model)
+        influence = influenceMatrix(truss, deck, chunk_size=4)
+        for p in [3, 8]:
+            single = TrussModel(model.node_names, model.xy, model.node_type, model.inclination, model.member_names, model.connectivity,
+                                model.shape, model.dimensions, model.e_module, model.yield_strength, [p], [1.0], [270.0])
+            reference = Truss.fromModel(single)
+            reference.solveForceEquations()
+            np.testing.assert_allclose(influence[:, p], reference.unknown_forces[:, 0], atol=1e-12)
+
+        # a single axle is extreme on a node
+        envelope = movingLoad(truss, deck, [0], [2e5])
+        np.testing.assert_allclose(envelope.maximum, 2e5*influence.max(axis=1), atol=1e-6)
+        # two axles, compared with a fine sweep of the lead axle
+        envelope = movingLoad(truss, deck, [0, 1.5], [1e5, 5e4], chunk_size=5)
+        for s in np.linspace(0, 9.5, 96):
+            forces = movingLoad(truss, deck, [0, 1.5], [1e5, 5e4], positions=[s])
+            self.assertTrue(np.all(forces.maximum <= envelope.maximum + 1e-6))
+            self.assertTrue(np.all(forces.minimum >= envelope.minimum - 1e-6))
+        at = movingLoad(truss, deck, [0, 1.5], [1e5, 5e4], positions=[envelope.max_position[2]])
+        self.assertAlmostEqual(at.maximum[2], envelope.maximum[2])
+        # a path needs two distinct nodes per segment
+        self.assertRaises(ValueError, movingLoad, truss, ['B0'], [0], [1e5])
+        self.assertRaises(ValueError, movingLoad, truss, ['B0', 'B1', 'B1', 'B2'], [0], [1e5])
+
+    def test_reliability(self):
+        """function to test if the sampled failure probabilities are reproducible and match a known case
+        """
+        model = warrenModel(4)
+        truss = Truss.fromModel(model)
+        truss.solveForceEquations()
+        # the most stressed tension member is exactly at its yield force
+        k = int(np.argmin(truss.unknown_forces[:model.number_of_members, 0]))
+        area = model.sectionProperties()[0][k]
+        model.yield_strength[k] = -truss.unknown_forces[k, 0]/area*(1 + 1e-12)
+        result = runReliability(model, {'load_magnitude': Scatter('normal', 0.1)}, 20000, seed=3, batch_size=3000)
+        # the member fails for every load above the mean
+        self.assertAlmostEqual(result.member_probability[k], 0.5, delta=0.02)
+        self.assertTrue(result.member_interval[k, 0] < result.member_probability[k] < result.member_interval[k, 1])
+        self.assertAlmostEqual(result.system_probability, result.member_probability[k])
+        self.assertEqual(np.count_nonzero(result.member_probability), 1)
+
+        # the same batches and streams whatever the number of workers
+        scatter = {'load_magnitude': Scatter('lognormal', 0.2), 'load_angle': Scatter('normal', 5.0), 'e_module': Scatter('normal', 0.05),
+                   'yield_strength': Scatter('uniform', 0.1), 'dimensions': Scatter('normal', 0.02)}
+        serial = runReliability(model, scatter, 5000, seed=7, batch_size=1000)
+        parallel = runReliability(model, scatter, 5000, seed=7, workers=2, batch_size=1000)
+        np.testing.assert_array_equal(serial.member_probability, parallel.member_probability)
+        self.assertEqual(serial.system_probability, parallel.system_probability)
+        self.assertTrue(np.all(serial.member_interval[:, 0] <= serial.member_probability))
+        self.assertTrue(np.all(serial.member_probability <= serial.member_interval[:, 1]))
+        with self.assertRaises(ValueError) as cm:
+            runReliability(model, scatter, 100, case='snow')
+        self.assertEqual(str(cm.exception), 'unknown load case snow')
+
+    def test_cache(self):
+        """function to test if the result cache ignores formatting, reuses factorizations, and evicts old entries
+        """
+        with open('truss2.txt') as f:
+            text = f.read()
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResultCache(os.path.join(directory, 'cache'))
+            path = os.path.join(directory, 'truss.txt')
+            with open(path, 'w') as f:
+                f.write(text)
+            forces, failures = main.run(path, False, cache=cache)
+            # comments and whitespace do not change the key
+            with open(path, 'w') as f:
+                f.write(text.replace('N1 Free 4 3\n', '# joints\nN1   Free 4 3 # x = 4\n'))
+            cached_forces, cached_failures = main.run(path, False, cache=cache)
+            np.testing.assert_array_equal(cached_forces, forces)
+            np.testing.assert_array_equal(cached_failures, failures)
+            self.assertEqual((cache.statistics['hits'], cache.statistics['misses']), (1, 1))
+
+            # a load-only change reuses the factorization
+            model = generateTruss('pratt', 40, seed=0)
+            cache.solve(model)
+            loaded = generateTruss('pratt', 40, load_pattern='random', seed=1)
+            self.assertEqual(geometryKey(loaded), geometryKey(model))
+            self.assertNotEqual(resultKey(loaded), resultKey(model))
+            result = cache.solve(loaded)
+            self.assertEqual(cache.statistics['factorization_hits'], 1)
+            reference = Truss.fromModel(loaded)
+            reference.solveForceEquations()
+            np.testing.assert_allclose(result.unknown_forces, reference.unknown_forces, atol=1e-6)
+            np.testing.assert_array_equal(result.failures, reference.failures)
+
+            # the least recently used entries go first
+            cache.get(resultKey(model))
+            self.assertEqual(cache.stats()['entries'], 3)
+            for entries in [2, 1]:
+                self.assertEqual(cache.evict(cache.stats()['bytes'] - 1), 1)
+                self.assertEqual(cache.stats()['entries'], entries)
+            self.assertIsNone(cache.get(resultKey(loaded)))
+            self.assertIsNotNone(cache.get(resultKey(model)))
+
+            # a mechanism cached without the check is still rejected by a checked run
+            with open(path, 'w') as f:
+                f.write('N1 Fixed 0 0\nN2 Loose 0 1 0\nN3 Free 1 1\nN4 Free 0 1\n----\n' +
+                        ''.join('%s O 0.02 0.002 210000000000 340000000\n' % name for name in ['N1-N2', 'N2-N3', 'N3-N4', 'N4-N1', 'N4-N1']) +
+                        '----\nN3 1000 270\n')
+            main.run(path, False, cache=cache)
+            hits = cache.statistics['hits']
+            with self.assertRaises(ValueError) as cm:
+                main.run(path, False, check=True, cache=cache)
+            self.assertIn('mechanism', str(cm.exception))
+            self.assertIsNotNone(cache.get(resultKey(loader.loadText(path))))
+            self.assertEqual(cache.statistics['hits'], hits + 1)
+
+    def test_server(self):
+        """function to test if the solver service answers text, model, and broken requests like the batch solver
+        """
+        with open('truss2.txt') as f:
+            text = f.read()
+        model = loader.parseText(text)
+        arrays = {name: getattr(model, name).tolist() for name in loader.ARRAY_FIELDS}
+        arrays['load_cases'] = model.load_cases
+        requests = [{'text': text}, {'model': arrays}, {'text': 'N1 Free 0 0'}]*3
+
+        async def scenario():
+            service = server.TrussServer(workers=1, max_inflight=2)
+            address = await service.start()
+            loop = asyncio.get_running_loop()
+            try:
+                responses = await loop.run_in_executor(None, server.request, address, requests, 30)
+                return responses + await loop.run_in_executor(None, server.request, address, [{'stats': True}], 30)
+            finally:
+                await service.close()
+        responses = asyncio.run(scenario())
+        reference = batch.solveFile('truss2.txt')
+        for response in responses[:2]:
+            np.testing.assert_allclose(response['forces'], reference['forces'])
+            np.testing.assert_allclose(response['reactions'], reference['reactions'])
+            self.assertEqual(response['failures'], reference['failures'])
+        self.assertFalse(responses[2]['ok'])
+        stats = responses[-1]
+        self.assertEqual((stats['requests'], stats['errors']), (9, 3))
+        self.assertTrue(0 < stats['latency']['p50'] <= stats['latency']['p99'] <= stats['latency']['max'])
+
+        # an error without a request id, here a line longer than max_line, reaches the caller
+        async def oversized():
+            service = server.TrussServer(workers=1, max_line=1000)
+            address = await service.start()
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, server.request, address, [{'text': text + '#'*2000}, {'text': text}], 30)
+            finally:
+                await service.close()
+        with self.assertRaises(ConnectionError) as cm:
+            asyncio.run(oversized())
+        self.assertIn('ValueError', str(cm.exception))
+
+        # a crashed worker fails its request, the next requests are solved by a new pool;
+        # an idle connection holds no slot of the single one
+        async def crashed():
+            service = server.TrussServer(workers=1, max_inflight=1)
+            address = await service.start()
+            loop = asyncio.get_running_loop()
+            idle = (await asyncio.open_connection(*address))[1]
+            try:
+                for process in list(service._pool._processes.values()):
+                    process.kill()
+                    process.join()
+                first = await loop.run_in_executor(None, server.request, address, [{'text': text}], 30)
+                return first + await loop.run_in_executor(None, server.request, address, [{'text': text}], 30)
+            finally:
+                idle.close()
+                await service.close()
+        responses = asyncio.run(crashed())
+        self.assertFalse(responses[0]['ok'])
+        self.assertIn('BrokenProcessPool', responses[0]['error'])
+        np.testing.assert_allclose(responses[1]['forces'], reference['forces'])
+
+        # validation only parses and runs the rigidity check
+        self.assertEqual(main.validate('truss2.txt').number_of_members, 3)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'free.txt')
+            with open(path, 'w') as f:
+                f.write(text.replace('N2 Loose 45 4 0', 'N2 Free 4 0'))
+            with self.assertRaises(ValueError):
+                main.validate(path)
+
+    def test_sensitivity(self):
+        """function to test if the adjoint and direct sensitivities match finite differences
+        """
+        def solve(model, xy, method):
+            moved = TrussModel(model.node_names, xy, model.node_type, model.inclination, model.member_names, model.connectivity,
+                               model.shape, model.dimensions, model.e_module, model.yield_strength, model.load_node,
+                               model.load_magnitude, model.load_angle, model.load_case, model.load_cases)
+            truss = Truss.fromModel(moved)
+            truss.solveForceEquations(method=method)
+            return truss
+
+        h = 1e-6
+        # dense pseudo inverse, sparse LU, and joint by joint factorizations
+        for model, method in [(warrenModel(3), 'equilibrium'), (generateTruss('pratt', 12, seed=0), 'equilibrium'), (generateTruss('howe', 8, seed=0), 'joints')]:
+            truss = solve(model, model.xy, method)
+            analysis = SensitivityAnalysis(truss)
+            forces = analysis.forceJacobian()
+            utilization = analysis.utilizationJacobian()
+            x = model.xy.ravel()
+            # the utilization of zero-force members has a kink (buckling on one side, yielding on the other)
+            loaded = np.abs(truss.unknown_forces[:model.number_of_members, 0]) > 1e-6*np.abs(truss.unknown_forces).max()
+            for k in range(len(x)):
+                step = np.zeros(len(x))
+                step[k] = h
+                plus = solve(model, (x + step).reshape(-1, 2), method)
+                minus = solve(model, (x - step).reshape(-1, 2), method)
+                scale = np.abs(forces).max()
+                np.testing.assert_allclose(forces[:, k], (plus.unknown_forces[:, 0] - minus.unknown_forces[:, 0])/(2*h), atol=1e-6*scale)
+                difference = (plus.failure_result.utilization[:, 0] - minus.failure_result.utilization[:, 0])/(2*h)
+                np.testing.assert_allclose(utilization[loaded, k], difference[loaded], atol=1e-6*np.abs(utilization).max())
+            # the forces are linear in the loads
+            np.testing.assert_allclose(analysis.forceJacobian('loads') @ model.buildLoadMatrix()[:, 0], truss.unknown_forces[:, 0], atol=1e-8*scale)
+            # one adjoint solve per gradient, the same rows through the adjoint Jacobian
+            weights = np.random.default_rng(0).standard_normal(forces.shape[0])
+            np.testing.assert_allclose(analysis.gradient(weights), weights @ forces, atol=1e-9*np.abs(weights @ forces).max())
+            members = weights[:model.number_of_members]
+            np.testing.assert_allclose(analysis.gradient(members, of='utilization'), members @ utilization, atol=1e-12)
+            np.testing.assert_allclose(analysis.forceJacobian(outputs=[0, 2], sparse=True).toarray(), forces[[0, 2]], atol=1e-9*scale)
+            # the direct method in column blocks gives the same sparse Jacobians
+            np.testing.assert_allclose(analysis.forceJacobian(sparse=True).toarray(), forces, atol=1e-9*scale)
+            np.testing.assert_allclose(analysis.utilizationJacobian(sparse=True).toarray(), utilization, atol=1e-9*np.abs(utilization).max())
+
+        # dP/dL of the buckling force, the yield force does not depend on the length
+        member = Node(0, 'Fixed', 0, 0).add_member(0, Node(0, 'Fixed', 0, 0), Node(1, 'Free', 3, 4), 'O', [0.02, 0.002], 2.1e11, 3.4e8)
+        member.external_force = -1.0
+        member.fail()
+        critical_force = member.critical_force
+        member._length = 5.0 + h
+        member.fail()
+        self.assertAlmostEqual(member.critical_force_derivative/((member.critical_force - critical_force)/h), 1.0, places=5)
+        member.external_force = 0.0
+        member.fail()
+        self.assertEqual(member.critical_force_derivative, 0.0)
+        np.testing.assert_allclose(criticalForceDerivative([-1.0, 1.0], [critical_force, 7.0], [5.0, 5.0]), [-2*critical_force/5, 0])
+        with self.assertRaises(ValueError):
+            SensitivityAnalysis(Truss.fromModel(model))
+
+    def test_displacements(self):
+        """function to test if the displacements from the member forces match the stiffness method
+        """
+        for family in ['pratt', 'k']:
+            model = generateTruss(family, 10, load_cases=3, seed=2)
+            reference = Truss.fromModel(model)
+            reference.solveForceEquations(method='stiffness')
+            for method in ['equilibrium', 'joints']:
+                truss = Truss.fromModel(model)
+                truss.solveForceEquations(method=method)
+                displacements = truss.solveDisplacements()
+                self.assertEqual(displacements.shape, (model.number_of_nodes, 2, 3))
+                np.testing.assert_allclose(displacements, reference.solveDisplacements(), atol=1e-9*np.abs(displacements).max())
+            limit = np.median(np.hypot(displacements[:, 0], displacements[:, 1]))
+            np.testing.assert_array_equal(truss.checkDeflections(limit), np.hypot(displacements[:, 0], displacements[:, 1]) > limit)
+
+        # the node view with the member stiffness EA/L
+        nodes = loader.loadText('truss2.txt').toNodes()
+        truss = Truss(nodes, 3)
+        truss.solveForceEquations()
+        failures = truss.checkDeflections(1e-4, 'x')
+        members = {m.member_index: m for node in nodes.values() for m in node.members}
+        np.testing.assert_allclose([members[k].axialStiffness() for k in range(3)], truss.model.axialStiffness())
+        for i, node in enumerate(nodes.values()):
+            np.testing.assert_allclose(node.displacement, truss.solveDisplacements()[i, :, 0])
+            self.assertEqual(node.deflection_failure, failures[i])
+        self.assertEqual(failures.tolist(), [True, True, False])
+
+    def test_results(self):
+        """function to test if the labelled results export and summarize the solve without loss
+        """
+        result = main.run('truss7.txt', False, as_result=True)
+        forces, failures = main.run('truss7.txt', False)
+        np.testing.assert_array_equal(result.force, forces[:3])
+        np.testing.assert_array_equal(result.reactions, forces[3:])
+        np.testing.assert_array_equal(result.failures, failures)
+        self.assertEqual(result.reaction_directions.tolist(), ['normal', 'x', 'y'])
+
+        # chunked and single-pass exports are the same and round-trip the floats
+        text = io.StringIO()
+        result.writeCsv(text)
+        chunked = io.StringIO()
+        result.writeCsv(chunked, chunk_size=2)
+        self.assertEqual(chunked.getvalue(), text.getvalue())
+        rows = list(csv.DictReader(io.StringIO(text.getvalue())))
+        self.assertEqual(len(rows), 3*len(result.load_cases))
+        self.assertEqual([r['member'] for r in rows[:3]], result.member_names.tolist())
+        np.testing.assert_array_equal([float(r['force']) for r in rows], result.force.T.ravel())
+        lines = io.StringIO()
+        result.writeJsonLines(lines, 'reactions', chunk_size=4)
+        records = [json.loads(line) for line in lines.getvalue().splitlines()]
+        self.assertEqual(records[1], {'case': result.load_cases[0], 'node': 'N3', 'direction': 'x', 'reaction': result.reactions[1, 0]})
+        # non-finite values are written as null, JSON has no NaN or infinity
+        result.utilization[1, 0] = np.inf
+        result.force[2, 0] = np.nan
+        lines = io.StringIO()
+        result.writeJsonLines(lines, chunk_size=2)
+        records = [json.loads(line, parse_constant=lambda name: self.fail('%s in the output' % name)) for line in lines.getvalue().splitlines()]
+        self.assertIsNone(records[1]['utilization'])
+        self.assertIsNone(records[2]['force'])
+        self.assertEqual(records[0]['force'], result.force[0, 0])
+        with tempfile.TemporaryDirectory() as directory:
+            result.export(os.path.join(directory, 'result.npz'))
+            stored = TrussResult.loadNpz(os.path.join(directory, 'result.npz'))
+            np.testing.assert_array_equal(stored.utilization, result.utilization)
+            self.assertEqual(stored.load_cases, result.load_cases)
+            result.export(os.path.join(directory, 'result.jsonl'))
+            self.assertTrue(os.path.exists(os.path.join(directory, 'result.reactions.jsonl')))
+
+        # the summary lists every failing member, however small top is, and the top utilized ones by decreasing utilization
+        model = warrenModel(6)
+        model.yield_strength[:] = 1e5
+        truss = Truss.fromModel(model)
+        truss.solveForceEquations()
+        result = TrussResult.fromTruss(model, truss)
+        failing = np.count_nonzero(result.failures)
+        self.assertGreater(failing, 2)
+        summary = result.summary(top=2).splitlines()
+        self.assertEqual(len(summary), 1 + failing)
+        order = np.argsort(-result.utilization[:, 0], kind='stable')
+        self.assertEqual([line.split()[1] for line in summary[1:]], result.member_names[order[:failing]].tolist())
+        self.assertEqual(len(result.summary(top=failing + 3).splitlines()), 1 + failing + 3)
+        self.assertEqual(len(result.summary(top=0, failing_only=True).splitlines()), 1 + failing)
+
 if __name__ == '__main__':
     unittest.main(argv=['first-arg-is-ignored'], exit=False)
\ No newline at end of file
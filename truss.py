@@ -1,88 +1,310 @@
-from node import Node
+from node import DEFAULT_CASE
+from model import TrussModel
+from member import evaluateFailures, criticalForceDerivative
+from solver import Factorization
+from stiffness import StiffnessSolver
+from rigidity import validateRigidity
+from peeling import JointSolver, NoEliminationOrder
+from profiling import phase
 import numpy as np
 
+def validateModel(model, method='equilibrium', check=False, profiler=None):
+    """the checks of the solve which need no matrix, also run before cached results and factorizations are reused
+
+    Args:
+        model (TrussModel): truss definition
+        method (str): 'stiffness' accepts statically indeterminate trusses
+        check (bool): run the combinatorial rigidity check (see rigidity.py)
+        profiler (Profiler, optional): collects the time, calls, and allocations of the rigidity phase
+
+    Raises:
+        ValueError: system is not deterministic
+        ValueError: the truss is a mechanism or over-constrained (only with check)
+    """
+    # check if system is deterministic: 2*n = m(members) + r(reactions)
+    if method != 'stiffness' and 2*model.number_of_nodes != model.number_of_members + model.countReactions():
+        raise ValueError('system is not deterministic')
+    # the count can hold while one part is a mechanism and another part is over-constrained
+    if check:
+        with phase(profiler, 'rigidity'):
+            # redundant members are fine for the stiffness method
+            validateRigidity(model, redundant=method == 'stiffness')
+
 class Truss:
-    def __init__(self, nodes, number_of_member):
+    def __init__(self, nodes, number_of_member, load_cases=None, model=None):
         """constructor of Truss
 
         Args:
-            nodes (dict): truss definition by a set of nodes
+            nodes (dict): truss definition by a set of nodes, None when the truss is built from a model
             number_of_member (int): total number of the bars
+            load_cases (list, optional): names of the load cases to solve, by default every case found on the nodes
+            model (TrussModel, optional): array-backed definition, gathered from the nodes if not given
         """        
 
         self.number_of_member = number_of_member
-        self.nodes = nodes
-    def solveForceEquations(self):
+        self._nodes = nodes
+        self.model = TrussModel.fromNodes(nodes, number_of_member) if model is None else model
+        if load_cases is None:
+            load_cases = self.model.load_cases if len(self.model.load_cases) > 0 else [DEFAULT_CASE]
+        self.load_cases = list(load_cases)
+
+    @classmethod
+    def fromModel(cls, model, load_cases=None):
+        """build the truss straight from an array-backed model without per-member objects
+
+        Args:
+            model (TrussModel): truss definition
+            load_cases (list, optional): names of the load cases to solve
+
+        Returns:
+            Truss: the truss solver
+        """
+        return cls(None, model.number_of_members, load_cases=load_cases, model=model)
+
+    @property
+    def nodes(self):
+        """Node and Member view of the truss, only created when it is asked for
+        """
+        if self._nodes is None:
+            self._nodes = self.model.toNodes()
+        return self._nodes
+
+    @property
+    def failure_vector(self):
+        """failure flags of a single load case as a vector of members, members x cases with several cases
+        """
+        return self.failures[:, 0] if len(self.load_cases) == 1 else self.failures
+
+    def solveForceEquations(self, profiler=None, method='equilibrium', check=False, factorization=None):
         """gather equations of each nodes to form system equation
 
+        All load cases share the coefficient matrix, so it is factorized once and the
+        cases are solved together as the columns of the right hand side.
+        unknown_forces is (members+reactions) x cases and failures is members x cases,
+        failure_vector is the vector of members of a single load case.
+
+        The 'equilibrium' method solves the joint equilibrium of a statically determinate truss,
+        the 'joints' method solves simple trusses joint by joint (see peeling.py) and falls back
+        to 'equilibrium' for the others, the 'stiffness' method solves the direct stiffness method
+        (see stiffness.py) and also works for statically indeterminate trusses; it stores the nodal
+        displacements as well.
+
+        Args:
+            profiler (Profiler, optional): collects the time, calls, and allocations of every phase
+            method (str): 'equilibrium', 'joints', or 'stiffness'
+            check (bool): run the combinatorial rigidity check (see rigidity.py) before any matrix is built
+            factorization (optional): factorization of a solved truss with the same geometry (and sections for
+                'stiffness'), only the loads are solved again
+
         Raises:
             ValueError: system is not deterministic
+            ValueError: the truss is a mechanism or over-constrained (only with check)
+            ValueError: unknown method
         """        
 
-        self.n = len(self.nodes.keys())
-
-        for key, item in self.nodes.items():
-            item.buildForceEquations()
+        self.n = self.model.number_of_nodes
 
         # compute number of reastions
-        self.number_of_reactions = 0
-        for key, item in self.nodes.items():
-            if item.type == 'Fixed':
-                # Fixed pinned nodes have both x and y reactions
-                self.number_of_reactions = self.number_of_reactions + 2
-            elif item.type == 'Loose':
-                # Loose pinned nodes only have reactions perpendicular to the ground
-                self.number_of_reactions = self.number_of_reactions + 1
+        # Fixed pinned nodes have both x and y reactions, Loose pinned nodes only have reactions perpendicular to the ground
+        self.number_of_reactions = self.model.countReactions()
+        self.displacements = None
+        if method not in ['equilibrium', 'joints', 'stiffness']:
+            raise ValueError('unknown method %s' % method)
+        # a reused factorization skips the matrix, not the checks
+        validateModel(self.model, method, check, profiler)
+        if factorization is not None:
+            self._solveWith(factorization, profiler)
+        elif method == 'stiffness':
+            self._solveStiffness(profiler)
+        elif method == 'equilibrium':
+            self._solveEquilibrium(profiler)
+        else:
+            self._solveJoints(profiler)
+        self.solver_stats = self.factorization.stats
+
+        self._evaluateFailures(profiler)
+
+    def solveLoads(self, f):
+        """solve other external forces with the factorization of the last solveForceEquations
+
+        Args:
+            f (ndarray): (2N, cases) external forces in x, y order of the nodes
+
+        Raises:
+            ValueError: the truss was not solved yet
+
+        Returns:
+            ndarray: (members+reactions, cases) unknown forces
+        """
+        if getattr(self, 'factorization', None) is None:
+            raise ValueError('the truss has to be solved first')
+        if isinstance(self.factorization, StiffnessSolver):
+            displacements = self.factorization.solve(f)
+            return np.concatenate([self.factorization.memberForces(displacements), self.factorization.reactions(displacements, f)])
+        return self.factorization.solve(-f)
+
+    def solveDisplacements(self, profiler=None):
+        """nodal displacements of every load case from the member forces
+
+        The elongations F L/(EA) and the supports which do not move give the compatibility
+        A^T u = [-F L/(EA); 0] with the equilibrium matrix A, so the displacements cost one
+        transposed solve with the factorization of the force solve for all load cases together.
+        The stiffness method already solved them.
+
+        Args:
+            profiler (Profiler, optional): collects the time, calls, and allocations of the phase
+
+        Raises:
+            ValueError: the truss was not solved yet
+
+        Returns:
+            ndarray: (N, 2, cases) x and y displacements in node order
+        """
+        if getattr(self, 'factorization', None) is None:
+            raise ValueError('the truss has to be solved first')
+        if getattr(self, 'displacements', None) is None:
+            with phase(profiler, 'displacements'):
+                elongation = self.unknown_forces[:self.number_of_member]/self.model.axialStiffness()[:, None]
+                b = np.zeros_like(self.unknown_forces)
+                b[:self.number_of_member] = -elongation
+                self.displacements = self.factorization.solveTransposed(b)
+        return self.displacements.reshape(self.n, 2, -1)
+
+    def checkDeflections(self, limit, direction=None):
+        """check the nodal displacements against a deflection limit, the serviceability counterpart of the failure check
+
+        Args:
+            limit (float or array): allowed deflection, one value or (N,) per node
+            direction (str, optional): 'x' or 'y' to check one component, by default the length of the displacement
+
+        Raises:
+            ValueError: unknown direction
+
+        Returns:
+            ndarray: (N, cases) flags of the nodes which deflect more than the limit, (N,) with a single load case
+        """
+        u = self.solveDisplacements()
+        if direction is None:
+            deflection = np.hypot(u[:, 0], u[:, 1])
+        elif direction in ['x', 'y']:
+            deflection = np.abs(u[:, 'xy'.index(direction)])
+        else:
+            raise ValueError('unknown direction %s' % direction)
+        self.deflections = deflection
+        self.deflection_failures = deflection > np.reshape(limit, (-1, 1))
+        if self._nodes is not None:
+            # the node view follows the first load case like the members
+            for i, node in enumerate(self._nodes.values()):
+                node.displacement = u[i, :, 0]
+                node.deflection_failure = self.deflection_failures[i, 0]
+        if len(self.load_cases) == 1:
+            return self.deflection_failures[:, 0]
+        return self.deflection_failures
+
+    def _solveWith(self, factorization, profiler):
+        """solve the loads with the factorization of another truss
+        """
+        self.factorization = factorization
+        with phase(profiler, 'assemble'):
+            self._f = self.model.buildLoadMatrix(self.load_cases)
+        with phase(profiler, 'solve'):
+            if isinstance(factorization, StiffnessSolver):
+                self.displacements = factorization.solve(self._f)
+                self.unknown_forces = np.concatenate([factorization.memberForces(self.displacements),
+                                                      factorization.reactions(self.displacements, self._f)])
             else:
-                self.number_of_reactions = self.number_of_reactions 
-        # check if system is deterministic: 2*n = m(members) + r(reactions)
-        if len(self.nodes)*2 != self.number_of_member + self.number_of_reactions:
-            raise ValueError('system is not deterministic')
+                self.unknown_forces = factorization.solve(-self._f)
 
+    def _solveEquilibrium(self, profiler):
+        """solve the joint equilibrium AF + f = 0 of a statically determinate truss
+        """
         # create system matrices: AF + f = 0
         # vector F contains forces vriables: 2*n(number of nodes) bar forces followed by reaction forces in initialization order
-        # vector f is a set of external forces acting on the corresponding nodes in initialization order
-        self._A = np.zeros((2*len(self.nodes), 2*len(self.nodes)))
-        self._f = np.zeros((2*len(self.nodes), 1))
-        # fill out the coefficient of matrix A
-        r_index = 0
-        for i, key in enumerate(self.nodes):
-            m_indexes = []
-            # append the member index to the indexes list
-            for j in range(len(self.nodes[key].members)):
-                m_indexes.append(self.nodes[key].members[j].member_index)
-            # member forces coefficients
-            self._A[2*i:2*i+2, m_indexes] = self.nodes[key].m
-            # reaction forces coefficients
-            if self.nodes[key].type == 'Fixed':
-                self._A[2*i:2*i+2, self.number_of_member+r_index:self.number_of_member+r_index+2] = self.nodes[key].r
-                r_index = r_index + 2
-            elif self.nodes[key].type == 'Loose':
-                self._A[2*i:2*i+2, self.number_of_member+r_index:self.number_of_member+r_index+1] = self.nodes[key].r
-                r_index = r_index + 1 
-            # external forces coefficients
-            self._f[2*i:2*i+2, [0]] = self.nodes[key].f
-
-        self._A_pinv = np.linalg.pinv(self._A)
-        # solve vector F
-        self.unknown_forces = np.matmul(self._A_pinv, -self._f)
+        # vector f is a set of external forces acting on the corresponding nodes in initialization order, one column per load case
+        # the direction cosines of all members are computed at once and scattered as sparse (row, column, value) triplets
+        with phase(profiler, 'assemble'):
+            self._A = self.model.buildEquilibriumMatrix()
+            self._f = self.model.buildLoadMatrix(self.load_cases)
+            if profiler is not None:
+                profiler.recordArrays(self._A, self._f)
+
+        # sparse LU for large systems, dense pseudo inverse for tiny ones
+        with phase(profiler, 'factorize'):
+            self.factorization = Factorization(self._A)
+        if profiler is not None:
+            profiler.recordMatrix('A', self._A, self.factorization)
+        # solve vector F for every load case at once
+        with phase(profiler, 'solve'):
+            self.unknown_forces = self.factorization.solve(-self._f)
+            if profiler is not None:
+                profiler.recordArrays(self.unknown_forces)
+
+    def _solveJoints(self, profiler):
+        """solve a simple truss joint by joint, other trusses with the global equilibrium
+        """
+        with phase(profiler, 'factorize'):
+            try:
+                self.factorization = JointSolver(self.model)
+            except NoEliminationOrder:
+                self.factorization = None
+        if self.factorization is None:
+            # no joint by joint elimination order (or a singular joint), the global solver decides
+            self._solveEquilibrium(profiler)
+            return
+        with phase(profiler, 'assemble'):
+            self._f = self.model.buildLoadMatrix(self.load_cases)
+        with phase(profiler, 'solve'):
+            self.unknown_forces = self.factorization.solve(-self._f)
+            if profiler is not None:
+                profiler.recordArrays(self.unknown_forces)
 
+    def _solveStiffness(self, profiler):
+        """solve the nodal displacements K u = f and recover the member forces and reactions
+        """
+        with phase(profiler, 'assemble'):
+            self._f = self.model.buildLoadMatrix(self.load_cases)
+        # the stiffness matrix is assembled, reordered, and factorized together
+        with phase(profiler, 'factorize'):
+            self.factorization = StiffnessSolver(self.model)
+        if profiler is not None:
+            profiler.recordMatrix('K', self.factorization.reduced_matrix, self.factorization)
+        with phase(profiler, 'solve'):
+            self.displacements = self.factorization.solve(self._f)
+            # the same layout as the equilibrium method: member forces followed by the reactions
+            self.unknown_forces = np.concatenate([self.factorization.memberForces(self.displacements),
+                                                  self.factorization.reactions(self.displacements, self._f)])
+            if profiler is not None:
+                profiler.recordArrays(self.displacements, self.unknown_forces)
+
+    def _evaluateFailures(self, profiler):
+        """check every member for buckling and yielding in every load case
+        """
         # return the forces back to the members to determine failure
-        # more efficient implementations exist, feel free to try out
-        self.failures = []
-        self._visited_member = np.zeros((self.number_of_member,1), dtype=bool)
-        r = 0
-        for i, key in enumerate(self.nodes):
-            for j in range(len(self.nodes[key].members)):
-                for k in range(self.number_of_member):
-                    if k == self.nodes[key].members[j].member_index:
-                        # from the node's point of view, member forces which pull the node are considered as positive force
-                        # now change to the member's viewpoint, the force which pushes the member is considered as negative
-                        # putting the minor sign because the force is acting on the member
-                        self.nodes[key].members[j].external_force = -self.unknown_forces[k, 0]
-                        fail = self.nodes[key].members[j].fail()
-                        if self._visited_member[k] == False:
-                            self.failures.append(fail)
-                            self._visited_member[k] = True
+        # from the node's point of view, member forces which pull the node are considered as positive force
+        # now change to the member's viewpoint, the force which pushes the member is considered as negative
+        # putting the minor sign because the force is acting on the member
+        with phase(profiler, 'failures'):
+            external_force = -self.unknown_forces[:self.number_of_member]
+            area, inertia_xx, inertia_yy = self.model.sectionProperties()
+            length = self.model.directionCosines()[1]
+            self.failure_result = evaluateFailures(external_force, area, np.minimum(inertia_xx, inertia_yy), length,
+                                                   self.model.e_module, self.model.yield_strength)
+            self.failures = self.failure_result.failure
+            if profiler is not None:
+                profiler.recordArrays(area, inertia_xx, inertia_yy, length, *self.failure_result)
+
+        # keep the member objects of the node view up to date with the first load case
+        if self._nodes is not None:
+            with phase(profiler, 'members'):
+                derivative = criticalForceDerivative(external_force[:, :1], self.failure_result.critical_force[:, :1], length)
+                for key, item in self._nodes.items():
+                    for member in item.members:
+                        k = member.member_index
+                        member.external_force = external_force[k, 0]
+                        member.critical_force = self.failure_result.critical_force[k, 0]
+                        member.critical_force_derivative = derivative[k, 0]
+                        member.buckling = self.failure_result.buckling[k, 0]
+                        member.yielding = self.failure_result.yielding[k, 0]
+                        member.failure = self.failure_result.failure[k, 0]
 
         return